@@ -2,6 +2,10 @@ from django.dispatch import receiver
 from store.signals import order_created
 
 
-@receiver(order_created)
-def on_order_created(sender, order, **kwargs):
+# `dispatch_uid`: connected once even if this module gets imported twice (else every
+# event would be handled twice).
+# (Sent by `store.tasks.dispatch_order_events` at least once per order — a retried
+# event can come again, same `event_id`.)
+@receiver(order_created, dispatch_uid="core.on_order_created")
+def on_order_created(sender, order, event_id, **kwargs):
     print(order)
@@ -1,3 +1,85 @@
-from django.shortcuts import render
+import mimetypes
+import posixpath
+import re
+from pathlib import Path
+from urllib.parse import quote
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import connections
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import require_safe
+from django.views.static import serve
 
-# Create your views here.
+
+@staff_member_required
+def db_pool_stats(request):
+    """Connection pool stats of this worker process, per database — e.g. a growing
+    `requests_waiting` / `requests_wait_ms` means the pool (`GUNICORN_THREADS`) is
+    too small for the load.
+    https://www.psycopg.org/psycopg3/docs/advanced/pool.html#pool-stats"""
+
+    pools = {}
+    for alias in connections:
+        pool = getattr(connections[alias], "pool", None)
+        # (`None`: no pool configured — `psycopg[pool]` not installed)
+        pools[alias] = pool.get_stats() if pool is not None else None
+    return JsonResponse(
+        {
+            "pools": pools,
+            # The most connections all gunicorn workers can open, per database:
+            "max_connections": settings.GUNICORN_WORKERS * settings.GUNICORN_THREADS,
+        }
+    )
+
+
+# Content-addressed media (`store.images.product_image_path`, and the variants named
+# after those): a url's bytes never change.
+IMMUTABLE_MEDIA = re.compile(r"^store/images/[0-9a-f]{32}\.")
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+MEDIA_MAX_AGE = 60 * 60  # (the other files' names can be reused)
+
+
+@require_safe
+def serve_media(request, path):
+    """A file of `MEDIA_ROOT`, with far-future cache headers if content-addressed —
+    its bytes sent as per `MEDIA_SERVE_MODE`. E.g. for "x-accel-redirect", nginx:
+
+        location /media/ {
+            proxy_pass http://app;  # (here)
+        }
+        location /protected-media/ {  # (`MEDIA_ACCEL_REDIRECT_PREFIX`)
+            internal;  # (only via `X-Accel-Redirect`)
+            alias /app/media/;  # (`MEDIA_ROOT`)
+        }
+
+    https://nginx.org/en/docs/http/ngx_http_core_module.html#internal"""
+
+    mode = settings.MEDIA_SERVE_MODE
+    if mode == "django":
+        # (404s, `If-Modified-Since` → 304, no path traversal.)
+        response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    else:
+        path = posixpath.normpath(path).lstrip("/")
+        full_path = Path(safe_join(settings.MEDIA_ROOT, path))  # (else 400)
+        if not full_path.is_file():
+            raise Http404()
+        content_type, _ = mimetypes.guess_type(full_path)
+        response = HttpResponse(content_type=content_type or "application/octet-stream")
+        if mode == "x-accel-redirect":
+            response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_REDIRECT_PREFIX + quote(
+                path
+            )
+        elif mode == "x-sendfile":
+            response["X-Sendfile"] = str(full_path)
+        else:
+            raise ValueError(f"Unknown MEDIA_SERVE_MODE: {mode!r}")
+
+    if IMMUTABLE_MEDIA.match(path):
+        patch_cache_control(
+            response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True
+        )
+    else:
+        patch_cache_control(response, public=True, max_age=MEDIA_MAX_AGE)
+    return response
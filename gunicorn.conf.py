@@ -0,0 +1,11 @@
+# https://docs.gunicorn.org/en/stable/settings.html
+# (Read by gunicorn from the working directory: `gunicorn storefront.wsgi`.)
+import os
+
+
+wsgi_app = "storefront.wsgi"
+
+# Same env vars as `GUNICORN_WORKERS`/`GUNICORN_THREADS` in `storefront.settings`,
+# which size each worker's database connection pool from them:
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
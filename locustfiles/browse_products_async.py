@@ -0,0 +1,44 @@
+"""The `browse_products` workload, against the catalog's async endpoints
+(`store.async_views`) — to compare WSGI (gunicorn) and ASGI (uvicorn) deployments:
+
+1. WSGI, the DRF endpoints (`browse_products.py`):
+   gunicorn storefront.wsgi --workers 4 --threads 4
+   locust -f locustfiles/browse_products.py --headless -u 200 -r 20 -t 2m --csv wsgi
+
+2. ASGI, the async endpoints (this file), same number of workers:
+   uvicorn storefront.asgi:application --workers 4 --port 8000
+   locust -f locustfiles/browse_products_async.py --headless -u 200 -r 20 -t 2m --csv asgi
+
+3. Compare requests/second and p99 latency:
+   python locustfiles/compare_runs.py wsgi_stats.csv asgi_stats.csv
+
+(With `DEBUG = False`, and the same DB / cache for both runs.)"""
+
+from locust import HttpUser, task, between
+from random import randint
+
+
+class AutomatedUser(HttpUser):
+
+    host = "http://127.0.0.1:8000"
+    wait_time = between(1, 10)
+
+    # Same tasks & weights as `browse_products.AutomatedUser`, minus `add_to_cart`
+    # (not a catalog read — no async variant), and `name`s shared with it so the
+    # stats line up:
+
+    @task(weight=2)
+    def view_products(self):
+        collection_id = randint(1, 10)
+        self.client.get(
+            url=f"/store/async/products/?collection_id={collection_id}",
+            name="store/products/?collection_id",
+        )
+
+    @task(weight=4)
+    def view_product(self):
+        product_id = randint(1, 1000)
+        self.client.get(
+            url=f"/store/async/products/{product_id}/",
+            name="store/products/:id",
+        )
@@ -0,0 +1,43 @@
+from locust import HttpUser, task, between
+from uuid import uuid4
+
+
+# A "flash sale": every user keeps buying the same product, so concurrent checkouts
+# race for its inventory. Seed it first, e.g. product 1 with `inventory = 100`, then
+# after the run check it was never oversold:
+# - `inventory` never goes below 0 (and is 0 once the 201s reach 100),
+# - `sum(quantity)` of its `OrderItem`s + the remaining `inventory` == 100,
+# - no 500s (deadlocks) in the stats, only 201s and then 409s.
+PRODUCT_ID = 1
+
+
+class AutomatedUser(HttpUser):
+
+    host = "http://127.0.0.1:8000"
+    wait_time = between(0, 1)
+
+    def on_start(self) -> None:
+        # (Placing orders needs an authenticated user, so register one per user.)
+        credentials = {"username": f"locust-{uuid4().hex}", "password": uuid4().hex}
+        self.client.post(url="/auth/users/", json=credentials, name="auth/users")
+        response = self.client.post(
+            url="/auth/jwt/create/", json=credentials, name="auth/jwt/create"
+        )
+        self.client.headers["Authorization"] = f"JWT {response.json()['access']}"
+
+    @task
+    def checkout(self):
+        cart_id = self.client.post(url="/store/carts/", name="store/carts").json()["id"]
+        self.client.post(
+            url=f"/store/carts/{cart_id}/items/",
+            json={"product": PRODUCT_ID, "quantity": 1},
+            name="store/carts/:id/items",
+        )
+        with self.client.post(
+            url="/store/orders/",
+            json={"cart_id": cart_id},
+            name="store/orders",
+            catch_response=True,
+        ) as response:
+            if response.status_code == 409:  # sold out: expected, not a failure
+                response.success()
@@ -0,0 +1,26 @@
+"""Print requests/second and p99 latency of two locust runs side by side (their
+`--csv` `*_stats.csv` files): `python compare_runs.py before_stats.csv after_stats.csv`."""
+
+import csv
+import sys
+
+
+def read_stats(path: str) -> dict[str, dict]:
+    with open(path, newline="") as file:
+        return {row["Name"]: row for row in csv.DictReader(file)}
+
+
+def main(before_path: str, after_path: str) -> None:
+    before, after = read_stats(before_path), read_stats(after_path)
+    print(f"{'':40} {'req/s':>17} {'p99 (ms)':>17}")
+    for name in sorted(before.keys() & after.keys()):
+        b, a = before[name], after[name]
+        print(
+            f"{name:40} "
+            f"{float(b['Requests/s']):>8.1f} {float(a['Requests/s']):>8.1f} "
+            f"{b['99%']:>8} {a['99%']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:3])
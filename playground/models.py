@@ -1,3 +1,34 @@
 from django.db import models
 
-# Create your models here.
+
+class Notification(models.Model):
+    """A bulk notification run of `playground.tasks.notify_customers`."""
+
+    message = models.TextField()
+
+    started_at = models.DateTimeField(auto_now_add=True)
+
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    sent = models.PositiveIntegerField(default=0)  # set once finished
+
+
+class NotificationChunk(models.Model):
+    """Progress of a run: one row per chunk of recipients (a range of user ids),
+    marked sent once its mails went out — so a restarted run only re-sends the chunks
+    that never finished."""
+
+    notification = models.ForeignKey(
+        to=Notification, on_delete=models.CASCADE, related_name="chunks"
+    )
+
+    first_user_id = models.PositiveBigIntegerField()
+
+    last_user_id = models.PositiveBigIntegerField()
+
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    sent = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["id"]
@@ -1,10 +1,132 @@
-from time import sleep
-from celery import shared_task
+from smtplib import SMTPException
+from celery import shared_task, chord
+from django.contrib.auth import get_user_model
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import Sum
+from django.utils import timezone
+from templated_mail.mail import BaseEmailMessage
+from .models import Notification, NotificationChunk
+
+
+User = get_user_model()
+
+# Recipients per chunk (= per Celery task, per SMTP connection): big enough that the
+# per-task overhead (and the SMTP handshake) is amortized, small enough that a failed
+# chunk is cheap to retry.
+NOTIFICATION_CHUNK_SIZE = 500
+
+
+def get_recipients():
+    return User.objects.filter(is_active=True).exclude(email="")
+
+
+@shared_task
+def notify_customers(message: str, notification_id: int | None = None):
+    """Mail `message` to every customer, `NOTIFICATION_CHUNK_SIZE` at a time in
+    parallel (a chord of `send_notification_chunk`s, then `finish_notification`).
+
+    Pass the `notification_id` of an unfinished run to resume it: only its chunks not
+    sent yet are queued again."""
+
+    if notification_id is None:
+        notification = Notification.objects.create(message=message)
+        plan_notification_chunks(notification)
+    else:
+        notification = Notification.objects.get(pk=notification_id)
+
+    pending = notification.chunks.filter(sent_at__isnull=True).values_list(
+        "id", flat=True
+    )
+    chord(send_notification_chunk.s(chunk_id) for chunk_id in pending)(
+        finish_notification.si(notification.id)
+    )
+    return notification.id
+
+
+def plan_notification_chunks(notification: Notification) -> None:
+    # Only the ids, streamed (`iterator`, a server-side cursor) — not 100k users
+    # loaded at once; every chunk is a range of ids, its task fetches the emails.
+    ids = (
+        get_recipients()
+        .order_by("id")
+        .values_list("id", flat=True)
+        .iterator(chunk_size=NOTIFICATION_CHUNK_SIZE)
+    )
+    chunks, chunk_ids = [], []
+    for id in ids:
+        chunk_ids.append(id)
+        if len(chunk_ids) == NOTIFICATION_CHUNK_SIZE:
+            chunks.append((chunk_ids[0], chunk_ids[-1]))
+            chunk_ids = []
+    if chunk_ids:
+        chunks.append((chunk_ids[0], chunk_ids[-1]))
+
+    NotificationChunk.objects.bulk_create(
+        NotificationChunk(
+            notification=notification, first_user_id=first, last_user_id=last
+        )
+        for first, last in chunks
+    )
+
+
+# - `acks_late`: the message is acknowledged after the task finished, so if the
+#   worker dies mid-chunk, the chunk is delivered again (and then skipped if it had
+#   been sent after all),
+# - SMTP errors are retried (the whole chunk: some of its mails may be sent twice).
+@shared_task(
+    acks_late=True,
+    autoretry_for=(SMTPException, ConnectionError),
+    retry_backoff=True,
+    max_retries=5,
+)
+def send_notification_chunk(chunk_id: int) -> int:
+    chunk = NotificationChunk.objects.select_related("notification").get(pk=chunk_id)
+    if chunk.sent_at is not None:
+        return chunk.sent
+
+    emails = (
+        get_recipients()
+        .filter(id__gte=chunk.first_user_id, id__lte=chunk.last_user_id)
+        .values_list("email", flat=True)
+    )
+
+    # The template is rendered once for the chunk, not once per recipient (the
+    # message isn't personalized):
+    template = BaseEmailMessage(
+        context={"message": chunk.notification.message},
+        template_name="playground/mails/notification.html",
+    )
+    template.render()
+
+    messages = []
+    for email in emails:
+        message = EmailMultiAlternatives(
+            subject=template.subject,
+            body=template.body,
+            to=[email],
+            alternatives=template.alternatives,
+        )
+        message.content_subtype = template.content_subtype
+        messages.append(message)
+
+    # One SMTP connection for the whole chunk (`send_mail` opens one per mail):
+    with get_connection() as connection:
+        sent = connection.send_messages(messages) or 0
+
+    chunk.sent_at = timezone.now()
+    chunk.sent = sent
+    chunk.save(update_fields=["sent_at", "sent"])
+    return sent
 
 
 @shared_task
-def notify_customers(message: str):
-    print(message)
-    print("Sending 10k mails...")
-    sleep(10)
-    print("Success.")
+def finish_notification(notification_id: int) -> int:
+    # (Summed from the chunks, not the chord's results: a resumed run's chord only
+    # has the chunks that were still pending.)
+    sent = NotificationChunk.objects.filter(
+        notification_id=notification_id
+    ).aggregate(sent=Sum("sent"))["sent"]
+    Notification.objects.filter(pk=notification_id).update(
+        finished_at=timezone.now(), sent=sent or 0
+    )
+    return sent or 0
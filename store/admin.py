@@ -2,11 +2,14 @@ from typing import Any
 from django.contrib import admin
 from django.http import HttpRequest
 from django.db.models.query import QuerySet
+from django.db import transaction
 from django.db.models import Count
+from django.utils import timezone
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.http import urlencode
 from . import models
+from .cache import bump_product_cache_generation
 
 
 # Register your models here.
@@ -31,7 +34,11 @@ class ProductImageInline(admin.TabularInline):
 
     def thumbnail(self, instance: models.ProductImage):
         if instance.image:  # (mosh has used `instance.image.name != ''`)
-            return format_html(f'<img src="{instance.image.url}" class="thumbnail">')
+            # The small variant, not the full-size original (until it's generated,
+            # see `store.images`):
+            name = instance.variants.get("thumbnail")
+            url = instance.image.storage.url(name) if name else instance.image.url
+            return format_html('<img src="{}" class="thumbnail">', url)
         return ""
 
 
@@ -64,7 +71,11 @@ class ProductAdmin(admin.ModelAdmin):
 
     @admin.action(description="Clear inventory")
     def clear_inventory(self, request, queryset: QuerySet):
-        count = queryset.update(inventory=0)
+        # (`update` skips `auto_now` too: `last_update` is the products' conditional
+        # GET version, see `store.conditional.product_version`.)
+        count = queryset.update(inventory=0, last_update=timezone.now())
+        # (`update` doesn't send `post_save`, so invalidate the cached products here:)
+        transaction.on_commit(bump_product_cache_generation)
         self.message_user(
             request, f"Successfully cleared inventory for {count} product(s)."
         )
@@ -97,9 +108,6 @@ class CollectionAdmin(admin.ModelAdmin):
         )
         return format_html('<a href="{}">{}</a>', url, collection.featured_product)
 
-    def get_queryset(self, request: HttpRequest) -> QuerySet:
-        return super().get_queryset(request).annotate(product_count=Count("product"))
-
 
 @admin.register(models.Customer)
 class CustomerAdmin(admin.ModelAdmin):
@@ -120,7 +128,15 @@ class CustomerAdmin(admin.ModelAdmin):
         return format_html('<a href="{}">{}</a>', url, customer.order_count)
 
     def get_queryset(self, request: HttpRequest) -> QuerySet:
-        return super().get_queryset(request).annotate(order_count=Count("order"))
+        # `select_related` too (not only `list_select_related`, the changelist's):
+        # the orders' customer autocomplete shows each customer's `__str__`, which
+        # reads its user.
+        return (
+            super()
+            .get_queryset(request)
+            .select_related("user")
+            .annotate(order_count=Count("order"))
+        )
 
 
 class OrderItemInline(admin.TabularInline):
@@ -0,0 +1,134 @@
+"""Async (ASGI) variants of the catalog's read endpoints, under `/store/async/`.
+
+DRF views are sync only: under an ASGI server (`uvicorn storefront.asgi:application`)
+each DRF request still occupies a thread while it waits on the DB. These plain
+Django async views wait on the DB with the async ORM (`aiterator`, `aget`,
+`acount`) instead, so one worker can serve many requests concurrently. Same
+payloads as their DRF counterparts (same serializers, page-number pagination,
+`ProductFilter`, product cache and read replicas) — but read only, and without
+search/ordering (`/store/products/` has those).
+
+Benchmark against the WSGI deployment: see `locustfiles/browse_products_async.py`."""
+
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.http import require_safe
+from rest_framework.exceptions import APIException, NotFound, ValidationError
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from .cache import acached_product_data
+from .filters import ProductFilter
+from .models import Collection, Product, Review
+from .replicas import replica_reads
+from .serializers import CollectionSerializer, ProductSerializer, ReviewSerializer
+
+
+def async_api_view(view):
+    """Wrap an async view returning the payload: JSON response (encoded like DRF's
+    `JSONRenderer`), DRF's error responses, replica reads, GET/HEAD only."""
+
+    @require_safe
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            with replica_reads(request):
+                data = await view(request, *args, **kwargs)
+        except APIException as e:
+            detail = e.detail
+            if not isinstance(detail, (dict, list)):
+                detail = {"detail": detail}
+            return JsonResponse(detail, status=e.status_code, safe=False)
+        return JsonResponse(data, encoder=JSONEncoder, safe=False)
+
+    return wrapper
+
+
+async def paginate(request, queryset, serializer_class) -> dict:
+    """The page of `?page=` (like DRF's `PageNumberPagination`)."""
+
+    page_size = settings.REST_FRAMEWORK["PAGE_SIZE"]
+    try:
+        page = int(request.GET.get("page", 1))
+        if page < 1:
+            raise ValueError
+    except ValueError:
+        raise NotFound("Invalid page.")
+
+    count = await queryset.acount()
+    if page > 1 and (page - 1) * page_size >= count:
+        raise NotFound("Invalid page.")
+
+    start = (page - 1) * page_size
+    # (`chunk_size`: required by `aiterator` for the `prefetch_related`s.)
+    objects = [
+        obj
+        async for obj in queryset[start : start + page_size].aiterator(
+            chunk_size=page_size
+        )
+    ]
+
+    url = request.build_absolute_uri()
+    if page == 1:
+        previous = None
+    elif page == 2:
+        previous = remove_query_param(url, "page")
+    else:
+        previous = replace_query_param(url, "page", page - 1)
+    return {
+        "count": count,
+        "next": (
+            replace_query_param(url, "page", page + 1)
+            if start + page_size < count
+            else None
+        ),
+        "previous": previous,
+        # (Nothing's left to query — all loaded/prefetched above — so the sync
+        # serializer is safe to call here.)
+        "results": serializer_class(
+            objects, many=True, context={"request": request}
+        ).data,
+    }
+
+
+async def get_product_list(request):
+    filterset = ProductFilter(
+        request.GET, queryset=Product.objects.prefetch_related("productimage_set")
+    )
+    # (Validating `collection_id` queries the collection — sync only.)
+    if not await sync_to_async(filterset.is_valid)():
+        raise ValidationError(filterset.errors)
+    return await paginate(request, filterset.qs, ProductSerializer)
+
+
+async def get_product_detail(request, pk):
+    try:
+        product = await Product.objects.prefetch_related("productimage_set").aget(
+            pk=pk
+        )
+    except Product.DoesNotExist:
+        raise NotFound("No Product matches the given query.")
+    return ProductSerializer(product, context={"request": request}).data
+
+
+@async_api_view
+async def product_list(request):
+    return await acached_product_data(request, get_product_list)
+
+
+@async_api_view
+async def product_detail(request, pk):
+    return await acached_product_data(request, get_product_detail, pk)
+
+
+@async_api_view
+async def collection_list(request):
+    return await paginate(request, Collection.objects.all(), CollectionSerializer)
+
+
+@async_api_view
+async def review_list(request, product_pk):
+    return await paginate(
+        request, Review.objects.filter(product_id=product_pk), ReviewSerializer
+    )
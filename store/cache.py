@@ -0,0 +1,142 @@
+from hashlib import md5
+from time import time
+from uuid import uuid4
+from django.core.cache import cache
+from django.http import HttpRequest, HttpResponse
+from rest_framework.request import Request
+from rest_framework.response import Response
+from .compression import accepted_encoding
+from .replicas import replayed_reads
+
+
+# Cached product payloads (`ProductViewSet.list`/`retrieve`) are invalidated by
+# bumping a "generation" that's part of every cache key (see `store.signals.handlers`),
+# so this timeout is only there to let unused entries expire, not for freshness:
+PRODUCT_CACHE_TIMEOUT = 60 * 60  # seconds
+
+PRODUCT_CACHE_GENERATION_KEY = "store:products:generation"
+
+
+def new_product_cache_generation() -> str:
+    # A random token instead of a counter starting at 1: if Redis evicts this key,
+    # a counter would restart at 1 and old entries cached under 1 would be served
+    # again; a fresh token can never match an old entry. (Prefixed with the time
+    # it's created at, see `product_cache_generation_time`.)
+    return f"{time():.6f}:{uuid4().hex}"
+
+
+def product_cache_generation_time(generation: str) -> float:
+    """When `generation` was bumped (a UNIX time): after the commit of the writes
+    its entries must show (bumps are `on_commit`)."""
+    try:
+        return float(generation.partition(":")[0])
+    except ValueError:  # (one from before the times were recorded)
+        return time()
+
+
+def get_product_cache_generation() -> str | None:
+    # (`None` if the cache is down — `IGNORE_EXCEPTIONS` in `CACHES`.)
+    return cache.get_or_set(
+        PRODUCT_CACHE_GENERATION_KEY, new_product_cache_generation, timeout=None
+    )
+
+
+def bump_product_cache_generation() -> None:
+    cache.set(
+        PRODUCT_CACHE_GENERATION_KEY, new_product_cache_generation(), timeout=None
+    )
+    # (Old entries aren't deleted, they just can't be looked up anymore and expire
+    # after `PRODUCT_CACHE_TIMEOUT`.)
+
+
+def product_cache_key(request: HttpRequest | Request, generation: str) -> str:
+    # Absolute uri (not just the path): `ProductSerializer.collection` is a hyperlink,
+    # so the payload depends on the host. Params sorted so `?a=1&b=2` and `?b=2&a=1`
+    # share an entry:
+    # (`GET`, not DRF's `query_params`: also used with plain Django requests, in
+    # `store.async_views`.)
+    url = request.build_absolute_uri(request.path)
+    params = sorted(request.GET.lists())
+    digest = md5(f"{url}?{params}".encode(), usedforsecurity=False).hexdigest()
+    return f"store:products:{generation}:{digest}"
+
+
+def compressed_cache_key(key: str, request: Request, encoding: str) -> str:
+    # Per rendering too (`Accept`, e.g. `application/json; indent=4` vs. JSON):
+    media_type = request.accepted_media_type.replace(" ", "")
+    return f"{key}:{media_type}:{encoding}"
+
+
+def cached_product_response(request: Request, view_func, *args, **kwargs):
+    """Read-through cache around a `ProductViewSet` read action (`view_func`):
+    serve the stored payload if there's one for this url + params, else run the
+    action and store its payload.
+
+    When the client accepts compression, the response's rendered and compressed
+    body is stored as well (by `store.compression.CompressionMiddleware`) and served
+    as is on the next hits: no rendering and no compressing either."""
+
+    generation = get_product_cache_generation()
+    if generation is None:  # cache is down
+        return view_func(request, *args, **kwargs)
+
+    key = product_cache_key(request, generation)
+    encoding = accepted_encoding(request)
+    if encoding is not None:
+        compressed_key = compressed_cache_key(key, request, encoding)
+        stored = cache.get(compressed_key)
+        if stored is not None:
+            content_type, body = stored
+            return HttpResponse(
+                body, content_type=content_type, headers={"Content-Encoding": encoding}
+            )
+
+    data = cache.get(key)
+    if data is not None:
+        response = Response(data)
+    else:
+        # (From a replica only if it has replayed the writes that bumped the
+        # generation, else the primary: its stale payload, up to `REPLICA_MAX_LAG`
+        # behind, would be served for `PRODUCT_CACHE_TIMEOUT`.)
+        with replayed_reads(product_cache_generation_time(generation)):
+            response = view_func(request, *args, **kwargs)
+        if response.status_code != 200:
+            return response
+        cache.set(key, response.data, PRODUCT_CACHE_TIMEOUT)
+
+    if encoding is not None:
+
+        def store_compressed(response):
+            cache.set(
+                compressed_key,
+                (response["Content-Type"], response.content),
+                PRODUCT_CACHE_TIMEOUT,
+            )
+
+        response.store_compressed = store_compressed
+    return response
+
+
+async def aget_product_cache_generation() -> str | None:
+    return await cache.aget_or_set(
+        PRODUCT_CACHE_GENERATION_KEY, new_product_cache_generation, timeout=None
+    )
+
+
+async def acached_product_data(request: HttpRequest, get_data, *args, **kwargs):
+    """Same as `cached_product_response`, for the async views (`store.async_views`):
+    `get_data` is a coroutine function returning the payload (and raising for any
+    other response than a 200)."""
+
+    generation = await aget_product_cache_generation()
+    if generation is None:  # cache is down
+        return await get_data(request, *args, **kwargs)
+
+    key = product_cache_key(request, generation)
+    data = await cache.aget(key)
+    if data is None:
+        # (See `cached_product_response`.)
+        with replayed_reads(product_cache_generation_time(generation)):
+            data = await get_data(request, *args, **kwargs)
+        await cache.aset(key, data, PRODUCT_CACHE_TIMEOUT)
+    return data
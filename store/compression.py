@@ -0,0 +1,169 @@
+"""Response compression: brotli (if installed) or gzip, negotiated by `Accept-Encoding`.
+
+Unlike Django's `GZipMiddleware`:
+- brotli too (smaller than gzip for the same CPU time),
+- only the API's payloads (`COMPRESSIBLE_TYPES`), not HTML: the browsable API's pages
+  carry the CSRF token, which compression would leak (BREACH). WhiteNoise compresses
+  the static files itself, ahead of time,
+- streamed responses are flushed chunk by chunk, so each chunk reaches the client as
+  soon as it's produced (not once the compressor's buffer fills up),
+- a response can ask for its compressed body, to store it: the product cache keeps
+  the hot catalog pages compressed, not recompressed on every hit (see
+  `store.cache.cached_product_response`)."""
+
+import gzip
+import zlib
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# In order of preference, among equally accepted ones:
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/msgpack",  # (keys and repeated strings compress well)
+    "application/x-ndjson",
+    "text/csv",
+    "text/plain",
+)
+
+# Smaller bodies aren't worth it (a few hundred bytes saved at most, and they fit in
+# a packet or two anyway), in bytes:
+MIN_SIZE = 1024
+
+# Per response: fast levels. Stored bodies are compressed once and sent many times,
+# worth compressing harder (though not brotli's slowest, 10-11, while a request waits):
+LEVELS = {"br": 5, "gzip": 6}
+STORED_LEVELS = {"br": 9, "gzip": 9}
+
+
+def accepted_encoding(request) -> str | None:
+    """The best encoding `request` accepts (`Accept-Encoding`), `None` for none."""
+
+    qualities = {}
+    for coding in request.META.get("HTTP_ACCEPT_ENCODING", "").split(","):
+        coding, _, params = coding.partition(";")
+        params = params.strip().replace(" ", "")
+        try:
+            q = float(params[2:]) if params.startswith("q=") else 1.0
+        except ValueError:
+            q = 0.0
+        qualities[coding.strip().lower()] = q
+
+    default = qualities.get("*", 0.0)
+    best = max(ENCODINGS, key=lambda encoding: qualities.get(encoding, default))
+    return best if qualities.get(best, default) > 0 else None
+
+
+def compress(data: bytes, encoding: str, level: int) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def stream_compressor(encoding: str):
+    """`(compress_chunk, finish)` functions compressing a stream, each chunk flushed."""
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=LEVELS["br"])
+        return (
+            lambda chunk: compressor.process(chunk) + compressor.flush(),
+            compressor.finish,
+        )
+    # (`16 + MAX_WBITS`: with the gzip header and trailer.)
+    compressor = zlib.compressobj(LEVELS["gzip"], zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return (
+        lambda chunk: compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH),
+        compressor.flush,
+    )
+
+
+def compress_stream(chunks, encoding: str):
+    compress_chunk, finish = stream_compressor(encoding)
+    for chunk in chunks:
+        if chunk:  # (an empty one would still output a flush marker)
+            yield compress_chunk(chunk)
+    yield finish()
+
+
+async def acompress_stream(chunks, encoding: str):
+    compress_chunk, finish = stream_compressor(encoding)
+    async for chunk in chunks:
+        if chunk:
+            yield compress_chunk(chunk)
+    yield finish()
+
+
+class CompressionMiddleware:
+    """Compress the API's responses, see the module docstring.
+
+    A response with a `store_compressed(response)` attribute gets it called once its
+    body is compressed (with `STORED_LEVELS`). Sync and async, like
+    `store.replicas.PinToPrimaryMiddleware`."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.compress(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.compress(request, await self.get_response(request))
+
+    def compress(self, request, response):
+        content_type = response.get("Content-Type", "").partition(";")[0].strip()
+        if content_type not in COMPRESSIBLE_TYPES:
+            return response
+        # (Even when it's not compressed below: the same url could be.)
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if response.has_header("Content-Encoding"):  # e.g. stored compressed
+            return response
+        encoding = accepted_encoding(request)
+        if encoding is None:
+            return response
+
+        store_compressed = getattr(response, "store_compressed", None)
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = acompress_stream(
+                    response.streaming_content, encoding
+                )
+            else:
+                response.streaming_content = compress_stream(
+                    response.streaming_content, encoding
+                )
+            # (Unknown until it's all streamed.)
+            del response.headers["Content-Length"]
+            store_compressed = None
+        else:
+            if len(response.content) < MIN_SIZE:
+                return response
+            levels = LEVELS if store_compressed is None else STORED_LEVELS
+            compressed = compress(response.content, encoding, levels[encoding])
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers["Content-Length"] = str(len(compressed))
+
+        # A strong `ETag` promises the same bytes, these aren't: weak (RFC 9110
+        # 8.8.1), like `GZipMiddleware` does.
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = encoding
+
+        if store_compressed is not None:
+            store_compressed(response)
+        return response
@@ -0,0 +1,64 @@
+"""Conditional GETs (`ETag` / `Last-Modified` → 304 Not Modified) for catalog reads.
+
+A client repeating a GET with `If-None-Match` / `If-Modified-Since` gets a bodiless
+304 if nothing changed — decided by one small indexed query (a timestamp, not the
+row), before the view runs: no serializing, no payload."""
+
+from datetime import datetime
+from django.db.models import Count, Max
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_headers
+from .models import Collection, Product
+
+
+def product_version(request, pk=None, **kwargs) -> datetime | None:
+    # `last_update` also changes with the images (`store.signals.handlers`):
+    try:
+        return (
+            Product.objects.filter(pk=pk).values_list("last_update", flat=True).first()
+        )
+    except (TypeError, ValueError):  # malformed pk — the view 404s
+        return None
+
+
+def collections_version(request, *args, **kwargs) -> tuple[int, datetime] | None:
+    # The count too: deleting a collection doesn't change the others' max.
+    state = Collection.objects.aggregate(count=Count("id"), last=Max("last_update"))
+    if state["last"] is None:
+        return None
+    return state["count"], state["last"]
+
+
+def conditional(get_version):
+    """Decorate a viewset read action with `ETag` / `Last-Modified` support, derived
+    from `get_version(request, *args, **kwargs)` — a last modification datetime (or
+    a tuple ending with one), `None` to skip (e.g. not found)."""
+
+    def version(request, *args, **kwargs):
+        # (Memoized: `condition` calls the etag and the last-modified functions
+        # separately, that'd be the query twice.)
+        if not hasattr(request, "_conditional_version"):
+            request._conditional_version = get_version(request, *args, **kwargs)
+        return request._conditional_version
+
+    def etag(request, *args, **kwargs):
+        value = version(request, *args, **kwargs)
+        if value is None:
+            return None
+        parts = value if isinstance(value, tuple) else (value,)
+        # Weak, and per format: the body differs per renderer (`Accept`) and
+        # encoding, only its meaning is the same.
+        fmt = request.accepted_renderer.format
+        return f'W/"{fmt}-{"-".join(map(str, parts)).replace(" ", "T")}"'
+
+    def last_modified(request, *args, **kwargs):
+        value = version(request, *args, **kwargs)
+        return value[-1] if isinstance(value, tuple) else value
+
+    return method_decorator(
+        [
+            vary_on_headers("Accept"),
+            condition(etag_func=etag, last_modified_func=last_modified),
+        ]
+    )
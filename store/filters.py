@@ -1,4 +1,12 @@
+import re
+from django.db.models import Q, F
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramWordSimilarity,
+)
 from django_filters.rest_framework import FilterSet
+from rest_framework.filters import SearchFilter
 from .models import Product
 
 
@@ -6,3 +14,39 @@ class ProductFilter(FilterSet):
     class Meta:
         model = Product
         fields = {"collection_id": ["exact"], "unit_price": ["gt", "lt"]}
+
+
+class ProductSearchFilter(SearchFilter):
+    """Drop-in replacement for DRF's `SearchFilter` (same `?search=` param) backed by
+    Postgres full-text search on `Product.search_vector` (title + description):
+    - uses the GIN indexes instead of `title ILIKE '%term%'` (a sequential scan),
+    - every term is a prefix match (`?search=cof` finds "Coffee"),
+    - typos fall back to trigram word similarity on `title` (`?search=cofee`),
+    - results are ranked best first (unless `?ordering=` is given)."""
+
+    config = "english"  # same as in `Product.search_vector`
+
+    def filter_queryset(self, request, queryset, view):
+        search = request.query_params.get(self.search_param, "")
+        terms = re.findall(r"\w+", search)
+        # (Only word characters — they go into a raw `tsquery` below, where `&`, `|`,
+        # `!`, `:`, etc. are operators.)
+        if not terms:
+            return queryset
+
+        query = SearchQuery(
+            " & ".join(f"{term}:*" for term in terms),
+            search_type="raw",
+            config=self.config,
+        )
+        text = " ".join(terms)
+        return (
+            queryset.filter(
+                Q(search_vector=query) | Q(title__trigram_word_similar=text)
+            )
+            .annotate(
+                rank=SearchRank(F("search_vector"), query)
+                + TrigramWordSimilarity(text, "title")
+            )
+            .order_by("-rank", "id")
+        )
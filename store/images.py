@@ -0,0 +1,104 @@
+"""Product image variants: smaller copies of each uploaded `ProductImage`, in WebP
+too, so listings and the admin don't ship the (up to 1 MB) originals.
+
+Generated after the upload by a Celery task (`store.tasks.process_product_image`),
+stored alongside the original, itself named by its content (`product_image_path`):
+`store/images/<hash>.jpg` → `<hash>.thumb.jpg`, `<hash>.thumb.webp`, `<hash>.large.webp`
+— and exposed by `ProductImageSerializer` (`thumbnail`, `variants`)."""
+
+import hashlib
+from io import BytesIO
+from pathlib import PurePosixPath
+from typing import NamedTuple
+from PIL import Image, ImageOps
+
+
+# Hex digits of the content's SHA-256 in the file names:
+CONTENT_HASH_LENGTH = 32
+
+
+def product_image_path(instance, filename: str) -> str:
+    """`upload_to` of `ProductImage.image`: `store/images/<hash of the content>.<ext>`.
+
+    So an image's url always has the same bytes (another image is another name),
+    and can be cached for good (`Cache-Control: immutable`, see
+    `core.views.serve_media`)."""
+    file = instance.image.file
+    # (Hashed while it streamed in, by `store.uploads.ProductImageUploadHandler`.)
+    content_hash = getattr(file, "content_hash", None)
+    if content_hash is None:
+        digest = hashlib.sha256()
+        for chunk in file.chunks():
+            digest.update(chunk)
+        file.seek(0)
+        content_hash = digest.hexdigest()
+    extension = PurePosixPath(filename).suffix.lower()
+    return f"store/images/{content_hash[:CONTENT_HASH_LENGTH]}{extension}"
+
+
+class Variant(NamedTuple):
+    max_size: int  # px, of the longest side (smaller originals aren't upscaled)
+    format: str | None  # Pillow's; `None`: the original's (see `variant_format`)
+    suffix: str  # of the file name
+
+
+# (The variants' urls are cached for good too: changing how one is generated takes a
+# new `suffix`.)
+VARIANTS = {
+    # For lists (`ProductImageSerializer.thumbnail`, the admin's inline):
+    "thumbnail": Variant(320, None, "thumb"),
+    "thumbnail_webp": Variant(320, "WEBP", "thumb"),
+    # For the product page, in place of the original:
+    "webp": Variant(1600, "WEBP", "large"),
+}
+
+EXTENSIONS = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp"}
+
+SAVE_OPTIONS = {
+    "JPEG": {"quality": 80, "optimize": True, "progressive": True},
+    "PNG": {"optimize": True},
+    "WEBP": {"quality": 80, "method": 4},  # (`method`: 0 fastest … 6 smallest)
+}
+
+
+def variant_format(original: Image.Image, variant: Variant) -> str:
+    if variant.format is not None:
+        return variant.format
+    if original.format in EXTENSIONS:
+        return original.format
+    # (Other formats, e.g. GIF or BMP: PNG if there's transparency to keep.)
+    has_alpha = original.mode in ("RGBA", "LA", "PA") or "transparency" in (
+        original.info
+    )
+    return "PNG" if has_alpha else "JPEG"
+
+
+def render_variant(original: Image.Image, variant: Variant) -> tuple[bytes, str]:
+    """`variant` of the (`open_original`ed) `original`: its encoded bytes, and its
+    file extension."""
+
+    format = variant_format(original, variant)
+    image = original.copy()
+    image.thumbnail((variant.max_size, variant.max_size), Image.Resampling.LANCZOS)
+    if format == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")  # (no alpha in JPEG)
+    elif image.mode not in ("RGB", "RGBA", "L", "LA"):
+        image = image.convert("RGBA")  # e.g. palette ("P") images
+
+    output = BytesIO()
+    image.save(output, format, **SAVE_OPTIONS[format])
+    return output.getvalue(), EXTENSIONS[format]
+
+
+def open_original(file) -> Image.Image:
+    """The uploaded image, upright (photos are often stored rotated, with an EXIF
+    orientation tag that the browsers apply but Pillow doesn't)."""
+    with Image.open(file) as image:
+        upright = ImageOps.exif_transpose(image)
+        upright.format = image.format  # (lost by the transposed copy)
+        return upright
+
+
+def variant_name(original_name: str, variant: Variant, extension: str) -> str:
+    path = PurePosixPath(original_name)
+    return str(path.with_name(f"{path.stem}.{variant.suffix}.{extension}"))
@@ -0,0 +1,48 @@
+from timeit import repeat
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from store.models import Product
+from store.serializers import ProductListSerializer, ProductSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the per-item time of serializing a product list page with "
+        "`ProductSerializer` and with `ProductListSerializer` (serialization only: "
+        "the rows are loaded first)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=100)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+
+        items, runs = options["items"], options["repeat"]
+        request = Request(
+            APIRequestFactory().get("/store/products/", HTTP_HOST="localhost")
+        )
+        context = {"request": request}
+
+        products = list(Product.objects.prefetch_related("productimage_set")[:items])
+        rows = list(
+            Product.objects.with_price_plus_tax().values(
+                *ProductListSerializer.values_fields, "collection_id"
+            )[:items]
+        )
+        if not products:
+            raise CommandError("No products, seed the DB first (`seed_db`).")
+
+        # (`ProductListSerializer` queries the images itself — one query per page,
+        # counted in; `ProductSerializer`'s are prefetched above, not counted in.)
+        benchmarks = {
+            "ProductSerializer": lambda: ProductSerializer(
+                products, many=True, context=context
+            ).data,
+            "ProductListSerializer": lambda: ProductListSerializer(rows, context).data,
+        }
+        for name, serialize in benchmarks.items():
+            best = min(repeat(serialize, number=1, repeat=runs))  # seconds per page
+            per_item = best / len(products) * 1_000_000
+            print(f"{name:24} {per_item:8.1f} µs/item  ({len(products)} items)")
@@ -0,0 +1,57 @@
+from timeit import repeat
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from store.models import Order, Product
+from store.renderers import MessagePackRenderer, ORJSONRenderer, msgpack, orjson
+from store.serializers import OrderSerializer, ProductSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the time to render large `ProductSerializer` / `OrderSerializer` "
+        "pages with DRF's `JSONRenderer` and `store.renderers` (rendering only: the "
+        "pages are serialized first)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=1000)
+        parser.add_argument("--repeat", type=int, default=10)
+
+    def handle(self, *args, **options):
+
+        items, runs = options["items"], options["repeat"]
+        request = Request(
+            APIRequestFactory().get("/store/products/", HTTP_HOST="localhost")
+        )
+        context = {"request": request}
+
+        pages = {
+            "products": ProductSerializer(
+                Product.objects.prefetch_related("productimage_set")[:items],
+                many=True,
+                context=context,
+            ).data,
+            "orders": OrderSerializer(
+                Order.objects.prefetch_related("orderitem_set__product")[:items],
+                many=True,
+                context=context,
+            ).data,
+        }
+        if not pages["products"]:
+            raise CommandError("No products, seed the DB first (`seed_db`).")
+
+        renderers = [JSONRenderer()]
+        renderers += [ORJSONRenderer()] if orjson is not None else []
+        renderers += [MessagePackRenderer()] if msgpack is not None else []
+
+        for name, data in pages.items():
+            print(f"{name} ({len(data)} items):")
+            for renderer in renderers:
+                best = min(repeat(lambda: renderer.render(data), number=1, repeat=runs))
+                size = len(renderer.render(data))
+                print(
+                    f"  {type(renderer).__name__:20} {best * 1000:8.2f} ms "
+                    f"{size / 1024:10.1f} KiB"
+                )
@@ -0,0 +1,107 @@
+import re
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from store import urls
+from store.models import Collection
+
+
+User = get_user_model()
+
+# Extra query strings to check per viewset (`basename`), on top of the plain list:
+# the filter/search/ordering shapes clients actually send.
+# (`{collection_id}`: `ProductFilter` only accepts an existing collection)
+QUERY_SHAPES = {
+    "product": [
+        "collection_id={collection_id}",
+        "collection_id={collection_id}&unit_price__gt=10&unit_price__lt=20",
+        "ordering=unit_price",
+        "ordering=-last_update",
+        "search=coffee",
+    ],
+}
+
+SEQ_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs EXPLAIN for the list and detail queries of every viewset in "
+        "`store.urls` and flags the ones doing sequential scans"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--real-plans",
+            action="store_true",
+            help=(
+                "Don't disable sequential scans. (By default they're disabled, as on "
+                "a small (e.g. seeded, 1000 products) table Postgres rightly prefers "
+                "a seq scan anyway; with them disabled, a seq scan that's still chosen "
+                "means there's no usable index at all.)"
+            ),
+        )
+
+    def handle(self, *args, **options):
+
+        collection_id = Collection.objects.values_list("pk", flat=True).first()
+        if collection_id is None:
+            raise CommandError("No collections, seed the DB first (`seed_db`).")
+
+        factory = APIRequestFactory()
+        flagged = []
+
+        with transaction.atomic():
+            if not options["real_plans"]:
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+
+            for view, name, query_string in self.get_checks():
+                query_string = query_string.format(collection_id=collection_id)
+                view.request = Request(factory.get(f"/?{query_string}"))
+                # (a non-staff user: `OrderViewSet` filters by the user's customer)
+                view.request.user = User(id=1, is_staff=False)
+                queryset = view.filter_queryset(view.get_queryset())
+
+                page_size = view.paginator.get_page_size(view.request)
+                shapes = {
+                    "list": queryset[:page_size],
+                    "detail": queryset.filter(pk=1),
+                }
+                for shape, query in shapes.items():
+                    action = "list" if shape == "list" else "retrieve"
+                    if not hasattr(view, action):  # e.g. `CartViewSet` has no list
+                        continue
+                    plan = query.explain()
+                    tables = SEQ_SCAN.findall(plan)
+                    label = f"{name} {shape} ?{query_string}"
+                    if tables:
+                        flagged.append(label)
+                        self.stdout.write(
+                            self.style.WARNING(f"SEQ SCAN {label}: {', '.join(tables)}")
+                        )
+                        self.stdout.write(plan)
+                    else:
+                        self.stdout.write(self.style.SUCCESS(f"OK {label}"))
+
+            transaction.set_rollback(True)  # (only for the `SET LOCAL`)
+
+        if flagged:
+            raise CommandError(f"{len(flagged)} query shape(s) doing sequential scans")
+
+    def get_checks(self):
+        """Yield `(viewset instance, name, query string)` for every viewset registered
+        in `store.urls` (nested ones with their parent's url kwarg) and every query
+        shape in `QUERY_SHAPES`."""
+
+        routers = [urls.router, urls.product_router, urls.cart_router]
+        for router in routers:
+            # (`nest_prefix` ("product_") + "pk" is the url kwarg of a nested router)
+            parent_kwarg = getattr(router, "nest_prefix", None)
+            for prefix, viewset, basename in router.registry:
+                for query_string in [""] + QUERY_SHAPES.get(basename, []):
+                    view = viewset(action="list", format_kwarg=None)
+                    view.kwargs = {f"{parent_kwarg}pk": 1} if parent_kwarg else {}
+                    yield view, basename or prefix, query_string
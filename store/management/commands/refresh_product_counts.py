@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from store.models import Collection
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the stored `Collection.product_count` from the products table"
+
+    def handle(self, *args, **options):
+
+        print("Refreshing product counts...")
+        count = Collection.objects.refresh_product_count()
+        print(f"Success ({count} collection(s))")
@@ -2,6 +2,7 @@ from django.core.management.base import BaseCommand
 import os
 from pathlib import Path
 from django.db import connection
+from store.models import Collection
 
 
 class Command(BaseCommand):
@@ -17,4 +18,7 @@ class Command(BaseCommand):
         with connection.cursor() as cursor:
             cursor.execute(sql)
 
+        # Raw SQL bypasses the signals keeping `Collection.product_count` in sync:
+        Collection.objects.refresh_product_count()
+
         print("Success")
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:28
+# (then edited to add the `product_count` backfill)
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_product_counts(apps, schema_editor):
+    """Same as `CollectionQuerySet.refresh_product_count` (custom querysets aren't
+    available on the historical models here)."""
+    Collection = apps.get_model("store", "Collection")
+    Product = apps.get_model("store", "Product")
+    Collection.objects.update(
+        product_count=Coalesce(
+            Subquery(
+                Product.objects.filter(collection_id=OuterRef("pk"))
+                .order_by()
+                .values("collection_id")
+                .annotate(count=Count("id"))
+                .values("count")
+            ),
+            0,
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0021_alter_customer_birth_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collection',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_product_counts, migrations.RunPython.noop),
+    ]
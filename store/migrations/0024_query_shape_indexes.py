@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:31
+# (then edited to build the indexes `CONCURRENTLY`, so the tables aren't write-locked
+# while they build on a live DB)
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    atomic = False  # `CREATE INDEX CONCURRENTLY` can't run inside a transaction
+
+    dependencies = [
+        ('store', '0023_product_search'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='collection',
+            index=models.Index(fields=['title'], name='collection_title_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['customer', 'id'], name='order_customer_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(fields=['collection', 'unit_price'], name='product_collection_price_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(fields=['unit_price', 'id'], name='product_price_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(fields=['last_update', 'id'], name='product_last_update_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(condition=models.Q(('inventory__lt', 10)), fields=['inventory'], name='product_low_inventory_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='productimage',
+            index=models.Index(fields=['product', 'id'], name='productimage_product_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='review',
+            index=models.Index(fields=['product', 'id'], name='review_product_idx'),
+        ),
+    ]
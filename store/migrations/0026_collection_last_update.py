@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:50
+
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0025_order_event"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="collection",
+            name="last_update",
+            field=models.DateTimeField(
+                auto_now=True, db_default=django.db.models.functions.datetime.Now()
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:06
+
+import store.images
+import store.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0027_product_image_variants"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="productimage",
+            name="image",
+            field=models.ImageField(
+                upload_to=store.images.product_image_path,
+                validators=[store.validators.validate_product_image_size],
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0028_content_addressed_product_images"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="productimage",
+            name="processing_attempts",
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+    ]
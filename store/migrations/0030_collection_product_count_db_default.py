@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0029_product_image_processing_attempts"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="collection",
+            name="product_count",
+            field=models.PositiveIntegerField(db_default=0, default=0, editable=False),
+        ),
+    ]
@@ -1,26 +1,77 @@
 from decimal import Decimal
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, Sum, F, Value, OuterRef, Subquery, Prefetch
+from django.db.models.functions import Coalesce, Now, Round
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.contrib.postgres.indexes import GinIndex
 from django.conf import settings
+from django.utils import timezone
 from django.core.validators import MinValueValidator
 from uuid import uuid4
+from .images import product_image_path
 from .validators import validate_product_image_size
 
 
+# Output field for computed money values (`unit_price` × `quantity` and their sums),
+# `Product.unit_price` with room for the multiplication:
+PRICE_FIELD = models.DecimalField(max_digits=14, decimal_places=2)
+
+# `unit_price` × this = the price incl. tax (`price_plus_tax` in the API):
+TAX_MULTIPLIER = Decimal("1.1")
+
+
+class CollectionQuerySet(models.QuerySet):
+
+    def refresh_product_count(self) -> int:
+        """Recompute the stored `product_count` of these collections from the
+        products table (one UPDATE with a correlated subquery)."""
+        return self.update(
+            last_update=timezone.now(),
+            product_count=Coalesce(
+                Subquery(
+                    Product.objects.filter(collection_id=OuterRef("pk"))
+                    .order_by()
+                    .values("collection_id")
+                    .annotate(count=Count("id"))
+                    .values("count")
+                ),
+                0,
+            )
+        )
+
+
 class Collection(models.Model):
 
     title = models.CharField(max_length=255)
 
+    product_count = models.PositiveIntegerField(default=0, db_default=0, editable=False)
+    # Stored instead of `annotate(product_count=Count("product"))` on every read (a
+    # GROUP BY join over the whole product table). Kept exact by the product
+    # save/delete signals (`store.signals.handlers`) and `ProductQuerySet`'s bulk
+    # methods, rebuildable with `manage.py refresh_product_counts`.
+    # (`db_default` as well: `seed_db` inserts collections with raw SQL.)
+
+    last_update = models.DateTimeField(auto_now=True, db_default=Now())
+    # For the `ETag`/`Last-Modified` of `/collections/` (`store.conditional`): set on
+    # every change of the payload — `product_count` too, though it's only changed by
+    # `QuerySet.update`s (which skip `auto_now`), so they set it themselves.
+
     featured_product = models.OneToOneField(
         to="Product", on_delete=models.SET_NULL, null=True, related_name="+"
     )
     # IMPORTANT: Mosh has used `ForeignKey` but since any product can belong to only a single collection, any two collections won't have a same featured product, and hence no need of `ForeignKey`.
     # `related_name='+'`: avoid name clash by telling django to not create a reverse relationship field for this field.
 
+    objects = CollectionQuerySet.as_manager()
+
     def __str__(self) -> str:
         return self.title
 
     class Meta:
         ordering = ["title"]
+        indexes = [
+            models.Index(fields=["title"], name="collection_title_idx"),  # `ordering`
+        ]
 
 
 class Promotion(models.Model):
@@ -30,6 +81,60 @@ class Promotion(models.Model):
     discount = models.FloatField()
 
 
+class ProductQuerySet(models.QuerySet):
+
+    def with_price_plus_tax(self):
+        """Annotate `price_plus_tax` (`unit_price` × `TAX_MULTIPLIER`, rounded to the
+        cent, half away from zero) in SQL."""
+        return self.annotate(
+            price_plus_tax=Round(
+                F("unit_price") * Value(TAX_MULTIPLIER),
+                2,
+                output_field=PRICE_FIELD,
+            )
+        )
+
+    # `Model.save`/`delete` (and `QuerySet.delete`, which sends `post_delete` per
+    # row) keep `Collection.product_count` in sync through signals, but these bulk
+    # methods don't send any, so they refresh the affected collections themselves:
+
+    def update(self, **kwargs):
+        if "collection" not in kwargs and "collection_id" not in kwargs:
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db):
+            collection_ids = set(
+                self.order_by().values_list("collection_id", flat=True).distinct()
+            )
+            count = super().update(**kwargs)
+            new_collection = kwargs.get("collection", kwargs.get("collection_id"))
+            collection_ids.add(getattr(new_collection, "pk", new_collection))
+            Collection.objects.filter(pk__in=collection_ids).refresh_product_count()
+        return count
+
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            Collection.objects.filter(
+                pk__in={product.collection_id for product in objs}
+            ).refresh_product_count()
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        if "collection" not in fields and "collection_id" not in fields:
+            return super().bulk_update(objs, fields, *args, **kwargs)
+        objs = list(objs)
+        with transaction.atomic(using=self.db):
+            collection_ids = set(
+                self.filter(pk__in=[product.pk for product in objs])
+                .order_by()
+                .values_list("collection_id", flat=True)
+                .distinct()
+            ) | {product.collection_id for product in objs}
+            count = super().bulk_update(objs, fields, *args, **kwargs)
+            Collection.objects.filter(pk__in=collection_ids).refresh_product_count()
+        return count
+
+
 class Product(models.Model):
 
     title = models.CharField(max_length=255)  # -> varchar(255)
@@ -66,25 +171,109 @@ class Product(models.Model):
 
     promotions = models.ManyToManyField(to=Promotion, blank=True)
 
+    search_vector = models.GeneratedField(
+        expression=SearchVector("title", weight="A", config="english")
+        + SearchVector("description", weight="B", config="english"),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+    # Full-text search document for `?search=` (see `filters.ProductSearchFilter`).
+    # A generated column, so Postgres itself keeps it in sync on every write — `save`,
+    # `QuerySet.update`, `bulk_create`, even the raw SQL of `seed_db`.
+    # (Title weighted "A" so title matches rank above description-only ones.)
+
+    objects = ProductQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the collection as loaded, so a later `save` can tell if the
+        # product moved (for `Collection.product_count`, see `store.signals.handlers`):
+        # https://docs.djangoproject.com/en/5.2/ref/models/instances/#customizing-model-loading
+        instance._loaded_collection_id = instance.__dict__.get("collection_id")
+        return instance
+
     def __str__(self) -> str:
         return self.title
 
     class Meta:
         ordering = ["id"]  # default ordering of the queryset
+        indexes = [
+            # Matched to the API's query shapes (`ProductFilter`, `ordering_fields`,
+            # keyset pagination's `id` tie-breaker), verify with
+            # `manage.py check_query_plans`.
+            # `?collection_id=` (+ `unit_price__gt/lt`):
+            models.Index(
+                fields=["collection", "unit_price"],
+                name="product_collection_price_idx",
+            ),
+            # `?ordering=unit_price` / `?ordering=last_update`:
+            models.Index(fields=["unit_price", "id"], name="product_price_idx"),
+            models.Index(fields=["last_update", "id"], name="product_last_update_idx"),
+            # Partial — only the few low-inventory rows (`InventoryStatusListFilter`):
+            models.Index(
+                fields=["inventory"],
+                condition=models.Q(inventory__lt=10),
+                name="product_low_inventory_idx",
+            ),
+            GinIndex(fields=["search_vector"], name="product_search_vector_idx"),
+            # For the typo-tolerant fallback (`trigram_word_similar` on `title`):
+            GinIndex(
+                fields=["title"],
+                name="product_title_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ]
 
 
 class ProductImage(models.Model):
 
     image = models.ImageField(
-        upload_to="store/images", validators=[validate_product_image_size]
+        upload_to=product_image_path, validators=[validate_product_image_size]
     )
     # stores image in `MEDIA_ROOT/store/images/`, path in DB
+    # (named by its content's hash, see `store.images.product_image_path`)
 
     product = models.ForeignKey(to=Product, on_delete=models.CASCADE)
     # delete image(s) if product is deleted
 
+    variants = models.JSONField(default=dict, blank=True, editable=False)
+    # Variant name → stored file name of the resized/WebP copies of `image` (see
+    # `store.images.VARIANTS`), filled in by `store.tasks.process_product_image`
+    # after the upload, one by one as they're generated.
+
+    processed_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # When all the variants were generated (`None`: not yet, or `image` was replaced).
+
+    processing_attempts = models.PositiveSmallIntegerField(default=0, editable=False)
+    # Runs of `store.tasks.generate_variants` on `image`: past
+    # `MAX_IMAGE_PROCESSING_ATTEMPTS`, it's given up on (e.g. a file truncated after
+    # its header, which the upload's validation can't tell), served as is.
+
+    last_update = models.DateTimeField(auto_now=True, db_default=Now())
+    # (For `process_pending_product_images`: leaves the just uploaded ones to the task
+    # queued by their upload.)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Like `Product.from_db`: so a later `save` can tell if `image` was replaced
+        # (its variants then being stale, see `store.signals.handlers`).
+        instance._loaded_image_name = instance.__dict__.get("image")
+        return instance
+
     class Meta:
         ordering = ["id"]  # for consistent pagination
+        indexes = [
+            # `/products/<pk>/images/` (`ProductImageViewSet.get_queryset`):
+            models.Index(fields=["product", "id"], name="productimage_product_idx"),
+            # The few not processed yet (`store.tasks.process_pending_product_images`):
+            models.Index(
+                fields=["id"],
+                condition=models.Q(processed_at__isnull=True),
+                name="productimage_pending_idx",
+            ),
+        ]
 
 
 class Customer(models.Model):
@@ -151,6 +340,10 @@ class Order(models.Model):
         permissions = [
             ("cancel_order", "Can cancel order"),
         ]
+        indexes = [
+            # A customer's orders, already in `ordering` (`OrderViewSet.get_queryset`):
+            models.Index(fields=["customer", "id"], name="order_customer_idx"),
+        ]
 
 
 class OrderItem(models.Model):
@@ -172,6 +365,41 @@ class OrderItem(models.Model):
     # We've this since price can be changed, we want to track the price at the time of order. (Important to not miss!)
 
 
+class OrderEvent(models.Model):
+    """Outbox of order events: written in the same transaction as the order itself
+    (so there's an event iff the order committed), then dispatched to the signal's
+    receivers after commit by `store.tasks.dispatch_order_events` (a Celery worker),
+    not inside the checkout request."""
+
+    ORDER_CREATED = "order_created"
+    NAME_CHOICES = [(ORDER_CREATED, "Order created")]
+
+    name = models.CharField(max_length=50, choices=NAME_CHOICES)
+
+    order = models.ForeignKey(to=Order, on_delete=models.CASCADE)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    # Set once every receiver ran without raising; till then the event is picked up
+    # again by the next dispatch (at-least-once, so receivers must be idempotent —
+    # they get the `event_id` to dedupe on):
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # (Pending with `store.tasks.MAX_ORDER_EVENT_ATTEMPTS` of them: dead-lettered.)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            # Only the pending events are ever looked up, and there are few of them:
+            models.Index(
+                fields=["id"],
+                condition=models.Q(dispatched_at__isnull=True),
+                name="orderevent_pending_idx",
+            ),
+        ]
+
+
 class Address(models.Model):
 
     street = models.CharField(max_length=255)
@@ -188,6 +416,29 @@ class Address(models.Model):
     # Here, we can't add `primary_key=True`, because `customer` column in this table would have duplicate vals.
 
 
+class CartQuerySet(models.QuerySet):
+
+    def with_total_value(self):
+        """Annotate `total_value` (sum of quantity × price of the items) in SQL."""
+        return self.annotate(
+            total_value=Coalesce(
+                Sum(
+                    F("cartitem__quantity") * F("cartitem__product__unit_price"),
+                    output_field=PRICE_FIELD,
+                ),
+                Value(Decimal(0)),
+                output_field=PRICE_FIELD,
+            )
+        )
+
+    def with_totals(self):
+        """`with_total_value`, plus prefetch the items with their `total_price`
+        (`CartItemQuerySet.with_total_price`) — without loading any `Product`."""
+        return self.with_total_value().prefetch_related(
+            Prefetch("cartitem_set", queryset=CartItem.objects.with_total_price())
+        )
+
+
 class Cart(models.Model):
 
     id = models.UUIDField(primary_key=True, default=uuid4)
@@ -195,6 +446,19 @@ class Cart(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = CartQuerySet.as_manager()
+
+
+class CartItemQuerySet(models.QuerySet):
+
+    def with_total_price(self):
+        """Annotate `total_price` (quantity × the product's current price) in SQL."""
+        return self.annotate(
+            total_price=models.ExpressionWrapper(
+                F("quantity") * F("product__unit_price"), output_field=PRICE_FIELD
+            )
+        )
+
 
 class CartItem(models.Model):
 
@@ -204,6 +468,8 @@ class CartItem(models.Model):
 
     quantity = models.PositiveSmallIntegerField(validators=[MinValueValidator(1)])
 
+    objects = CartItemQuerySet.as_manager()
+
     class Meta:
         ordering = ["id"]  # for consistent pagination
         # Enforce Unique Product per Cart / Prevent duplicate cart items for same product:
@@ -224,3 +490,7 @@ class Review(models.Model):
 
     class Meta:
         ordering = ["id"]  # for consistent pagination
+        indexes = [
+            # `/products/<pk>/reviews/` (`ReviewViewSet.get_queryset`):
+            models.Index(fields=["product", "id"], name="review_product_idx"),
+        ]
@@ -0,0 +1,57 @@
+from rest_framework.pagination import PageNumberPagination, CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """Keyset (a.k.a. cursor / seek) pagination: instead of `OFFSET n` it filters on
+    the last seen value of the ordering field (`WHERE id > <last id>`), so page 1000
+    costs the same as page 1, and no `COUNT(*)` is ever run.
+    The cursors in `next`/`previous` are opaque (base64), clients just follow them."""
+
+    ordering = "id"  # the `Meta.ordering` of `Product` and `Order`
+    # (`?ordering=` from `OrderingFilter` (e.g. `unit_price`, `-last_update`) still
+    # wins over this, see `CursorPagination.get_ordering`.)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        # The cursor only stores the position of the 1st ordering field, and for
+        # non-unique ones (`unit_price`) skips the ties already seen by an offset —
+        # which only works if ties always come back in the same order, so add a
+        # unique tie-breaker:
+        if ordering[0].lstrip("-") not in ("id", "pk"):
+            ordering += ("id",)
+        return ordering
+
+
+class PageNumberOrKeysetPagination(PageNumberPagination):
+    """`PageNumberPagination` (the project default) unless the client opts in to
+    keyset pagination with `?pagination=keyset`.
+    (The `next`/`previous` urls keep that param, so following them stays in keyset
+    mode, and a url with a `cursor` is treated as keyset as well.)"""
+
+    keyset_query_param = "pagination"
+    keyset_query_value = "keyset"
+    keyset_pagination_class = KeysetPagination
+
+    keyset = None  # the `KeysetPagination` instance delegated to, if opted in
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if (
+            request.query_params.get(self.keyset_query_param) == self.keyset_query_value
+            or self.keyset_pagination_class.cursor_query_param in request.query_params
+        ):
+            self.keyset = self.keyset_pagination_class()
+            page = self.keyset.paginate_queryset(queryset, request, view)
+            # (for the browsable API)
+            self.display_page_controls = self.keyset.display_page_controls
+            return page
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def to_html(self):
+        if self.keyset is not None:
+            return self.keyset.to_html()
+        return super().to_html()
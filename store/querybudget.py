@@ -0,0 +1,143 @@
+"""Query budgets: how many SQL queries each viewset action may run per request.
+
+A viewset declares them (`query_budget = {"list": 2, ...}`, per action), and
+`QueryBudgetMiddleware` counts each request's queries, on every database (the
+replicas too), against its action's. Over budget → a warning in the logs, or, while
+testing (`QUERY_BUDGET_MODE = "raise"`), `QueryBudgetExceeded` — either with the
+queries that ran more than once: the same SQL with other params, usually an N+1
+(e.g. a serializer reading a relation that wasn't `select_related`).
+
+Budgets are the view's queries: authentication's are allowed on top
+(`authentication_queries`). Not counted: the queries of a streamed body
+(`store.exports`), run once the response is returned."""
+
+import logging
+import re
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+# Lists of placeholders (`IN (%s, %s, ...)`, the rows of a multi-row `VALUES`), of
+# any length, as one:
+PLACEHOLDERS = re.compile(r"\((?:%s, )*%s\)(?:, \((?:%s, )*%s\))*")
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def sql_shape(sql: str) -> str:
+    """`sql` without what varies between runs of the same query."""
+    return PLACEHOLDERS.sub("(...)", sql)
+
+
+class QueryLog:
+    """The queries run while recording (`record_queries`), per shape (`sql_shape`)."""
+
+    def __init__(self):
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        # (A `connection.execute_wrapper`.)
+        self.shapes[sql_shape(sql)] += 1
+        return execute(sql, params, many, context)
+
+    @property
+    def count(self) -> int:
+        return self.shapes.total()
+
+    def duplicates(self) -> dict[str, int]:
+        """The shapes run more than once, most run first."""
+        return {shape: runs for shape, runs in self.shapes.most_common() if runs > 1}
+
+
+@contextmanager
+def record_queries():
+    """The queries run inside the block, on all the databases. (Also for tests, e.g.
+    `with record_queries() as queries: ...`, then `queries.duplicates()`.)"""
+    log = QueryLog()
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(log))
+        yield log
+
+
+def view_budget(request) -> tuple[str, int] | None:
+    """The name (`ViewSet.action`) and query budget of the viewset action serving
+    `request` — `None` for other views, and actions without a budget."""
+    match = request.resolver_match
+    # (`as_view` of a viewset sets those: its class, and its actions per method.)
+    view_class = getattr(match.func, "cls", None) if match else None
+    actions = getattr(match.func, "actions", None) if match else None
+    if not actions:
+        return None
+    action = actions.get(request.method.lower())
+    budget = getattr(view_class, "query_budget", {}).get(action)
+    if budget is None:
+        return None
+    return f"{view_class.__name__}.{action}", budget
+
+
+def authentication_queries(request) -> int:
+    if "HTTP_AUTHORIZATION" in request.META:
+        return 1  # the JWT's user
+    if settings.SESSION_COOKIE_NAME in request.COOKIES:
+        return 2  # the session, its user (e.g. the browsable API)
+    return 0
+
+
+def check_budget(request, log: QueryLog):
+    name_and_budget = view_budget(request)
+    if name_and_budget is None:
+        return
+    name, budget = name_and_budget
+    budget += authentication_queries(request)
+    if log.count <= budget:
+        return
+    message = (
+        f"{request.method} {request.path} ({name}): {log.count} queries, "
+        f"budget {budget}"
+    )
+    duplicates = log.duplicates()
+    if duplicates:
+        message += "; run more than once:" + "".join(
+            f"\n  {runs}x {shape}" for shape, runs in duplicates.items()
+        )
+    if settings.QUERY_BUDGET_MODE == "raise":
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+class QueryBudgetMiddleware:
+    """Checks each request's queries against its viewset's budget, see the module
+    docstring. (`QUERY_BUDGET_MODE`: "warn", "raise", or `None`: not counted.)
+
+    Sync and async, like `store.replicas.PinToPrimaryMiddleware` — but only counts
+    under WSGI: under ASGI the views' queries run in a thread of their own, on its
+    connections."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if settings.QUERY_BUDGET_MODE is None:
+            return self.get_response(request)
+        with record_queries() as log:
+            response = self.get_response(request)
+        check_budget(request, log)
+        return response
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
@@ -0,0 +1,62 @@
+"""Faster renderers than DRF's `JSONRenderer` (stdlib `json`, with every `Decimal`
+price going through `JSONEncoder.default` in Python):
+- `ORJSONRenderer`: same `application/json` output, encoded by orjson (C),
+- `MessagePackRenderer`: `application/msgpack` — smaller, for clients that ask for
+  it (`Accept: application/msgpack`).
+Each is enabled in `REST_FRAMEWORK["DEFAULT_RENDERER_CLASSES"]` only if its package
+is installed; `manage.py benchmark_renderers` compares them."""
+
+from decimal import Decimal
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+_json_encoder = JSONEncoder()
+
+
+def default(obj):
+    """What neither orjson nor msgpack encode natively."""
+    if isinstance(obj, Decimal):
+        # Like DRF's `JSONEncoder` (`COERCE_DECIMAL_TO_STRING: False` → numbers):
+        return float(obj)
+    return _json_encoder.default(obj)  # lazy strings, querysets, etc.
+
+
+class ORJSONRenderer(BaseRenderer):
+
+    media_type = "application/json"
+    format = "json"
+    charset = None  # (JSON is always UTF-8)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        option = orjson.OPT_NON_STR_KEYS  # (like `json`: int keys → strings)
+        # `Accept: application/json; indent=4` (what the browsable API's "json"
+        # link asks for) — orjson only indents by 2:
+        if accepted_media_type and "indent=" in accepted_media_type:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=default, option=option)
+
+
+class MessagePackRenderer(BaseRenderer):
+
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None  # binary
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        # (`datetime`s are already strings here, formatted by the serializers.)
+        return msgpack.packb(data, default=default, use_bin_type=True)
@@ -0,0 +1,200 @@
+"""Read replicas for the catalog API.
+
+Safe (GET/HEAD/OPTIONS) requests to the viewsets using `ReplicaReadMixin` (products,
+collections, reviews, product images) read from one of `settings.DATABASE_REPLICAS`;
+everything else — carts, orders, customers, and all writes — stays on the primary
+(`default`):
+- a write pins the rest of the request to the primary (`ReplicaRouter.db_for_write`),
+- after a write, the client's next requests are pinned to the primary for
+  `REPLICA_PIN_SECONDS` too (`PinToPrimaryMiddleware`'s cookie), so it reads its own
+  writes even if the replicas haven't caught up yet,
+- a replica lagging more than `REPLICA_MAX_LAG` seconds behind isn't used (all of
+  them lagging → the primary),
+- what's stored and served again later (`store.cache`) is only read from a replica
+  that has replayed the writes it must show (`replayed_reads`), else the primary."""
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import monotonic
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DatabaseError, connections
+from rest_framework.permissions import SAFE_METHODS
+
+
+PIN_COOKIE = "pin_primary"
+
+# How long a measured replica lag is trusted, in seconds (so not every request
+# queries the lag of every replica):
+LAG_CHECK_INTERVAL = 5
+
+# Seconds the clocks of the app servers and of the primary may differ by
+# (`replica_replayed` compares a time from one with a commit time from the other):
+CLOCK_SKEW = 1
+
+# Whether the current request may read from a replica (per thread/task, like the
+# request itself):
+_read_from_replica: ContextVar[bool] = ContextVar("read_from_replica", default=False)
+
+# The time (UNIX) until which a replica must have replayed what the primary
+# committed to be read from (`replayed_reads`), `None`: any time.
+_replayed_since: ContextVar[float | None] = ContextVar("replayed_since", default=None)
+
+# Replica alias → (checked at (`monotonic()`), lag in seconds, commit time (UNIX) of
+# the last transaction it replayed), per process:
+_replica_checks: dict[str, tuple[float, float, float]] = {}
+
+
+def check_replica(alias: str) -> tuple[float, float]:
+    """The lag of a replica, and the commit time of the last transaction it
+    replayed — measured now (and kept for `replica_lag`/`replica_replayed`)."""
+    try:
+        with connections[alias].cursor() as cursor:
+            # Lag: 0 when everything received is replayed (else an idle primary
+            # would look like an ever-growing lag); also 0 when it isn't a standby
+            # at all — which has "replayed" everything, too:
+            cursor.execute("""
+                SELECT
+                    CASE
+                        WHEN NOT pg_is_in_recovery()
+                            OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()
+                        THEN 0
+                        ELSE extract(
+                            epoch FROM now() - pg_last_xact_replay_timestamp()
+                        )
+                    END,
+                    CASE
+                        WHEN NOT pg_is_in_recovery() THEN 'infinity'::float8
+                        ELSE extract(epoch FROM pg_last_xact_replay_timestamp())
+                    END
+                """)
+            lag, replayed_at = cursor.fetchone()
+            lag, replayed_at = float(lag or 0), float(replayed_at or 0)
+    except DatabaseError:  # replica down
+        lag, replayed_at = float("inf"), 0.0
+
+    _replica_checks[alias] = (monotonic(), lag, replayed_at)
+    return lag, replayed_at
+
+
+def replica_lag(alias: str) -> float:
+    checked = _replica_checks.get(alias)
+    if checked is not None and monotonic() - checked[0] < LAG_CHECK_INTERVAL:
+        return checked[1]
+    return check_replica(alias)[0]
+
+
+def replica_replayed(alias: str, since: float) -> bool:
+    """Whether a replica has replayed what the primary committed until `since` (a
+    UNIX time). Measured again unless it had already last time: a replayed commit
+    time only ever grows, but writes happen more often than `LAG_CHECK_INTERVAL`."""
+    since += CLOCK_SKEW
+    checked = _replica_checks.get(alias)
+    if checked is not None and checked[2] >= since:
+        return True
+    return check_replica(alias)[1] >= since
+
+
+def get_replica() -> str | None:
+    """A random replica not lagging behind too much (and in `replayed_reads`, that
+    has replayed what they need), `None` if there's none."""
+    since = _replayed_since.get()
+    replicas = list(settings.DATABASE_REPLICAS)
+    random.shuffle(replicas)  # (spreads the reads)
+    for alias in replicas:
+        if replica_lag(alias) <= settings.REPLICA_MAX_LAG and (
+            since is None or replica_replayed(alias, since)
+        ):
+            return alias
+    return None
+
+
+class ReplicaRouter:
+    """`DATABASE_ROUTERS` entry. (Returning `None` = the default, `default`.)"""
+
+    def db_for_read(self, model, **hints):
+        if _read_from_replica.get():
+            return get_replica()
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Read-your-writes: whatever this request reads after writing comes from the
+        # primary.
+        _read_from_replica.set(False)
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # (the replicas have the same data as the primary)
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS  # (they replicate `default`'s)
+
+
+@contextmanager
+def replica_reads(request):
+    """Within it, the reads of a safe, unpinned `request` may go to a replica."""
+    token = _read_from_replica.set(
+        request.method in SAFE_METHODS and PIN_COOKIE not in request.COOKIES
+    )
+    try:
+        yield
+    finally:
+        _read_from_replica.reset(token)
+
+
+@contextmanager
+def replayed_reads(since: float):
+    """Within it, reads only go to a replica that has replayed what the primary
+    committed until `since` (a UNIX time), else to the primary: for what's stored and
+    served again later (`store.cache`), a replica's lag would outlive the request."""
+    token = _replayed_since.set(since)
+    try:
+        yield
+    finally:
+        _replayed_since.reset(token)
+
+
+class ReplicaReadMixin:
+    """For viewsets whose safe requests may read from a replica."""
+
+    def dispatch(self, request, *args, **kwargs):
+        with replica_reads(request):
+            return super().dispatch(request, *args, **kwargs)
+
+
+class PinToPrimaryMiddleware:
+    """After a successful write, pin the client to the primary for a while.
+
+    (Sync and async: a sync-only middleware would cost every request under ASGI a
+    switch to a thread and back, see `store.async_views`.)"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        self.pin(request, response)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        self.pin(request, response)
+        return response
+
+    def pin(self, request, response):
+        if (
+            settings.DATABASE_REPLICAS
+            and request.method not in SAFE_METHODS
+            and response.status_code < 400
+        ):
+            response.set_cookie(
+                PIN_COOKIE, "1", max_age=settings.REPLICA_PIN_SECONDS, httponly=True
+            )
@@ -1,6 +1,10 @@
-from decimal import Decimal
-from django.db import transaction
+from collections import defaultdict
+from decimal import Decimal, ROUND_HALF_UP
+from uuid import UUID
+from django.db import models, transaction, connection
 from django.db.models import F
+from django.urls import reverse
+from django.utils import timezone
 from rest_framework import serializers
 from .models import (
     Product,
@@ -11,9 +15,14 @@ from .models import (
     Customer,
     Order,
     OrderItem,
+    OrderEvent,
     ProductImage,
+    TAX_MULTIPLIER,
 )
-from .signals import order_created
+from .cache import bump_product_cache_generation
+from .tasks import dispatch_order_events, process_product_images
+from .uploads import MAX_IMAGES_PER_REQUEST, StreamedImageUpload
+from .validators import validate_product_image_size
 
 
 class CollectionSerializer(serializers.ModelSerializer):
@@ -27,7 +36,8 @@ class CollectionSerializer(serializers.ModelSerializer):
         # Can't find the reason in the above link as well, but what's happening is, if a new field is defined here in the serializer,
         # or if an actual DB field is re-defined here in the serializer, then only `read_only` param would work.
 
-    # Since `product_count` is not a DB field:
+    # (`product_count` used to be an annotation (not a DB field), it's a stored one now
+    # (`Collection.product_count`), but still must not be writable by clients:)
     product_count = serializers.IntegerField(read_only=True)
     # `read_only=True`: Restrict adding/changing while `POST`/`PUT`/`PATCH`.
 
@@ -35,13 +45,48 @@ class CollectionSerializer(serializers.ModelSerializer):
     # title = serializers.CharField(max_length=255)
 
 
+class ProductImageField(serializers.ImageField):
+    """`ImageField` that doesn't open again (with Pillow, reading the whole file)
+    the uploads `ProductImageUploadHandler` already validated from their header."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, StreamedImageUpload):
+            if data.errors:
+                raise serializers.ValidationError(data.errors)
+            return serializers.FileField.to_internal_value(self, data)
+        return super().to_internal_value(data)
+
+
 class ProductImageSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = ProductImage
-        fields = ["id", "image"]
+        fields = ["id", "image", "thumbnail", "variants"]
         # not including "product" since it's already in the url (/products/1/images/)
 
+    serializer_field_mapping = serializers.ModelSerializer.serializer_field_mapping | {
+        models.ImageField: ProductImageField
+    }
+
+    # The small variant for lists — the original until it's generated (after the
+    # upload, see `store.images`):
+    thumbnail = serializers.SerializerMethodField()
+    # Variant name → url, those generated so far:
+    variants = serializers.SerializerMethodField()
+
+    def get_thumbnail(self, image: ProductImage) -> str | None:
+        name = image.variants.get("thumbnail") or image.image.name
+        return self.get_url(name) if name else None
+
+    def get_variants(self, image: ProductImage) -> dict[str, str]:
+        return {key: self.get_url(name) for key, name in image.variants.items()}
+
+    def get_url(self, name: str) -> str:
+        # Absolute when there's a request, like the `image` field:
+        url = ProductImage._meta.get_field("image").storage.url(name)
+        request = self.context.get("request")
+        return request.build_absolute_uri(url) if request is not None else url
+
     # Overriding to get the product (using product id from url), and attach (since it's a related field) to the image:
     def create(self, validated_data):
         # return ProductImage.objects.create(
@@ -53,6 +98,57 @@ class ProductImageSerializer(serializers.ModelSerializer):
         )
 
 
+class BulkProductImagesSerializer(serializers.Serializer):
+    """For `/products/<pk>/images/bulk/`: many images at once (e.g. onboarding a
+    catalog), stored in one `bulk_create` and processed by a single task."""
+
+    images = serializers.ListField(
+        child=ProductImageField(validators=[validate_product_image_size]),
+        allow_empty=False,
+        max_length=MAX_IMAGES_PER_REQUEST,
+    )
+    # (An error per invalid file, by its index: `{"images": {2: [...]}}`.)
+
+    def validate(self, data):
+        if not Product.objects.filter(pk=self.context["product_id"]).exists():
+            raise serializers.ValidationError("No product with the given ID was found.")
+        return data
+
+    def save(self, **kwargs) -> list[ProductImage]:
+        product_id = self.context["product_id"]
+        field = ProductImage._meta.get_field("image")
+
+        # The files first: `bulk_create` doesn't save them (`FieldFile.save`) like
+        # `create` does. (Moved, not copied: they're temporary files already, see
+        # `store.uploads`.)
+        names = []
+        try:
+            for image in self.validated_data["images"]:
+                # (`upload_to` names it by its content, see `product_image_path`.)
+                name = field.generate_filename(ProductImage(image=image), image.name)
+                names.append(
+                    field.storage.save(name, image, max_length=field.max_length)
+                )
+
+            with transaction.atomic():
+                images = ProductImage.objects.bulk_create(
+                    [ProductImage(product_id=product_id, image=name) for name in names]
+                )
+                # What `ProductImage`'s `post_save` receivers do (`bulk_create`
+                # doesn't send it), once for the batch:
+                Product.objects.filter(pk=product_id).update(last_update=timezone.now())
+                transaction.on_commit(bump_product_cache_generation)
+                image_ids = [image.id for image in images]
+                transaction.on_commit(
+                    lambda: process_product_images.delay(image_ids), robust=True
+                )
+        except Exception:
+            for name in names:  # (no row references them)
+                field.storage.delete(name)
+            raise
+        return images
+
+
 class ProductSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -76,7 +172,13 @@ class ProductSerializer(serializers.ModelSerializer):
     price_plus_tax = serializers.SerializerMethodField(method_name="get_price_plus_tax")
 
     def get_price_plus_tax(self, product: Product):
-        return round(product.unit_price * Decimal('1.1'), 2)
+        # Annotated in SQL (`Product.objects.with_price_plus_tax()`), else computed
+        # here — rounded the same way as Postgres' `round()`:
+        if hasattr(product, "price_plus_tax"):
+            return product.price_plus_tax
+        return (product.unit_price * TAX_MULTIPLIER).quantize(
+            Decimal("0.01"), rounding=ROUND_HALF_UP
+        )
 
     # - To see collection id of each product:
     # collection = serializers.PrimaryKeyRelatedField(queryset=Collection.objects.all())
@@ -98,6 +200,78 @@ class ProductSerializer(serializers.ModelSerializer):
     productimage_set = ProductImageSerializer(many=True, read_only=True)
 
 
+class ProductListSerializer:
+    """Read-only `ProductSerializer(products, many=True)` for list pages, same output,
+    from `.values()` rows (`values_fields`, `price_plus_tax` annotated in SQL) —
+    without DRF's per-field, per-row machinery, which costs far more than the SQL:
+    - `price_plus_tax` comes from SQL (was a `SerializerMethodField`),
+    - `collection` urls come from one `reverse()` per page (was one per row),
+    - the images come from one `.values_list()` query (was `ProductImageSerializer`
+      per image).
+    (`manage.py benchmark_product_serializers` compares the two.)"""
+
+    # `ProductSerializer`'s fields, but those built in `data` (from `collection_id`,
+    # and a query of their own), as is from the rows:
+    values_fields = [
+        field
+        for field in ProductSerializer.Meta.fields
+        if field not in ("collection", "productimage_set")
+    ]
+
+    # Any pk the url pattern accepts, split on afterwards:
+    PK_PLACEHOLDER = "__pk__"
+
+    def __init__(self, rows, context):
+        self.rows = rows
+        self.context = context
+
+    @property
+    def data(self) -> list[dict]:
+        request = self.context["request"]
+        collection_url = request.build_absolute_uri(
+            reverse("collection-detail", kwargs={"pk": self.PK_PLACEHOLDER})
+        )
+        url_prefix, url_suffix = collection_url.split(self.PK_PLACEHOLDER)
+
+        images = self.get_images([row["id"] for row in self.rows])
+
+        return [
+            {
+                **{field: row[field] for field in self.values_fields},
+                "collection": f"{url_prefix}{row['collection_id']}{url_suffix}",
+                "productimage_set": images.get(row["id"], []),
+            }
+            for row in self.rows
+        ]
+
+    def get_images(self, product_ids) -> dict[int, list[dict]]:
+        # Absolute urls like DRF's `ImageField` (`request.build_absolute_uri(url)`),
+        # with the scheme + host computed once:
+        origin = self.context["request"].build_absolute_uri("/")[:-1]
+        storage = ProductImage._meta.get_field("image").storage
+
+        def absolute_url(name):
+            url = storage.url(name)
+            return origin + url if url.startswith("/") else url
+
+        images = defaultdict(list)
+        for id, product_id, name, variants in ProductImage.objects.filter(
+            product_id__in=product_ids
+        ).values_list("id", "product_id", "image", "variants"):
+            thumbnail = variants.get("thumbnail") or name
+            images[product_id].append(
+                {
+                    "id": id,
+                    "image": absolute_url(name) if name else None,
+                    "thumbnail": absolute_url(thumbnail) if thumbnail else None,
+                    "variants": {
+                        key: absolute_url(variant) for key, variant in variants.items()
+                    },
+                }
+            )
+        return images
+
+
 class ReviewSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -132,6 +306,15 @@ class SimpleProductSerializer(serializers.ModelSerializer):
         fields = ["id", "title", "unit_price"]
 
 
+def parse_cart_id(cart_id) -> UUID:
+    """The cart id from the url as a `UUID`, or a 400 if it's malformed (instead of
+    a 500 from Postgres / Django's `UUIDField`)."""
+    try:
+        return UUID(str(cart_id))
+    except ValueError:
+        raise serializers.ValidationError("No cart with the given ID was found.")
+
+
 class CartItemSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -143,49 +326,56 @@ class CartItemSerializer(serializers.ModelSerializer):
     total_price = serializers.SerializerMethodField(method_name="get_total_price")
 
     def get_total_price(self, item: CartItem):
+        # Computed in SQL when fetched with `CartItemQuerySet.with_total_price` (the
+        # cart/item viewsets do), here only for an item that wasn't (a just-added one):
+        if hasattr(item, "total_price"):
+            return item.total_price
         return item.product.unit_price * item.quantity
 
-    def validate(self, data):
-        # The cart is deleted when an order is placed (`CreateOrderSerializer.save`),
-        # so a client re-using a stale cart id would otherwise hit an
-        # `IntegrityError` (500) on create below:
-        if not Cart.objects.filter(id=self.context["cart_id"]).exists():
-            raise serializers.ValidationError("No cart with the given ID was found.")
-        return data
-
     def save(self, **kwargs):
-        cart_id = self.context["cart_id"]
-        quantity = self.validated_data["quantity"]
-
-        with transaction.atomic():
-            # Re-check the cart under a lock (`validate` above already checked, but
-            # without one): checkout (`CreateOrderSerializer.save`) locks this same
-            # cart row before consuming the cart, so an add racing a checkout waits
-            # here and then 400s when the cart is gone, instead of 500ing on the
-            # cart FK (`IntegrityError`):
-            if not Cart.objects.select_for_update().filter(pk=cart_id).exists():
-                raise serializers.ValidationError(
-                    "No cart with the given ID was found."
-                )
-
-            # `get_or_create` instead of get → except `DoesNotExist` → create:
-            # two concurrent adds of the same product would both take the create path,
-            # and the loser would 500 on the `unique_together` constraint —
-            # `get_or_create` resolves that race internally (retries the get):
-            self.instance, created = CartItem.objects.get_or_create(
-                cart_id=cart_id,
-                product=self.validated_data["product"],
-                defaults={"quantity": quantity},
+        # (No `exists()` check of the cart in a `validate` first: the statement
+        # below checks it, atomically.)
+        cart_id = parse_cart_id(self.context["cart_id"])
+        product = self.validated_data["product"]
+
+        # A single statement (an upsert), instead of lock the cart → `get_or_create`
+        # → `F()` update → `refresh_from_db` (up to 5 round trips, serialized per cart):
+        # - `ON CONFLICT` on the `unique_together` (cart, product) constraint either
+        #   inserts the item or increments its quantity in the DB — two concurrent
+        #   adds of the same product can neither 500 on the constraint nor lose an
+        #   update,
+        # - selecting the cart `FOR KEY SHARE` (the lock a FK check takes anyway) keeps
+        #   it from being deleted under us without blocking other adds to the same
+        #   cart, but it does wait for a checkout (`CreateOrderSerializer.save`), which
+        #   locks the cart `FOR UPDATE` — and once that deletes the cart, nothing is
+        #   selected, nothing inserted, and we 400 below instead of 500ing on the FK,
+        # - `RETURNING` gives back the resulting row, no re-fetch.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO store_cartitem (cart_id, product_id, quantity)
+                SELECT id, %(product_id)s, %(quantity)s
+                FROM store_cart WHERE id = %(cart_id)s
+                FOR KEY SHARE
+                ON CONFLICT (cart_id, product_id) DO UPDATE
+                SET quantity = store_cartitem.quantity + EXCLUDED.quantity
+                RETURNING id, quantity
+                """,
+                {
+                    "cart_id": cart_id,
+                    "product_id": product.id,
+                    "quantity": self.validated_data["quantity"],
+                },
             )
-            if not created:
-                # `F()` increments in the DB, so two concurrent adds can't read the
-                # same old quantity and lose one of the updates:
-                self.instance.quantity = F("quantity") + quantity
-                self.instance.save(update_fields=["quantity"])
-                # Refresh, else `quantity` stays an unserializable SQL expression
-                # (`CombinedExpression`) instead of the resulting number:
-                self.instance.refresh_from_db(fields=["quantity"])
+            row = cursor.fetchone()
+
+        if row is None:  # no such cart (stale id, or consumed by a checkout)
+            raise serializers.ValidationError("No cart with the given ID was found.")
 
+        id, quantity = row
+        self.instance = CartItem(
+            id=id, cart_id=cart_id, product=product, quantity=quantity
+        )
         return self.instance
 
 
@@ -196,6 +386,75 @@ class UpdateCartItemSerializer(serializers.ModelSerializer):
         fields = ["quantity"]
 
 
+class BulkCartItemSerializer(serializers.Serializer):
+    """One entry of `BulkCartItemsSerializer.items`."""
+
+    product = serializers.IntegerField()
+    # (Not a `PrimaryKeyRelatedField`: that'd be a query per item, all the ids are
+    # checked in one query in `BulkCartItemsSerializer.validate_items` instead.)
+
+    quantity = serializers.IntegerField(min_value=0, max_value=32767)
+    # The new quantity of the product in the cart (not an increment like when posting
+    # a single item), `0` removes it. (Max: `PositiveSmallIntegerField`.)
+
+
+class BulkCartItemsSerializer(serializers.Serializer):
+    """For `/carts/<pk>/items/bulk/`: add, update and remove many items at once
+    (e.g. restoring a saved basket), in one transaction."""
+
+    items = BulkCartItemSerializer(many=True, allow_empty=False)
+
+    def validate_items(self, items):
+        product_ids = [item["product"] for item in items]
+        if len(set(product_ids)) != len(product_ids):
+            raise serializers.ValidationError("Each product can only be given once.")
+        existing_ids = set(
+            Product.objects.filter(id__in=product_ids).values_list("id", flat=True)
+        )
+        if missing_ids := [id for id in product_ids if id not in existing_ids]:
+            raise serializers.ValidationError(
+                f"No product(s) with the given ID(s): {missing_ids}."
+            )
+        return items
+
+    def save(self, **kwargs):
+        cart_id = parse_cart_id(self.context["cart_id"])
+        items = self.validated_data["items"]
+
+        with transaction.atomic():
+            # Lock the cart (`no_key`: `FOR NO KEY UPDATE`, which doesn't block the
+            # single-item upserts in `CartItemSerializer.save`, but does wait for (and
+            # then 400 after) a checkout consuming the cart, like there):
+            cart = Cart.objects.select_for_update(no_key=True).filter(pk=cart_id)
+            if not cart.exists():
+                raise serializers.ValidationError(
+                    "No cart with the given ID was found."
+                )
+
+            # All the adds/updates in one upsert (`INSERT ... ON CONFLICT DO UPDATE`):
+            CartItem.objects.bulk_create(
+                [
+                    CartItem(
+                        cart_id=cart_id,
+                        product_id=item["product"],
+                        quantity=item["quantity"],
+                    )
+                    for item in items
+                    if item["quantity"] > 0
+                ],
+                update_conflicts=True,
+                unique_fields=["cart", "product"],
+                update_fields=["quantity"],
+            )
+            # And all the removes in one DELETE:
+            removed_ids = [item["product"] for item in items if item["quantity"] == 0]
+            CartItem.objects.filter(
+                cart_id=cart_id, product_id__in=removed_ids
+            ).delete()
+
+        return Cart.objects.with_totals().get(pk=cart_id)
+
+
 class CartSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -209,11 +468,25 @@ class CartSerializer(serializers.ModelSerializer):
     total_value = serializers.SerializerMethodField(method_name="get_total_value")
 
     def get_total_value(self, cart: Cart):
+        # Same as `CartItemSerializer.get_total_price` (`CartQuerySet.with_totals`),
+        # here only for a cart that wasn't fetched with it (a just-created one):
+        if hasattr(cart, "total_value"):
+            return cart.total_value
         return sum(
-            item.product.unit_price * item.quantity for item in cart.cartitem_set.all()
+            item.product.unit_price * item.quantity
+            for item in cart.cartitem_set.select_related("product")
         )
 
 
+class CartSummarySerializer(serializers.Serializer):
+    """For `/carts/<pk>/summary/`: just the totals, no items."""
+
+    id = serializers.UUIDField()
+    item_count = serializers.IntegerField()  # number of distinct products
+    total_quantity = serializers.IntegerField()
+    total_value = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+
 class CustomerSerializer(serializers.ModelSerializer):
     class Meta:
         model = Customer
@@ -251,18 +524,19 @@ class OrderSerializer(serializers.ModelSerializer):
     orderitem_set = OrderItemSerializer(many=True, read_only=True)
 
 
+class OutOfStockError(Exception):
+    """Raised by `CreateOrderSerializer.save` when some products of the cart don't
+    have enough inventory left (→ 409 in `OrderViewSet.create`)."""
+
+    def __init__(self, products: list[dict]):
+        super().__init__(products)
+        self.products = products  # `product_id`, `title`, `requested`, `available`
+
+
 class CreateOrderSerializer(serializers.Serializer):
 
     cart_id = serializers.UUIDField()
 
-    def validate_cart_id(self, cart_id):
-        if not Cart.objects.filter(id=cart_id).exists():
-            raise serializers.ValidationError("No cart with given cart id.")
-        if not CartItem.objects.filter(cart_id=cart_id).exists():
-            raise serializers.ValidationError("Cart is empty.")
-        # Why add `exists`: https://docs.djangoproject.com/en/6.0/ref/models/querysets/#exists
-        return cart_id
-
     def save(self, **kwargs):
 
         cart_id = self.validated_data["cart_id"]
@@ -282,28 +556,87 @@ class CreateOrderSerializer(serializers.Serializer):
             )
             order = Order.objects.create(customer_id=customer.id)
 
-            # Create order items:
-            cart_items = CartItem.objects.select_related("product").filter(
-                cart_id=cart_id
-            )
-            order_items = [
-                OrderItem(
-                    order_id=order.id,
-                    product_id=cart_item.product_id,
-                    quantity=cart_item.quantity,
-                    unit_price=cart_item.product.unit_price,
+            # Lock the cart's products in a fixed order (by id) before reserving
+            # their inventory: else two orders sharing products lock them in whatever
+            # order the `UPDATE` below happens to visit them, and can deadlock (one
+            # holds product 1 waiting for 2, the other holds 2 waiting for 1).
+            # (Locked, their `inventory` can't change till we commit, so it's also
+            # what's reported if there isn't enough.)
+            stock = {
+                product["product_id"]: product
+                for product in Product.objects.filter(cartitem__cart_id=cart_id)
+                .order_by("id")
+                .select_for_update(no_key=True, of=("self",))
+                .values(
+                    "title",
+                    product_id=F("id"),
+                    requested=F("cartitem__quantity"),
+                    available=F("inventory"),
                 )
-                for cart_item in cart_items
-            ]
-            OrderItem.objects.bulk_create(order_items)
-
-            # Delete cart:
-            Cart.objects.filter(pk=cart_id).delete()
-            # (`filter` not `get`: one less query, and no `DoesNotExist` → 500 if
-            # the cart is already gone)
-
-            # Custom signal:
-            order_created.send_robust(sender=self.__class__, order=order)
+            }
+
+            # Everything else in one set-based statement, instead of loading the cart
+            # items (+ products) into Python, building `OrderItem`s, `bulk_create`,
+            # then deleting the cart (same number of queries for 1 or 100 items):
+            # - `reserved`: take the items' quantities from the products' inventory —
+            #   only where there's enough (`WHERE inventory >= quantity`, re-checked
+            #   by Postgres on the latest row version if a concurrent order changed
+            #   it, so no overselling) — `RETURNING` the price to snapshot,
+            # - `ordered`: copy the reserved items into the order (`INSERT ... SELECT`),
+            # - delete the cart and its items,
+            # - return the count of the items, and the products that weren't reserved.
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    """
+                    WITH items AS (
+                        SELECT product_id, quantity FROM store_cartitem
+                        WHERE cart_id = %(cart_id)s
+                    ), reserved AS (
+                        UPDATE store_product AS product
+                        SET inventory = product.inventory - items.quantity,
+                            last_update = now()
+                        FROM items
+                        WHERE product.id = items.product_id
+                            AND product.inventory >= items.quantity
+                        RETURNING product.id, product.unit_price, items.quantity
+                    ), ordered AS (
+                        INSERT INTO store_orderitem
+                            (order_id, product_id, quantity, unit_price)
+                        SELECT %(order_id)s, id, quantity, unit_price FROM reserved
+                    ), deleted_items AS (
+                        DELETE FROM store_cartitem WHERE cart_id = %(cart_id)s
+                    ), deleted_cart AS (
+                        DELETE FROM store_cart WHERE id = %(cart_id)s
+                    )
+                    SELECT
+                        (SELECT count(*) FROM items),
+                        ARRAY(
+                            SELECT product_id FROM items
+                            EXCEPT SELECT id FROM reserved
+                            ORDER BY 1
+                        )
+                    """,
+                    {"cart_id": cart_id, "order_id": order.id},
+                )
+                item_count, out_of_stock_ids = cursor.fetchone()
+
+            # (Raising inside `atomic` rolls all of the above back, cart included.)
+            if item_count == 0:
+                raise serializers.ValidationError("Cart is empty.")
+            if out_of_stock_ids:
+                raise OutOfStockError([stock[id] for id in out_of_stock_ids])
+
+            # The raw `UPDATE` above bypasses `post_save`, and `inventory` is part of
+            # the cached product payloads:
+            transaction.on_commit(bump_product_cache_generation)
+
+            # Custom signal — not sent here (its receivers would run inside this
+            # transaction, before commit, adding to checkout latency): the event goes to
+            # the outbox with the order, and a Celery worker dispatches it after commit
+            # (`robust`: a down broker doesn't fail an already-committed checkout; the
+            # periodic dispatch picks the event up):
+            OrderEvent.objects.create(name=OrderEvent.ORDER_CREATED, order=order)
+            transaction.on_commit(dispatch_order_events.delay, robust=True)
 
             return order
 
@@ -1,10 +1,121 @@
 from django.dispatch import receiver
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.conf import settings
-from ..models import Customer
+from ..models import Customer, Product, ProductImage, Collection
+from ..cache import bump_product_cache_generation
+from ..tasks import process_product_image
 
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_customer_for_new_user(sender, created, instance, **kwargs):
     if created:
         Customer.objects.create(user_id=instance.id)
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=ProductImage)
+@receiver([post_save, post_delete], sender=Collection)
+def invalidate_product_cache(sender, **kwargs):
+    # `on_commit`: bumping right away would let a concurrent request re-cache the
+    # old (not yet committed) rows under the new generation:
+    transaction.on_commit(bump_product_cache_generation)
+
+
+@receiver([post_save, post_delete], sender=ProductImage)
+def touch_product_on_image_change(sender, instance, **kwargs):
+    # The images are part of the product's payload, so its `last_update` (its
+    # `ETag`/`Last-Modified`, see `store.conditional`) has to change with them:
+    Product.objects.filter(pk=instance.product_id).update(last_update=timezone.now())
+
+
+# Product image variants (`store.images`):
+
+
+def delete_variant_files(image: ProductImage, variants: dict[str, str]):
+    # `on_commit`: the rows still reference them until then (and a rollback keeps them).
+    storage = image.image.storage
+
+    def delete():
+        for name in variants.values():
+            storage.delete(name)
+
+    transaction.on_commit(delete)
+
+
+@receiver(pre_save, sender=ProductImage)
+def reset_variants_on_new_image(sender, instance, update_fields=None, **kwargs):
+    instance._image_changed = (update_fields is None or "image" in update_fields) and (
+        instance.image.name != getattr(instance, "_loaded_image_name", None)
+    )
+    if instance._image_changed:
+        if instance.variants:
+            delete_variant_files(instance, instance.variants)  # (of the previous image)
+        instance.variants = {}
+        instance.processed_at = None
+        instance.processing_attempts = 0
+
+
+@receiver(post_save, sender=ProductImage)
+def queue_image_processing(sender, instance, **kwargs):
+    if instance._image_changed and instance.image:
+        image_id = instance.pk
+        # `on_commit`: the worker must find the row (like `CreateOrderSerializer`'s
+        # `dispatch_order_events`); `robust`: if the broker's down,
+        # `process_pending_product_images` catches up.
+        transaction.on_commit(
+            lambda: process_product_image.delay(image_id), robust=True
+        )
+    instance._loaded_image_name = instance.image.name
+
+
+@receiver(post_delete, sender=ProductImage)
+def delete_image_variants(sender, instance, **kwargs):
+    if instance.variants:
+        delete_variant_files(instance, instance.variants)
+
+
+# Keeping `Collection.product_count` exact:
+
+
+@receiver(pre_save, sender=Product)
+def remember_previous_collection(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not {"collection", "collection_id"} & set(
+        update_fields
+    ):
+        instance._previous_collection_id = instance.collection_id  # not changing
+        return
+    # Set by `Product.from_db`; only a product that wasn't loaded from the DB (or
+    # was loaded without its `collection`, e.g. `.only(...)`) costs a query here:
+    previous = getattr(instance, "_loaded_collection_id", None)
+    if previous is None and instance.pk is not None:
+        previous = (
+            Product.objects.filter(pk=instance.pk)
+            .values_list("collection_id", flat=True)
+            .first()
+        )
+    instance._previous_collection_id = previous  # `None` for a new product
+
+
+@receiver(post_save, sender=Product)
+def update_product_count_on_save(sender, instance, **kwargs):
+    previous, current = instance._previous_collection_id, instance.collection_id
+    if previous != current:
+        # `F()` so concurrent saves can't lose each other's increments:
+        if previous is not None:
+            Collection.objects.filter(pk=previous).update(
+                product_count=F("product_count") - 1, last_update=timezone.now()
+            )
+        Collection.objects.filter(pk=current).update(
+            product_count=F("product_count") + 1, last_update=timezone.now()
+        )
+    instance._loaded_collection_id = current
+
+
+@receiver(post_delete, sender=Product)
+def update_product_count_on_delete(sender, instance, **kwargs):
+    Collection.objects.filter(pk=instance.collection_id).update(
+        product_count=F("product_count") - 1, last_update=timezone.now()
+    )
@@ -0,0 +1,206 @@
+import logging
+from datetime import timedelta
+from celery import shared_task
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from PIL import UnidentifiedImageError
+from .cache import bump_product_cache_generation
+from .images import VARIANTS, open_original, render_variant, variant_name
+from .models import OrderEvent, Product, ProductImage
+from .signals import order_created
+
+
+logger = logging.getLogger(name=__name__)
+
+OUTBOX_BATCH_SIZE = 100
+
+# Dispatches of an `OrderEvent` whose receivers keep raising before it's left out
+# (dead-lettered: still pending, logged, never sent again — a poison event would
+# otherwise run every receiver again on every beat tick):
+MAX_ORDER_EVENT_ATTEMPTS = 10
+
+# Images not processed this long after their upload are queued again by
+# `process_pending_product_images` (their own task was lost, or failed for good):
+IMAGE_PROCESSING_GRACE = timedelta(minutes=5)
+PENDING_IMAGES_BATCH_SIZE = 500
+
+# Runs of `generate_variants` on an image (its task's retries, and the re-queued
+# ones) before giving up on it: else one failing for good would be re-queued forever.
+MAX_IMAGE_PROCESSING_ATTEMPTS = 10
+
+# Event name → the signal its receivers are connected to:
+SIGNALS = {OrderEvent.ORDER_CREATED: order_created}
+
+
+@shared_task(ignore_result=True)  # (nothing waits for it)
+def dispatch_order_events(batch_size: int = OUTBOX_BATCH_SIZE):
+    """Send the pending `OrderEvent`s to their signal's receivers, `batch_size` at a
+    time, and mark them dispatched.
+
+    Queued after every checkout commits (`CreateOrderSerializer.save`), and by
+    `CELERY_BEAT_SCHEDULE` every minute to pick up whatever that missed (broker down,
+    worker killed mid-batch, a receiver raised)."""
+
+    dispatched = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            # `skip_locked`: concurrent workers take different batches instead of
+            # waiting on (and then re-sending) each other's.
+            # (`id__gt`: events that failed in this run are retried by the next one.)
+            events = list(
+                OrderEvent.objects.filter(
+                    dispatched_at__isnull=True,
+                    attempts__lt=MAX_ORDER_EVENT_ATTEMPTS,
+                    id__gt=last_id,
+                )
+                .select_related("order")
+                .select_for_update(skip_locked=True, of=("self",))[:batch_size]
+            )
+            if not events:
+                return dispatched
+
+            done, failed = [], []
+            for event in events:
+                # Each event's receivers in a savepoint of their own: one raising a
+                # database error aborts the transaction, which only rolling back to
+                # the savepoint recovers (else the `UPDATE`s below would fail too, and
+                # the whole batch stay pending, its attempts uncounted, forever).
+                savepoint = transaction.savepoint()
+                responses = SIGNALS[event.name].send_robust(
+                    sender=OrderEvent, order=event.order, event_id=event.id
+                )
+                errors = [r for _, r in responses if isinstance(r, Exception)]
+                if errors:
+                    transaction.savepoint_rollback(savepoint)
+                else:
+                    transaction.savepoint_commit(savepoint)
+                for error in errors:
+                    logger.error(f"OrderEvent {event.id} ({event.name}): {error!r}")
+                if errors and event.attempts + 1 >= MAX_ORDER_EVENT_ATTEMPTS:
+                    logger.error(
+                        f"OrderEvent {event.id} ({event.name}): dead-lettered after "
+                        f"{MAX_ORDER_EVENT_ATTEMPTS} attempts"
+                    )
+                (failed if errors else done).append(event.id)
+
+            # (Two `UPDATE`s per batch, not one per event.)
+            OrderEvent.objects.filter(id__in=done).update(
+                dispatched_at=timezone.now(), attempts=F("attempts") + 1
+            )
+            OrderEvent.objects.filter(id__in=failed).update(attempts=F("attempts") + 1)
+
+        dispatched += len(done)
+        last_id = events[-1].id
+
+
+def generate_variants(image_id: int) -> ProductImage | None:
+    """Generate the missing variants (`store.images.VARIANTS`) of a `ProductImage`,
+    return it if it has all of them now (`None` if there was nothing to do).
+
+    Resumable: each variant is recorded as soon as it's stored, so a rerun only
+    generates the ones still missing."""
+
+    image = ProductImage.objects.filter(pk=image_id).first()
+    if image is None or image.processed_at is not None or not image.image:
+        return None  # (deleted since, or already done)
+    name = image.image.name
+    # Only while `image` is still the one being processed (not replaced since):
+    current = ProductImage.objects.filter(pk=image_id, image=name)
+
+    if image.processing_attempts >= MAX_IMAGE_PROCESSING_ATTEMPTS:
+        logger.error(f"ProductImage {image_id}: gave up on {name}")
+        return None
+    # (Counted before trying: a run killed midway counts too.)
+    current.update(processing_attempts=F("processing_attempts") + 1)
+
+    try:
+        with image.image.open("rb"):
+            original = open_original(image.image)
+    except UnidentifiedImageError:
+        # (Not retried: it won't get any more readable. Served as is.)
+        logger.error(f"ProductImage {image_id}: {name} can't be decoded")
+        current.update(processed_at=timezone.now())
+        return None
+
+    storage = image.image.storage
+    for variant_key, variant in VARIANTS.items():
+        if variant_key in image.variants:
+            continue
+        content, extension = render_variant(original, variant)
+        stored = storage.save(
+            variant_name(name, variant, extension), ContentFile(content)
+        )
+        image.variants[variant_key] = stored
+        if not current.update(variants=image.variants):
+            storage.delete(stored)  # replaced meanwhile, its own task handles it
+            return None
+
+    current.update(processed_at=timezone.now())
+    return image
+
+
+def publish_variants(product_ids):
+    # The products' payloads have the new urls (like `touch_product_on_image_change`,
+    # `invalidate_product_cache` — skipped by `update()`):
+    Product.objects.filter(pk__in=product_ids).update(last_update=timezone.now())
+    bump_product_cache_generation()
+
+
+@shared_task(
+    acks_late=True,
+    autoretry_for=(OSError,),  # (storage errors)
+    retry_backoff=True,
+    max_retries=5,
+    ignore_result=True,
+)
+def process_product_image(image_id: int):
+    """Generate the variants of a `ProductImage` (`generate_variants`).
+
+    Queued after every upload commits (`store.signals.handlers`). A retried run — or
+    a re-delivered one, after its worker died (`acks_late`) — resumes."""
+    image = generate_variants(image_id)
+    if image is not None:
+        publish_variants([image.product_id])
+
+
+@shared_task(acks_late=True, ignore_result=True)
+def process_product_images(image_ids: list[int]):
+    """`process_product_image` for a batch (`/products/<pk>/images/bulk/`): one
+    message for the whole upload, and the cache invalidated once, not per image.
+
+    An image failing doesn't stop the others: it gets a task of its own, with its
+    retries."""
+    product_ids = set()
+    for image_id in image_ids:
+        try:
+            image = generate_variants(image_id)
+        except OSError as e:
+            logger.error(f"ProductImage {image_id}: {e!r}, retried on its own")
+            process_product_image.delay(image_id)
+            continue
+        if image is not None:
+            product_ids.add(image.product_id)
+    if product_ids:
+        publish_variants(product_ids)
+
+
+@shared_task(ignore_result=True)
+def process_pending_product_images(batch_size: int = PENDING_IMAGES_BATCH_SIZE):
+    """Queue `process_product_image` for the images still not processed after
+    `IMAGE_PROCESSING_GRACE` (by `CELERY_BEAT_SCHEDULE`), e.g. the ones uploaded
+    before the variants existed — not the ones given up on."""
+    image_ids = list(
+        ProductImage.objects.filter(
+            processed_at__isnull=True,
+            last_update__lt=timezone.now() - IMAGE_PROCESSING_GRACE,
+            processing_attempts__lt=MAX_IMAGE_PROCESSING_ATTEMPTS,
+        )
+        .exclude(image="")
+        .values_list("id", flat=True)[:batch_size]
+    )
+    for image_id in image_ids:
+        process_product_image.delay(image_id)
+    return len(image_ids)
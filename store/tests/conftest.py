@@ -3,6 +3,8 @@
 from rest_framework.test import APIClient
 import pytest
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from storefront.celery import app
 
 
 User = get_user_model()
@@ -20,3 +22,27 @@ def authenticate(api_client):
         api_client.force_authenticate(user=User(is_staff=is_staff))
 
     return func
+
+
+@pytest.fixture(autouse=True)
+def enforce_query_budgets(settings):
+    # (Over a viewset's query budget, see `store.querybudget`: the test fails.)
+    settings.QUERY_BUDGET_MODE = "raise"
+
+
+@pytest.fixture
+def locmem_cache(settings):
+    # (The dev Redis isn't there while testing, and a down cache is a miss.)
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def eager_celery():
+    # (No broker while testing: run the tasks, chord included, in-process.)
+    app.conf.task_always_eager = True
+    yield
+    app.conf.task_always_eager = False
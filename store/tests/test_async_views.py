@@ -0,0 +1,91 @@
+import pytest
+from django.contrib.auth import get_user_model
+from rest_framework import status
+from model_bakery import baker
+from store.models import Collection, Product, ProductImage, Review
+
+
+User = get_user_model()
+
+
+# FIXTURES:
+
+
+@pytest.fixture
+def catalog():
+    collection = baker.make(Collection)
+    products = baker.make(Product, collection=collection, _quantity=15)
+    baker.make(ProductImage, product=products[0])
+    for _ in range(3):
+        baker.make(Review, product=products[0], customer=baker.make(User).customer)
+    return products
+
+
+def get_both(api_client, path, **params):
+    """The responses of the DRF (sync) endpoint and of its async variant."""
+    sync = api_client.get(f"/store/{path}", data=params)
+    async_ = api_client.get(f"/store/async/{path}", data=params)
+    return sync, async_
+
+
+# ----------------------------------------------------------------------
+
+
+# TESTS:
+
+
+@pytest.mark.django_db
+class TestAsyncCatalogViews:
+
+    @pytest.mark.parametrize("page", [1, 2])
+    def test_product_list_matches_sync(self, api_client, catalog, page):
+
+        sync, async_ = get_both(api_client, "products/", page=page)
+
+        assert async_.status_code == status.HTTP_200_OK
+        assert async_.json()["count"] == sync.data["count"]
+        assert async_.json()["results"] == sync.json()["results"]
+        assert bool(async_.json()["next"]) == bool(sync.data["next"])
+        assert bool(async_.json()["previous"]) == bool(sync.data["previous"])
+
+    def test_product_list_filter(self, api_client, catalog):
+
+        collection_id = catalog[0].collection_id
+        sync, async_ = get_both(api_client, "products/", collection_id=collection_id)
+        _, invalid = get_both(api_client, "products/", collection_id=0)
+
+        assert async_.json()["results"] == sync.json()["results"]
+        assert invalid.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_product_detail_matches_sync(self, api_client, catalog):
+
+        sync, async_ = get_both(api_client, f"products/{catalog[0].id}/")
+
+        assert async_.status_code == status.HTTP_200_OK
+        assert async_.json() == sync.json()
+        assert len(async_.json()["productimage_set"]) == 1
+
+    def test_missing_product_returns_404(self, api_client):
+
+        _, async_ = get_both(api_client, "products/0/")
+
+        assert async_.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_invalid_page_returns_404(self, api_client, catalog):
+
+        _, async_ = get_both(api_client, "products/", page=99)
+
+        assert async_.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_collection_and_review_lists_match_sync(self, api_client, catalog):
+
+        for path in ["collections/", f"products/{catalog[0].id}/reviews/"]:
+            sync, async_ = get_both(api_client, path)
+            assert async_.status_code == status.HTTP_200_OK
+            assert async_.json()["results"] == sync.json()["results"]
+
+    def test_writes_are_not_allowed(self, api_client):
+
+        response = api_client.post("/store/async/collections/", data={"title": "a"})
+
+        assert response.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
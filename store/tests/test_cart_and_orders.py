@@ -1,9 +1,14 @@
 import pytest
+from decimal import Decimal
+from uuid import uuid4
+from threading import Thread
+from django.db import connection
 from rest_framework import status
 from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
 from django.contrib.auth import get_user_model
 from model_bakery import baker
-from store.models import Product, Cart, CartItem, Order
+from store.models import Product, Cart, CartItem, Order, OrderItem
 from store.serializers import CartItemSerializer
 
 
@@ -20,7 +25,7 @@ def cart():
 
 @pytest.fixture
 def product():
-    return baker.make(Product)
+    return baker.make(Product, inventory=100)  # (enough for any order below)
 
 
 @pytest.fixture
@@ -38,6 +43,63 @@ def add_cart_item(api_client, cart):
 # TESTS:
 
 
+@pytest.mark.django_db
+class TestRetrieveCart:
+
+    @pytest.fixture
+    def items(self, cart):
+        return [
+            CartItem.objects.create(
+                cart=cart,
+                product=baker.make(Product, unit_price=Decimal(price)),
+                quantity=quantity,
+            )
+            for price, quantity in [("2.50", 2), ("10.00", 3)]
+        ]
+
+    def test_totals_are_computed_without_loading_products(
+        self, api_client, cart, items, django_assert_num_queries
+    ):
+
+        # The cart (with its total) + its items (with their totals), no products:
+        with django_assert_num_queries(2):
+            response = api_client.get(path=f"/store/carts/{cart.id}/")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["total_value"] == Decimal("35.00")
+        assert [item["total_price"] for item in response.data["cartitem_set"]] == [
+            Decimal("5.00"),
+            Decimal("30.00"),
+        ]
+
+    def test_summary(self, api_client, cart, items, django_assert_num_queries):
+
+        with django_assert_num_queries(1):
+            response = api_client.get(path=f"/store/carts/{cart.id}/summary/")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {
+            "id": str(cart.id),
+            "item_count": 2,
+            "total_quantity": 5,
+            "total_value": Decimal("35.00"),
+        }
+
+    def test_summary_of_empty_cart(self, api_client, cart):
+
+        response = api_client.get(path=f"/store/carts/{cart.id}/summary/")
+
+        assert response.data["item_count"] == response.data["total_quantity"] == 0
+        assert response.data["total_value"] == 0
+
+    @pytest.mark.parametrize("cart_id", [uuid4(), "not-a-uuid"])
+    def test_summary_of_missing_cart_returns_404(self, api_client, cart_id):
+
+        response = api_client.get(path=f"/store/carts/{cart_id}/summary/")
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
 @pytest.mark.django_db
 class TestAddCartItem:
 
@@ -71,6 +133,28 @@ class TestAddCartItem:
 
         assert response.status_code == status.HTTP_400_BAD_REQUEST
 
+    def test_malformed_cart_id_returns_400(self, api_client, product):
+
+        response = api_client.post(
+            path="/store/carts/not-a-uuid/items/",
+            data={"product": product.id, "quantity": 1},
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_add_is_a_single_write_statement(
+        self, add_cart_item, product, django_assert_num_queries
+    ):
+
+        add_cart_item(data={"product": product.id, "quantity": 1})
+
+        # The product lookup (validation) + the upsert:
+        with django_assert_num_queries(2):
+            response = add_cart_item(data={"product": product.id, "quantity": 1})
+
+        assert response.data["quantity"] == 2
+        assert response.data["total_price"] == product.unit_price * 2
+
     def test_cart_deleted_between_validate_and_save_raises_400(self, cart, product):
         """Deterministic replay of the add-item vs. checkout race: the cart passes
         validation, then checkout consumes (deletes) it before `save` runs. The
@@ -91,6 +175,28 @@ class TestAddCartItem:
             serializer.save()
 
 
+@pytest.mark.django_db(transaction=True)  # (real commits, for the other threads)
+def test_concurrent_adds_of_same_product_lose_no_update():
+
+    cart, product = baker.make(Cart), baker.make(Product)
+
+    def add():
+        serializer = CartItemSerializer(
+            data={"product": product.id, "quantity": 1}, context={"cart_id": cart.id}
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        connection.close()  # (each thread has its own connection)
+
+    threads = [Thread(target=add) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert CartItem.objects.get(cart=cart, product=product).quantity == 10
+
+
 @pytest.mark.django_db
 class TestCreateOrder:
 
@@ -131,6 +237,58 @@ class TestCreateOrder:
         assert second.status_code == status.HTTP_400_BAD_REQUEST
         assert Order.objects.count() == 1
 
+    def test_inventory_is_reserved_and_price_snapshotted(
+        self, api_client, cart, product
+    ):
+
+        CartItem.objects.create(cart=cart, product=product, quantity=3)
+        api_client.force_authenticate(user=baker.make(User))
+
+        response = self.create_order(api_client, cart.id)
+
+        product.refresh_from_db()
+        assert response.status_code == status.HTTP_201_CREATED
+        assert product.inventory == 97
+        assert OrderItem.objects.get().unit_price == product.unit_price
+
+    def test_not_enough_inventory_returns_409_and_changes_nothing(
+        self, api_client, cart, product
+    ):
+
+        low = baker.make(Product, inventory=1)
+        CartItem.objects.create(cart=cart, product=product, quantity=3)
+        CartItem.objects.create(cart=cart, product=low, quantity=2)
+        api_client.force_authenticate(user=baker.make(User))
+
+        response = self.create_order(api_client, cart.id)
+
+        assert response.status_code == status.HTTP_409_CONFLICT
+        assert response.data["products"] == [
+            {"product_id": low.id, "title": low.title, "requested": 2, "available": 1}
+        ]
+        assert not Order.objects.exists()
+        assert CartItem.objects.filter(cart=cart).count() == 2  # cart kept
+        product.refresh_from_db()
+        assert product.inventory == 100  # (the reserved one is rolled back too)
+
+    @pytest.mark.parametrize("item_count", [1, 20])
+    def test_query_count_does_not_grow_with_cart_size(
+        self, api_client, cart, item_count, django_assert_num_queries
+    ):
+
+        for product in baker.make(Product, inventory=10, _quantity=item_count):
+            CartItem.objects.create(cart=cart, product=product, quantity=1)
+        user = baker.make(User)
+        api_client.force_authenticate(user=user)
+
+        # savepoint, lock cart, customer, order, lock products, the set-based
+        # statement, outbox event, release savepoint, then the response: order +
+        # items + products:
+        with django_assert_num_queries(11):
+            response = self.create_order(api_client, cart.id)
+
+        assert len(response.data["orderitem_set"]) == item_count
+
     def test_empty_cart_returns_400(self, api_client, cart):
 
         api_client.force_authenticate(user=baker.make(User))
@@ -138,3 +296,138 @@ class TestCreateOrder:
         response = self.create_order(api_client, cart.id)
 
         assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db(transaction=True)  # (real commits, for the other threads)
+def test_concurrent_checkouts_never_oversell():
+
+    # 20 customers racing for the last 5 units of `scarce`, each also ordering
+    # `common` (and the carts list them in different orders — no deadlocks either):
+    scarce = baker.make(Product, inventory=5)
+    common = baker.make(Product, inventory=100)
+    carts = []
+    for i in range(20):
+        cart = baker.make(Cart)
+        first, second = (scarce, common) if i % 2 else (common, scarce)
+        CartItem.objects.create(cart=cart, product=first, quantity=1)
+        CartItem.objects.create(cart=cart, product=second, quantity=1)
+        carts.append((cart, baker.make(User)))
+    status_codes = []
+
+    def checkout(cart, user):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        response = client.post(path="/store/orders/", data={"cart_id": cart.id})
+        status_codes.append(response.status_code)
+        connection.close()  # (each thread has its own connection)
+
+    threads = [Thread(target=checkout, args=args) for args in carts]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(status_codes) == [201] * 5 + [409] * 15
+    scarce.refresh_from_db()
+    common.refresh_from_db()
+    assert scarce.inventory == 0
+    assert common.inventory == 95  # (the 15 refused orders reserved nothing)
+    assert OrderItem.objects.filter(product=scarce).count() == 5
+
+
+@pytest.mark.django_db
+class TestListOrders:
+
+    def test_staff_can_page_orders_with_keyset_pagination(self, api_client):
+
+        # (`user.customer`, not `baker.make(Customer)`: see `test_reviews.py`)
+        customer = baker.make(User).customer
+        orders = baker.make(Order, customer=customer, _quantity=15)
+        api_client.force_authenticate(user=baker.make(User, is_staff=True))
+
+        first = api_client.get(path="/store/orders/", data={"pagination": "keyset"})
+        second = api_client.get(path=first.data["next"])
+
+        assert first.status_code == second.status_code == status.HTTP_200_OK
+        assert "count" not in first.data
+        ids = [order["id"] for order in first.data["results"] + second.data["results"]]
+        assert ids == [order.id for order in orders]
+        assert second.data["next"] is None
+
+
+@pytest.mark.django_db
+class TestBulkCartItems:
+
+    def bulk(self, api_client, cart, items):
+        return api_client.post(
+            path=f"/store/carts/{cart.id}/items/bulk/",
+            data={"items": items},
+            format="json",
+        )
+
+    def test_adds_updates_and_removes_in_one_request(self, api_client, cart):
+
+        kept, updated, removed, added = baker.make(Product, _quantity=4)
+        CartItem.objects.create(cart=cart, product=kept, quantity=1)
+        CartItem.objects.create(cart=cart, product=updated, quantity=1)
+        CartItem.objects.create(cart=cart, product=removed, quantity=1)
+
+        response = self.bulk(
+            api_client,
+            cart,
+            [
+                {"product": updated.id, "quantity": 5},
+                {"product": removed.id, "quantity": 0},
+                {"product": added.id, "quantity": 2},
+            ],
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["id"] == str(cart.id)
+        quantities = {
+            item["product"]: item["quantity"] for item in response.data["cartitem_set"]
+        }
+        assert quantities == {kept.id: 1, updated.id: 5, added.id: 2}
+
+    def test_unknown_product_rejects_whole_batch(self, api_client, cart, product):
+
+        response = self.bulk(
+            api_client,
+            cart,
+            [{"product": product.id, "quantity": 1}, {"product": 0, "quantity": 1}],
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert not CartItem.objects.filter(cart=cart).exists()
+
+    def test_duplicate_product_returns_400(self, api_client, cart, product):
+
+        response = self.bulk(
+            api_client,
+            cart,
+            [{"product": product.id, "quantity": 1}] * 2,
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_stale_cart_id_returns_400(self, api_client, cart, product):
+
+        cart.delete()
+
+        response = self.bulk(api_client, cart, [{"product": product.id, "quantity": 1}])
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_query_count_does_not_grow_with_items(
+        self, api_client, cart, django_assert_max_num_queries
+    ):
+
+        products = baker.make(Product, _quantity=30)
+        items = [{"product": product.id, "quantity": 1} for product in products]
+
+        # validate ids, lock cart, upsert, delete, then the cart + items + products
+        # (+ savepoint):
+        with django_assert_max_num_queries(8):
+            response = self.bulk(api_client, cart, items)
+
+        assert len(response.data["cartitem_set"]) == 30
@@ -1,6 +1,7 @@
 import pytest
 from rest_framework import status
-from store.models import Collection
+from django.core.management import call_command
+from store.models import Collection, Product
 from model_bakery import baker
 
 
@@ -94,3 +95,84 @@ class TestRetrieveCollection:
             "title": collection.title,
             "product_count": 0,
         }
+
+
+@pytest.mark.django_db
+class TestCollectionProductCount:
+
+    def product_count(self, collection):
+        collection.refresh_from_db(fields=["product_count"])
+        return collection.product_count
+
+    def test_create_move_and_delete_product(self):
+
+        old, new = baker.make(Collection, _quantity=2)
+        product = baker.make(Product, collection=old)
+        assert self.product_count(old) == 1
+
+        product = Product.objects.get(pk=product.pk)  # (loaded, like the API does)
+        product.collection = new
+        product.save()
+        assert (self.product_count(old), self.product_count(new)) == (0, 1)
+
+        product.delete()
+        assert self.product_count(new) == 0
+
+    def test_save_of_product_not_loaded_from_db(self):
+
+        old, new = baker.make(Collection, _quantity=2)
+        product = baker.make(Product, collection=old)
+
+        Product(
+            pk=product.pk,
+            title="X",
+            unit_price=1,
+            inventory=1,
+            last_update=product.last_update,
+            collection=new,
+        ).save()
+
+        assert (self.product_count(old), self.product_count(new)) == (0, 1)
+
+    def test_bulk_paths(self):
+
+        old, new = baker.make(Collection, _quantity=2)
+
+        Product.objects.bulk_create(
+            baker.prepare(Product, collection=old, _quantity=3)
+        )
+        assert self.product_count(old) == 3
+
+        Product.objects.filter(pk=Product.objects.first().pk).update(collection=new)
+        assert (self.product_count(old), self.product_count(new)) == (2, 1)
+
+        products = list(Product.objects.filter(collection=old))
+        for product in products:
+            product.collection = new
+        Product.objects.bulk_update(products, fields=["collection"])
+        assert (self.product_count(old), self.product_count(new)) == (0, 3)
+
+        Product.objects.all().delete()
+        assert self.product_count(new) == 0
+
+    def test_refresh_command_rebuilds_counts(self):
+
+        collection = baker.make(Collection)
+        baker.make(Product, collection=collection, _quantity=2)
+        Collection.objects.update(product_count=0)  # out of sync
+
+        call_command("refresh_product_counts")
+
+        assert self.product_count(collection) == 2
+
+    def test_endpoint_serves_stored_count_in_one_query(
+        self, api_client, django_assert_num_queries
+    ):
+
+        collection = baker.make(Collection)
+        baker.make(Product, collection=collection, _quantity=2)
+
+        with django_assert_num_queries(1):
+            response = api_client.get(path=f"/store/collections/{collection.id}/")
+
+        assert response.data["product_count"] == 2
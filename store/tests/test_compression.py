@@ -0,0 +1,154 @@
+import gzip
+import json
+import zlib
+import brotli
+import pytest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory
+from model_bakery import baker
+from store import compression
+from store.compression import CompressionMiddleware, accepted_encoding
+from store.models import Product
+
+
+PRODUCTS_URL = "/store/products/"
+
+
+@pytest.fixture
+def products():
+    return baker.make(Product, _quantity=25)
+
+
+def request_accepting(encodings):
+    return RequestFactory().get("/", HTTP_ACCEPT_ENCODING=encodings)
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("", None),
+        ("gzip, deflate", "gzip"),
+        ("GZIP;q=0.5", "gzip"),
+        ("gzip;q=0", None),
+        ("*", "gzip"),
+        ("*, gzip;q=0", None),
+        ("identity", None),
+    ],
+)
+def test_accepted_encoding(header, expected, monkeypatch):
+
+    monkeypatch.setattr(compression, "ENCODINGS", ("gzip",))  # (brotli or not)
+
+    assert accepted_encoding(request_accepting(header)) == expected
+
+
+def test_brotli_preferred_unless_gzip_is_more_accepted(monkeypatch):
+
+    monkeypatch.setattr(compression, "ENCODINGS", ("br", "gzip"))
+
+    assert accepted_encoding(request_accepting("gzip, br")) == "br"
+    assert accepted_encoding(request_accepting("gzip, br;q=0.5")) == "gzip"
+
+
+class TestMiddleware:
+
+    def compress(self, response, encodings="gzip"):
+        return CompressionMiddleware(lambda request: response)(
+            request_accepting(encodings)
+        )
+
+    def test_large_json_is_gzipped(self):
+
+        body = json.dumps([{"title": "Product", "id": i} for i in range(100)]).encode()
+        response = self.compress(
+            HttpResponse(body, content_type="application/json", headers={"ETag": '"1"'})
+        )
+
+        assert response["Content-Encoding"] == "gzip"
+        assert response["Vary"] == "Accept-Encoding"
+        assert response["ETag"] == 'W/"1"'
+        assert int(response["Content-Length"]) == len(response.content) < len(body)
+        assert gzip.decompress(response.content) == body
+
+    @pytest.mark.parametrize(
+        "body, content_type",
+        [
+            (b"{}", "application/json"),  # too small
+            (b"<p>" * 1000, "text/html; charset=utf-8"),  # (BREACH)
+            (b"\x89PNG" * 1000, "image/png"),  # already compressed
+        ],
+    )
+    def test_not_compressed(self, body, content_type):
+
+        response = self.compress(HttpResponse(body, content_type=content_type))
+
+        assert not response.has_header("Content-Encoding")
+        assert response.content == body
+
+    def test_streaming_chunks_are_flushed(self):
+
+        rows = [f'{{"id": {i}}}\n'.encode() for i in range(3)]
+        response = self.compress(
+            StreamingHttpResponse(iter(rows), content_type="application/x-ndjson")
+        )
+
+        assert response["Content-Encoding"] == "gzip"
+        assert not response.has_header("Content-Length")
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        # Each row can be decompressed as soon as its chunk arrives:
+        for row, chunk in zip(rows, response.streaming_content):
+            assert decompressor.decompress(chunk) == row
+
+    def test_brotli(self):
+
+        body = json.dumps([{"title": "Product", "id": i} for i in range(100)]).encode()
+        response = self.compress(
+            HttpResponse(body, content_type="application/json"), "br, gzip"
+        )
+
+        assert response["Content-Encoding"] == "br"
+        assert brotli.decompress(response.content) == body
+
+
+@pytest.mark.django_db
+class TestProductResponses:
+
+    def test_list_is_gzipped(self, api_client, products):
+
+        plain = api_client.get(path=PRODUCTS_URL)
+        compressed = api_client.get(path=PRODUCTS_URL, HTTP_ACCEPT_ENCODING="gzip")
+
+        assert compressed["Content-Encoding"] == "gzip"
+        assert gzip.decompress(compressed.content) == plain.content
+
+    @pytest.mark.usefixtures("locmem_cache")
+    def test_cached_compressed_body_is_served_as_is(
+        self, api_client, products, monkeypatch, django_assert_num_queries
+    ):
+
+        first = api_client.get(path=PRODUCTS_URL, HTTP_ACCEPT_ENCODING="gzip")
+        compressions = []
+        monkeypatch.setattr(
+            compression, "compress", lambda *args: compressions.append(args)
+        )
+
+        with django_assert_num_queries(0):
+            second = api_client.get(path=PRODUCTS_URL, HTTP_ACCEPT_ENCODING="gzip")
+
+        assert compressions == []  # (nor rendered)
+        assert second["Content-Encoding"] == "gzip"
+        assert second["Content-Type"] == first["Content-Type"]
+        assert "Accept-Encoding" in second["Vary"]
+        assert second.content == first.content
+
+    @pytest.mark.usefixtures("locmem_cache")
+    def test_cached_compressed_body_is_per_format(self, api_client, products):
+
+        api_client.get(path=PRODUCTS_URL, HTTP_ACCEPT_ENCODING="gzip")
+        indented = api_client.get(
+            path=PRODUCTS_URL,
+            HTTP_ACCEPT="application/json; indent=4",
+            HTTP_ACCEPT_ENCODING="gzip",
+        )
+
+        assert b"\n" in gzip.decompress(indented.content)
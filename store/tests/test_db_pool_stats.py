@@ -0,0 +1,37 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.db import connection
+from model_bakery import baker
+from psycopg_pool import ConnectionPool
+
+
+User = get_user_model()
+
+
+@pytest.mark.django_db
+class TestDbPoolStats:
+
+    def test_non_staff_is_redirected_to_login(self, client):
+
+        client.force_login(baker.make(User))
+
+        response = client.get("/db-pool-stats/")
+
+        assert response.status_code == 302
+
+    def test_staff_gets_stats_per_database(self, client, settings):
+
+        settings.GUNICORN_WORKERS, settings.GUNICORN_THREADS = 3, 4
+        client.force_login(baker.make(User, is_staff=True))
+
+        response = client.get("/db-pool-stats/")
+
+        assert response.status_code == 200
+        assert "default" in response.json()["pools"]
+        assert response.json()["max_connections"] == 12
+
+
+def test_pool_checks_the_connections_it_hands_out():
+
+    # (`CONN_HEALTH_CHECKS`, see `DATABASE_CONNECTION`.)
+    assert connection.pool._check == ConnectionPool.check_connection
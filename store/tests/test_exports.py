@@ -0,0 +1,154 @@
+import csv
+import gzip
+import json
+import pytest
+from decimal import Decimal
+from io import StringIO
+from django.contrib.auth import get_user_model
+from rest_framework import status
+from model_bakery import baker
+from store import exports
+from store.models import Collection, Order, OrderItem, Product
+
+
+User = get_user_model()
+
+ORDERS_EXPORT_URL = "/store/orders/export/"
+PRODUCTS_EXPORT_URL = "/store/products/export/"
+
+
+@pytest.fixture
+def orders():
+    customer = baker.make(User).customer
+    products = baker.make(Product, unit_price=Decimal("10.00"), _quantity=3)
+    with_items, without_items = baker.make(Order, customer=customer, _quantity=2)
+    for product in products:
+        baker.make(
+            OrderItem,
+            order=with_items,
+            product=product,
+            quantity=2,
+            unit_price=Decimal("9.99"),
+        )
+    return with_items, without_items
+
+
+def content(response) -> str:
+    return b"".join(response.streaming_content).decode()
+
+
+@pytest.mark.django_db
+class TestOrdersExport:
+
+    @pytest.mark.parametrize("is_staff, expected", [(False, 403), (True, 200)])
+    def test_staff_only(self, api_client, authenticate, is_staff, expected):
+
+        authenticate(is_staff=is_staff)
+        response = api_client.get(path=f"{ORDERS_EXPORT_URL}csv/")
+
+        assert response.status_code == expected
+
+    def test_csv_is_a_row_per_item(self, api_client, authenticate, orders):
+
+        authenticate(is_staff=True)
+        response = api_client.get(
+            path=f"{ORDERS_EXPORT_URL}csv/", HTTP_ACCEPT="text/csv"
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.streaming
+        assert response["Content-Type"] == "text/csv; charset=utf-8"
+        assert 'filename="orders.csv"' in response["Content-Disposition"]
+        rows = list(csv.DictReader(StringIO(content(response))))
+        with_items, without_items = orders
+        assert [int(row["id"]) for row in rows] == [with_items.id] * 3 + [
+            without_items.id
+        ]
+        assert rows[0]["unit_price"] == "9.99"
+        assert rows[-1]["product_id"] == ""
+
+    def test_ndjson_is_a_line_per_order(self, api_client, authenticate, orders):
+
+        authenticate(is_staff=True)
+        response = api_client.get(path=f"{ORDERS_EXPORT_URL}ndjson/")
+
+        assert response["Content-Type"] == "application/x-ndjson"
+        lines = [json.loads(line) for line in content(response).splitlines()]
+        with_items, without_items = orders
+        assert [line["id"] for line in lines] == [with_items.id, without_items.id]
+        assert len(lines[0]["items"]) == 3
+        assert lines[0]["items"][0]["quantity"] == 2
+        assert lines[0]["items"][0]["unit_price"] == 9.99
+        assert lines[1]["items"] == []
+
+    def test_streamed_in_chunks_from_one_query(
+        self, api_client, authenticate, orders, monkeypatch, django_assert_num_queries
+    ):
+
+        monkeypatch.setattr(exports, "EXPORT_CHUNK_SIZE", 2)
+        authenticate(is_staff=True)
+        response = api_client.get(path=f"{ORDERS_EXPORT_URL}csv/")
+
+        with django_assert_num_queries(1):
+            chunks = list(response.streaming_content)
+
+        assert len(chunks) == 3  # header + 4 rows, 2 lines per chunk
+
+    def test_gzipped_when_accepted(self, api_client, authenticate, orders):
+
+        authenticate(is_staff=True)
+        plain = api_client.get(path=f"{ORDERS_EXPORT_URL}ndjson/")
+        compressed = api_client.get(
+            path=f"{ORDERS_EXPORT_URL}ndjson/", HTTP_ACCEPT_ENCODING="gzip"
+        )
+
+        assert compressed["Content-Encoding"] == "gzip"
+        assert gzip.decompress(b"".join(compressed.streaming_content)).decode() == (
+            content(plain)
+        )
+
+
+@pytest.mark.django_db
+class TestProductsExport:
+
+    def test_anonymous_user_returns_401(self, api_client):
+
+        response = api_client.get(path=f"{PRODUCTS_EXPORT_URL}csv/")
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_csv_honors_filters(self, api_client, authenticate):
+
+        collection = baker.make(Collection, title="Beverages")
+        product = baker.make(Product, collection=collection, _quantity=2)[0]
+        baker.make(Product, _quantity=2)
+
+        authenticate(is_staff=True)
+        response = api_client.get(
+            path=f"{PRODUCTS_EXPORT_URL}csv/", data={"collection_id": collection.id}
+        )
+
+        rows = list(csv.DictReader(StringIO(content(response))))
+        assert len(rows) == 2
+        assert rows[0]["id"] == str(product.id)
+        assert rows[0]["collection_title"] == "Beverages"
+        assert list(rows[0]) == exports.PRODUCT_FIELDS
+
+    def test_ndjson(self, api_client, authenticate):
+
+        product = baker.make(Product, unit_price=Decimal("12.50"))
+
+        authenticate(is_staff=True)
+        response = api_client.get(path=f"{PRODUCTS_EXPORT_URL}ndjson/")
+
+        (line,) = content(response).splitlines()
+        assert json.loads(line) | {"last_update": None} == {
+            "id": product.id,
+            "title": product.title,
+            "slug": product.slug,
+            "unit_price": 12.5,
+            "inventory": product.inventory,
+            "collection_id": product.collection_id,
+            "collection_title": product.collection.title,
+            "last_update": None,
+        }
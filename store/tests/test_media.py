@@ -0,0 +1,67 @@
+import pytest
+
+
+HASHED_NAME = "store/images/" + "0123456789abcdef" * 2 + ".thumb.webp"
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    (tmp_path / "store/images").mkdir(parents=True)
+    (tmp_path / HASHED_NAME).write_bytes(b"RIFF")
+    (tmp_path / "store/images/mug.png").write_bytes(b"\x89PNG")
+    return tmp_path
+
+
+class TestServeMedia:
+
+    def test_content_addressed_file_is_cached_for_good(self, client):
+
+        response = client.get(f"/media/{HASHED_NAME}")
+
+        assert response.status_code == 200
+        assert b"".join(response.streaming_content) == b"RIFF"
+        assert response["Cache-Control"] == ("public, max-age=31536000, immutable")
+
+    def test_other_file_is_cached_for_an_hour(self, client):
+
+        response = client.get("/media/store/images/mug.png")
+
+        assert response["Content-Type"] == "image/png"
+        assert response["Cache-Control"] == "public, max-age=3600"
+
+    def test_missing_file_returns_404(self, client):
+
+        response = client.get("/media/store/images/cup.png")
+
+        assert response.status_code == 404
+
+    def test_x_accel_redirect_leaves_the_bytes_to_nginx(self, client, settings):
+
+        settings.MEDIA_SERVE_MODE = "x-accel-redirect"
+
+        response = client.get(f"/media/{HASHED_NAME}")
+
+        assert response.status_code == 200
+        assert response.content == b""
+        assert response["X-Accel-Redirect"] == f"/protected-media/{HASHED_NAME}"
+        assert response["Content-Type"] == "image/webp"
+        assert "immutable" in response["Cache-Control"]
+
+    def test_x_sendfile_is_the_full_path(self, client, settings, media_root):
+
+        settings.MEDIA_SERVE_MODE = "x-sendfile"
+
+        response = client.get("/media/store/images/mug.png")
+
+        assert response["X-Sendfile"] == str(media_root / "store/images/mug.png")
+
+    @pytest.mark.parametrize("mode", ["django", "x-accel-redirect"])
+    def test_paths_outside_media_root_are_not_served(self, client, settings, mode):
+
+        settings.MEDIA_SERVE_MODE = mode
+
+        response = client.get("/media/store/../../../etc/passwd")
+
+        assert response.status_code in (400, 404)
+        assert not response.has_header("X-Accel-Redirect")
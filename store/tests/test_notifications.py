@@ -0,0 +1,84 @@
+import pytest
+from django.core import mail
+from django.contrib.auth import get_user_model
+from model_bakery import baker
+from playground import tasks
+from playground.models import Notification, NotificationChunk
+
+
+User = get_user_model()
+
+
+# FIXTURES:
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(tasks, "NOTIFICATION_CHUNK_SIZE", 2)
+
+
+# ----------------------------------------------------------------------
+
+
+# TESTS:
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("eager_celery", "small_chunks")
+class TestNotifyCustomers:
+
+    def test_mails_every_active_customer_in_chunks(self):
+
+        users = baker.make(User, email=baker.seq("user@example.com"), _quantity=5)
+        baker.make(User, email="")  # no email, skipped
+        baker.make(User, email="inactive@example.com", is_active=False)
+
+        notification_id = tasks.notify_customers("Sale!")
+
+        notification = Notification.objects.get(pk=notification_id)
+        assert notification.finished_at is not None
+        assert notification.sent == 5
+        assert notification.chunks.count() == 3  # 2 + 2 + 1
+        assert sorted(m.to[0] for m in mail.outbox) == sorted(u.email for u in users)
+        assert mail.outbox[0].body == "Sale!"
+
+    def test_chunk_uses_one_connection_and_one_render(
+        self, monkeypatch, django_assert_num_queries
+    ):
+
+        baker.make(User, email=baker.seq("user@example.com"), _quantity=2)
+        notification = Notification.objects.create(message="Sale!")
+        tasks.plan_notification_chunks(notification)
+        chunk = notification.chunks.get()
+        renders = []
+        monkeypatch.setattr(
+            tasks.BaseEmailMessage,
+            "render",
+            lambda self, render=tasks.BaseEmailMessage.render: renders.append(1)
+            or render(self),
+        )
+
+        # chunk (+ notification), emails, mark sent:
+        with django_assert_num_queries(3):
+            tasks.send_notification_chunk(chunk.id)
+
+        assert len(mail.outbox) == 2
+        assert len(renders) == 1
+
+    def test_resume_sends_only_pending_chunks(self):
+
+        users = baker.make(User, email=baker.seq("user@example.com"), _quantity=4)
+        notification = Notification.objects.create(message="Sale!")
+        tasks.plan_notification_chunks(notification)
+        first, second = notification.chunks.all()
+        tasks.send_notification_chunk(first.id)  # then the worker died
+        mail.outbox.clear()
+
+        tasks.notify_customers("Sale!", notification_id=notification.id)
+
+        assert sorted(m.to[0] for m in mail.outbox) == sorted(
+            user.email for user in users[2:]
+        )
+        notification.refresh_from_db()
+        assert notification.sent == 4
+        assert not NotificationChunk.objects.filter(sent_at__isnull=True).exists()
@@ -0,0 +1,126 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.db import connection
+from model_bakery import baker
+from store.models import Cart, CartItem, Order, OrderEvent, Product
+from store import tasks
+from store.signals import order_created
+from store.tasks import dispatch_order_events
+
+
+User = get_user_model()
+
+
+# FIXTURES:
+
+
+@pytest.fixture
+def received():
+    """Connect a receiver to `order_created` for the test, return its calls."""
+    calls = []
+
+    def receiver(sender, order, event_id, **kwargs):
+        calls.append((order.id, event_id))
+
+    order_created.connect(receiver, dispatch_uid="test_receiver")
+    yield calls
+    order_created.disconnect(dispatch_uid="test_receiver")
+
+
+@pytest.fixture
+def failing_receiver():
+    def receiver(sender, order, **kwargs):
+        raise RuntimeError("downstream is down")
+
+    order_created.connect(receiver, dispatch_uid="failing_receiver")
+    yield
+    order_created.disconnect(dispatch_uid="failing_receiver")
+
+
+def make_event():
+    order = baker.make(Order, customer=baker.make(User).customer)
+    return OrderEvent.objects.create(name=OrderEvent.ORDER_CREATED, order=order)
+
+
+# ----------------------------------------------------------------------
+
+
+# TESTS:
+
+
+@pytest.mark.django_db
+class TestOrderEvents:
+
+    def test_checkout_writes_event_without_sending_signal(self, api_client, received):
+
+        cart = baker.make(Cart)
+        CartItem.objects.create(
+            cart=cart, product=baker.make(Product, inventory=10), quantity=1
+        )
+        api_client.force_authenticate(user=baker.make(User))
+
+        response = api_client.post(path="/store/orders/", data={"cart_id": cart.id})
+
+        event = OrderEvent.objects.get()
+        assert event.order_id == response.data["id"]
+        assert event.dispatched_at is None
+        assert received == []  # (the worker sends it, after commit)
+
+    def test_dispatch_sends_each_event_once(self, received):
+
+        events = [make_event() for _ in range(5)]
+
+        assert dispatch_order_events(batch_size=2) == 5
+        assert dispatch_order_events() == 0  # nothing pending anymore
+
+        assert received == [(event.order_id, event.id) for event in events]
+        assert not OrderEvent.objects.filter(dispatched_at__isnull=True).exists()
+
+    def test_failed_event_stays_pending_for_retry(self, received, failing_receiver):
+
+        event = make_event()
+
+        assert dispatch_order_events() == 0
+        assert dispatch_order_events() == 0
+
+        event.refresh_from_db()
+        assert event.dispatched_at is None
+        assert event.attempts == 2
+        # The other receivers still got it, every time (at-least-once):
+        assert received == [(event.order_id, event.id)] * 2
+
+    def test_database_error_fails_only_its_event(self, received):
+
+        events = [make_event() for _ in range(2)]
+
+        def receiver(sender, order, event_id, **kwargs):
+            if event_id == events[0].id:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT * FROM no_such_table")
+
+        order_created.connect(receiver, dispatch_uid="database_error_receiver")
+        try:
+            assert dispatch_order_events() == 1
+        finally:
+            order_created.disconnect(dispatch_uid="database_error_receiver")
+
+        for event in events:
+            event.refresh_from_db()
+        assert events[0].dispatched_at is None
+        assert events[0].attempts == 1
+        assert events[1].dispatched_at is not None
+
+    def test_event_failing_too_often_is_dead_lettered(
+        self, received, failing_receiver, monkeypatch
+    ):
+
+        monkeypatch.setattr(tasks, "MAX_ORDER_EVENT_ATTEMPTS", 2)
+        event = make_event()
+
+        for _ in range(3):
+            dispatch_order_events()
+
+        event.refresh_from_db()
+        assert event.dispatched_at is None
+        assert event.attempts == 2
+        assert received == [(event.order_id, event.id)] * 2  # (not a third time)
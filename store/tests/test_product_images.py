@@ -0,0 +1,433 @@
+import hashlib
+import pytest
+from io import BytesIO
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import StopFutureHandlers
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework import status
+from model_bakery import baker
+from store import tasks, uploads
+from store.images import VARIANTS
+from store.models import Product, ProductImage
+from store.uploads import ProductImageUploadHandler, StreamedImageUpload
+
+
+# FIXTURES:
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    return tmp_path
+
+
+@pytest.fixture
+def product():
+    return baker.make(Product)
+
+
+def image_file(name="mug.png", size=(1200, 800), mode="RGBA", format="PNG"):
+    output = BytesIO()
+    Image.new(mode, size, "red").save(output, format)
+    return SimpleUploadedFile(name, output.getvalue())
+
+
+@pytest.fixture
+def upload(api_client, authenticate, product, django_capture_on_commit_callbacks):
+
+    def upload(file=None):
+        authenticate(is_staff=True)
+        # (The processing task is queued on commit.)
+        with django_capture_on_commit_callbacks(execute=True):
+            response = api_client.post(
+                path=f"/store/products/{product.id}/images/",
+                data={"image": file or image_file()},
+                format="multipart",
+            )
+        assert response.status_code == status.HTTP_201_CREATED
+        return ProductImage.objects.get(pk=response.data["id"])
+
+    return upload
+
+
+@pytest.fixture
+def post_image(api_client, authenticate, product):
+
+    def post(file):
+        authenticate(is_staff=True)
+        return api_client.post(
+            path=f"/store/products/{product.id}/images/",
+            data={"image": file},
+            format="multipart",
+        )
+
+    return post
+
+
+# ----------------------------------------------------------------------
+
+
+# TESTS:
+
+
+@pytest.mark.django_db
+class TestUploadValidation:
+
+    def test_valid_image_is_stored_from_the_streamed_file(
+        self, post_image, media_root, monkeypatch
+    ):
+
+        stored = []
+        original_save = ProductImage._meta.get_field("image").storage.save
+        monkeypatch.setattr(
+            ProductImage._meta.get_field("image").storage,
+            "save",
+            lambda name, content, **kwargs: stored.append(content)
+            or original_save(name, content, **kwargs),
+        )
+
+        response = post_image(image_file())
+
+        assert response.status_code == status.HTTP_201_CREATED
+        (content,) = stored
+        # (The handler's temporary file, moved into place: not a copy.)
+        assert isinstance(content, StreamedImageUpload)
+        assert content.image_format == "PNG"
+        assert content.image_size == (1200, 800)
+
+    def test_jpeg_header_longer_than_header_size(self, post_image):
+
+        # (Its dimensions come after the ICC profile, 200 KB of APP2 segments.)
+        output = BytesIO()
+        Image.new("RGB", (800, 600), "red").save(
+            output, "JPEG", icc_profile=bytes(range(256)) * 800
+        )
+        assert len(output.getvalue()) > uploads.HEADER_SIZE * 2
+
+        response = post_image(SimpleUploadedFile("mug.jpg", output.getvalue()))
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert ProductImage.objects.get().image.name.endswith(".jpg")
+
+    def test_non_image_is_rejected_from_header_size(self):
+
+        handler = ProductImageUploadHandler()
+        with pytest.raises(StopFutureHandlers):
+            handler.new_file("image", "mug.png", "image/png", None)
+        garbage = b"garbage" + bytes(range(256)) * 3600  # (900 KB)
+
+        for start in range(0, len(garbage), handler.chunk_size):
+            handler.receive_data_chunk(
+                garbage[start : start + handler.chunk_size], start
+            )
+
+        assert "Upload a valid image" in handler.file.errors[0]
+        # (Not buffered on, as the header of an image might have been:)
+        assert len(handler.header) == uploads.HEADER_SIZE
+
+    def test_too_large_body_is_rejected_before_reading_it(
+        self, post_image, media_root, monkeypatch
+    ):
+
+        monkeypatch.setattr(uploads, "MAX_PRODUCT_IMAGE_SIZE", 1024)
+        received = []
+        monkeypatch.setattr(
+            ProductImageUploadHandler, "new_file", lambda *args: received.append(args)
+        )
+
+        response = post_image(image_file(size=(400, 400), mode="RGB", format="BMP"))
+
+        assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        assert received == []
+        assert not (media_root / "store").exists()
+
+    def test_too_large_stream_is_rejected_at_the_first_chunk_over(self):
+
+        handler = ProductImageUploadHandler()
+        with pytest.raises(StopFutureHandlers):
+            handler.new_file("image", "mug.png", "image/png", None)
+        header = image_file().read()
+
+        handler.receive_data_chunk(header, 0)
+        with pytest.raises(uploads.ImageTooLarge):
+            handler.receive_data_chunk(
+                b"0" * handler.chunk_size, uploads.MAX_PRODUCT_IMAGE_SIZE - 1
+            )
+        assert handler.file.closed
+
+    @pytest.mark.parametrize(
+        "file, error",
+        [
+            (SimpleUploadedFile("mug.png", b"not an image"), "Upload a valid image"),
+            (
+                image_file(size=(10, 10), mode="RGB", format="BMP"),
+                "Unsupported image format BMP",
+            ),
+            (image_file(size=(7000, 10)), "max allowed: 6000 px"),
+        ],
+    )
+    def test_invalid_header_returns_400(self, post_image, media_root, file, error):
+
+        response = post_image(file)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert error in response.data["image"][0]
+        assert not (media_root / "store").exists()
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("eager_celery")
+class TestImageProcessing:
+
+    def test_upload_generates_the_variants(self, upload, media_root):
+
+        image = upload()
+
+        assert image.processed_at is not None
+        assert set(image.variants) == set(VARIANTS)
+        assert image.variants["thumbnail"] == image.image.name.replace(
+            ".png", ".thumb.png"
+        )
+        with Image.open(media_root / image.variants["thumbnail"]) as thumbnail:
+            assert thumbnail.size == (320, 213)  # (aspect ratio kept)
+        with Image.open(media_root / image.variants["webp"]) as webp:
+            assert webp.format == "WEBP"
+            assert webp.size == (1200, 800)  # (not upscaled)
+
+    def test_image_is_named_by_its_content(self, upload):
+
+        file = image_file()
+        content_hash = hashlib.sha256(file.read()).hexdigest()
+        file.seek(0)
+
+        image = upload(file)
+
+        assert image.image.name == f"store/images/{content_hash[:32]}.png"
+
+    def test_jpeg_thumbnail_of_a_gif(self, upload):
+
+        image = upload(image_file("mug.gif", mode="P", format="GIF"))
+
+        assert image.variants["thumbnail"].endswith(".thumb.jpg")
+
+    def test_api_exposes_variant_urls(self, upload, api_client, product):
+
+        upload()
+        response = api_client.get(path=f"/store/products/{product.id}/")
+
+        (payload,) = response.data["productimage_set"]
+        assert payload["thumbnail"] == payload["variants"]["thumbnail"]
+        assert payload["thumbnail"].startswith("http://testserver/media/")
+        assert set(payload["variants"]) == set(VARIANTS)
+        # (`ProductListSerializer` too, same payload:)
+        listed = api_client.get(path="/store/products/").data["results"][0]
+        assert listed["productimage_set"] == [payload]
+
+    def test_thumbnail_is_the_original_until_processed(self, api_client, product):
+
+        baker.make(ProductImage, product=product, image="store/images/a.png")
+        response = api_client.get(path=f"/store/products/{product.id}/images/")
+
+        (payload,) = response.data["results"]
+        assert payload["thumbnail"] == payload["image"]
+        assert payload["variants"] == {}
+
+    def test_resumes_with_the_missing_variants(self, upload, media_root):
+
+        image = upload()
+        (media_root / image.variants["webp"]).unlink()
+        kept = {key: name for key, name in image.variants.items() if key != "webp"}
+        ProductImage.objects.filter(pk=image.pk).update(
+            variants=kept, processed_at=None
+        )
+
+        tasks.process_product_image(image.pk)
+        image.refresh_from_db()
+
+        assert {key: image.variants[key] for key in kept} == kept
+        assert (media_root / image.variants["webp"]).exists()
+        assert image.processed_at is not None
+
+    def test_undecodable_image_is_not_retried(self, product, media_root):
+
+        (media_root / "store/images").mkdir(parents=True)
+        (media_root / "store/images/bad.png").write_bytes(b"not an image")
+        image = baker.make(ProductImage, product=product, image="store/images/bad.png")
+
+        tasks.process_product_image(image.pk)
+        image.refresh_from_db()
+
+        assert image.processed_at is not None
+        assert image.variants == {}
+
+    def test_replacing_the_image_regenerates_and_deletes_old_variants(
+        self, upload, media_root, django_capture_on_commit_callbacks
+    ):
+
+        image = upload()
+        old_variants = image.variants
+
+        with django_capture_on_commit_callbacks(execute=True):
+            image.image = image_file("cup.png", size=(600, 400))
+            image.save()
+        image.refresh_from_db()
+
+        assert image.variants["thumbnail"] == image.image.name.replace(
+            ".png", ".thumb.png"
+        )
+        assert image.variants != old_variants
+        assert not any((media_root / name).exists() for name in old_variants.values())
+
+    def test_pending_images_are_queued_again(self, product, monkeypatch):
+
+        queued = []
+        monkeypatch.setattr(tasks.process_product_image, "delay", queued.append)
+        stale, recent = baker.make(
+            ProductImage, product=product, image="store/images/a.png", _quantity=2
+        )
+        ProductImage.objects.filter(pk=stale.pk).update(
+            last_update=timezone.now() - tasks.IMAGE_PROCESSING_GRACE * 2
+        )
+
+        assert tasks.process_pending_product_images() == 1
+        assert queued == [stale.id]
+
+    def test_image_failing_for_good_is_given_up_on(self, product, media_root):
+
+        # (Truncated after its header: it passed the upload's validation.)
+        (media_root / "store/images").mkdir(parents=True)
+        data = image_file(mode="RGB").read()
+        (media_root / "store/images/cut.png").write_bytes(data[: len(data) // 2])
+        image = baker.make(ProductImage, product=product, image="store/images/cut.png")
+
+        for _ in range(tasks.MAX_IMAGE_PROCESSING_ATTEMPTS):
+            with pytest.raises(OSError):
+                tasks.generate_variants(image.pk)
+        ProductImage.objects.filter(pk=image.pk).update(
+            last_update=timezone.now() - tasks.IMAGE_PROCESSING_GRACE * 2
+        )
+
+        assert tasks.generate_variants(image.pk) is None  # (no more tries)
+        assert tasks.process_pending_product_images() == 0
+
+
+@pytest.mark.django_db
+class TestBulkUpload:
+
+    @pytest.fixture
+    def post_images(self, api_client, authenticate, product):
+
+        def post(files, is_staff=True):
+            authenticate(is_staff=is_staff)
+            return api_client.post(
+                path=f"/store/products/{product.id}/images/bulk/",
+                data={"images": files},
+                format="multipart",
+            )
+
+        return post
+
+    def test_non_staff_returns_403(self, post_images):
+
+        response = post_images([image_file()], is_staff=False)
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_stores_all_and_queues_one_batch_task(
+        self, post_images, product, monkeypatch, django_capture_on_commit_callbacks
+    ):
+
+        queued = []
+        monkeypatch.setattr(tasks.process_product_images, "delay", queued.append)
+
+        files = [image_file(f"mug{i}.png", size=(10, 10 + i)) for i in range(3)]
+        hashes = [hashlib.sha256(file.read()).hexdigest() for file in files]
+        for file in files:
+            file.seek(0)
+        with django_capture_on_commit_callbacks(execute=True):
+            response = post_images(files)
+
+        assert response.status_code == status.HTTP_201_CREATED
+        ids = [image["id"] for image in response.data]
+        assert queued == [ids]
+        assert [image.image.name for image in product.productimage_set.all()] == [
+            f"store/images/{content_hash[:32]}.png" for content_hash in hashes
+        ]
+
+    def test_batch_task_generates_the_variants(
+        self, post_images, eager_celery, django_capture_on_commit_callbacks
+    ):
+
+        with django_capture_on_commit_callbacks(execute=True):
+            post_images([image_file(f"mug{i}.png") for i in range(2)])
+
+        assert all(
+            set(image.variants) == set(VARIANTS) for image in ProductImage.objects.all()
+        )
+
+    def test_image_failing_in_the_batch_is_retried_on_its_own(
+        self, post_images, monkeypatch, django_capture_on_commit_callbacks
+    ):
+
+        with django_capture_on_commit_callbacks(execute=False):
+            post_images(
+                [image_file(f"mug{i}.png", size=(10, 10 + i)) for i in range(2)]
+            )
+        failing, ok = ProductImage.objects.values_list("id", flat=True)
+        generate_variants = tasks.generate_variants
+
+        def flaky(image_id):
+            if image_id == failing:
+                raise OSError("storage unavailable")
+            return generate_variants(image_id)
+
+        monkeypatch.setattr(tasks, "generate_variants", flaky)
+        queued = []
+        monkeypatch.setattr(tasks.process_product_image, "delay", queued.append)
+
+        tasks.process_product_images([failing, ok])
+
+        assert queued == [failing]
+        assert ProductImage.objects.get(pk=ok).processed_at is not None
+
+    def test_query_count_does_not_grow_with_the_images(self, post_images):
+
+        query_counts = []
+        for count in (1, 5):
+            with CaptureQueriesContext(connection) as queries:
+                post_images([image_file(size=(10, 10)) for _ in range(count)])
+            query_counts.append(len(queries))
+
+        assert query_counts[0] == query_counts[1]
+
+    def test_invalid_files_are_reported_by_index_and_nothing_is_stored(
+        self, post_images, media_root
+    ):
+
+        response = post_images(
+            [
+                image_file(),
+                SimpleUploadedFile("notes.png", b"not an image"),
+                image_file(),
+            ]
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert list(response.data["images"]) == [1]
+        assert not ProductImage.objects.exists()
+        assert not (media_root / "store").exists()
+
+    def test_missing_product_returns_400(self, api_client, authenticate, media_root):
+
+        authenticate(is_staff=True)
+        response = api_client.post(
+            path="/store/products/0/images/bulk/",
+            data={"images": [image_file()]},
+            format="multipart",
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert not (media_root / "store").exists()
@@ -0,0 +1,324 @@
+import pytest
+from io import StringIO
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from rest_framework import status
+from model_bakery import baker
+from store.models import Collection, Product, ProductImage
+from store.serializers import ProductSerializer
+
+
+User = get_user_model()
+
+PRODUCTS_URL = "/store/products/"
+
+
+# FIXTURES:
+
+
+@pytest.fixture
+def products():
+    return baker.make(Product, _quantity=25)
+
+
+# ----------------------------------------------------------------------
+
+
+# TESTS:
+
+
+@pytest.mark.django_db
+class TestListProducts:
+
+    def follow_all(self, api_client, url):
+        """Follow the `next` links till the end, return all the ids seen."""
+        ids = []
+        while url:
+            response = api_client.get(path=url)
+            assert response.status_code == status.HTTP_200_OK
+            ids += [product["id"] for product in response.data["results"]]
+            url = response.data["next"]
+        return ids
+
+    def test_default_is_page_number_pagination(self, api_client, products):
+
+        response = api_client.get(path=PRODUCTS_URL)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["count"] == 25
+        assert "page=2" in response.data["next"]
+
+    def test_keyset_pagination_has_no_count_and_opaque_cursor(
+        self, api_client, products
+    ):
+
+        response = api_client.get(path=PRODUCTS_URL, data={"pagination": "keyset"})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert "count" not in response.data
+        assert "cursor=" in response.data["next"]
+        assert "pagination=keyset" in response.data["next"]
+
+    def test_keyset_pagination_walks_every_product_once(self, api_client, products):
+
+        ids = self.follow_all(api_client, f"{PRODUCTS_URL}?pagination=keyset")
+
+        assert ids == sorted(product.id for product in products)
+
+    def test_keyset_pagination_with_ordering_and_ties(self, api_client):
+
+        # Lots of ties on the ordering field — none may be skipped or repeated:
+        products = [
+            baker.make(Product, unit_price=Decimal(price))
+            for price in ["5", "1", "5", "5", "3"] * 5
+        ]
+
+        ids = self.follow_all(
+            api_client, f"{PRODUCTS_URL}?pagination=keyset&ordering=-unit_price"
+        )
+
+        assert sorted(ids) == sorted(product.id for product in products)
+        prices = [Product.objects.get(pk=id).unit_price for id in ids]
+        assert prices == sorted(prices, reverse=True)
+
+
+@pytest.mark.django_db
+class TestProductListSerializer:
+
+    def test_list_matches_product_serializer(self, api_client, products):
+
+        baker.make(ProductImage, product=products[0], _quantity=2)
+        baker.make(ProductImage, product=products[1])
+
+        response = api_client.get(path=PRODUCTS_URL)
+
+        expected = ProductSerializer(
+            Product.objects.prefetch_related("productimage_set")[:10],
+            many=True,
+            context={"request": response.wsgi_request},
+        ).data
+        assert response.data["results"] == expected
+
+    def test_price_plus_tax_in_sql_rounds_like_python_fallback(self):
+
+        # 0.15 × 1.1 = 0.165, a tie: both round it half away from zero.
+        product = baker.make(Product, unit_price=Decimal("0.15"))
+
+        annotated = Product.objects.with_price_plus_tax().get(pk=product.pk)
+
+        assert annotated.price_plus_tax == Decimal("0.17")
+        assert ProductSerializer().get_price_plus_tax(product) == Decimal("0.17")
+
+    def test_list_page_is_a_constant_number_of_queries(
+        self, api_client, products, django_assert_num_queries
+    ):
+
+        for product in products[:10]:
+            baker.make(ProductImage, product=product)
+
+        # count, page, images of the page:
+        with django_assert_num_queries(3):
+            api_client.get(path=PRODUCTS_URL)
+
+    def test_keyset_pagination_by_last_update(self, api_client, products):
+
+        response = api_client.get(
+            path=PRODUCTS_URL, data={"pagination": "keyset", "ordering": "-last_update"}
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["next"]
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("locmem_cache")
+class TestProductCache:
+
+    def test_repeat_list_and_detail_hit_no_db(
+        self, api_client, products, django_assert_num_queries
+    ):
+
+        url = f"{PRODUCTS_URL}{products[0].id}/"
+        first_list = api_client.get(path=PRODUCTS_URL, data={"ordering": "unit_price"})
+        first_detail = api_client.get(path=url)
+
+        with django_assert_num_queries(0):
+            second_list = api_client.get(
+                path=PRODUCTS_URL, data={"ordering": "unit_price"}
+            )
+        # (Only the `last_update` lookup for the `ETag`, see `store.conditional`.)
+        with django_assert_num_queries(1):
+            second_detail = api_client.get(path=url)
+
+        assert second_list.data == first_list.data
+        assert second_detail.data == first_detail.data
+
+    def test_different_params_are_cached_separately(self, api_client, products):
+
+        first_page = api_client.get(path=PRODUCTS_URL)
+        second_page = api_client.get(path=PRODUCTS_URL, data={"page": 2})
+
+        assert first_page.data["results"] != second_page.data["results"]
+
+    def test_product_save_invalidates(
+        self, api_client, products, django_capture_on_commit_callbacks
+    ):
+
+        product = products[0]
+        url = f"{PRODUCTS_URL}{product.id}/"
+        api_client.get(path=url)  # cache it
+
+        with django_capture_on_commit_callbacks(execute=True):
+            product.title = "Changed"
+            product.save()  # (what the admin's `list_editable` does as well)
+        response = api_client.get(path=url)
+
+        assert response.data["title"] == "Changed"
+
+    def test_new_image_invalidates(
+        self, api_client, products, django_capture_on_commit_callbacks
+    ):
+
+        product = products[0]
+        url = f"{PRODUCTS_URL}{product.id}/"
+        api_client.get(path=url)  # cache it
+
+        with django_capture_on_commit_callbacks(execute=True):
+            baker.make(ProductImage, product=product)
+        response = api_client.get(path=url)
+
+        assert len(response.data["productimage_set"]) == 1
+
+
+@pytest.mark.django_db
+class TestSearchProducts:
+
+    def search(self, api_client, term, **params):
+        response = api_client.get(path=PRODUCTS_URL, data={"search": term, **params})
+        assert response.status_code == status.HTTP_200_OK
+        return [product["title"] for product in response.data["results"]]
+
+    @pytest.fixture(autouse=True)
+    def catalog(self):
+        baker.make(Product, title="Coffee Beans", description="Dark roast")
+        baker.make(Product, title="Tea Bags", description="Goes well with coffee")
+        baker.make(Product, title="Bread", description="Whole wheat")
+
+    def test_matches_title_and_description_ranked(self, api_client):
+
+        # Title match ranks above the description-only match:
+        assert self.search(api_client, "coffee") == ["Coffee Beans", "Tea Bags"]
+
+    def test_prefix_match(self, api_client):
+
+        assert self.search(api_client, "cof") == ["Coffee Beans", "Tea Bags"]
+
+    def test_typo_falls_back_to_trigram(self, api_client):
+
+        assert self.search(api_client, "cofee") == ["Coffee Beans"]
+
+    def test_all_terms_must_match(self, api_client):
+
+        assert self.search(api_client, "coffee roast") == ["Coffee Beans"]
+
+    def test_operators_in_input_are_not_a_syntax_error(self, api_client):
+
+        assert self.search(api_client, "bread & | ! :*") == ["Bread"]
+
+    def test_explicit_ordering_wins_over_rank(self, api_client):
+
+        titles = self.search(api_client, "coffee", ordering="-unit_price")
+
+        assert sorted(titles) == ["Coffee Beans", "Tea Bags"]
+
+
+@pytest.mark.django_db
+def test_every_api_query_shape_can_use_an_index():
+
+    baker.make(Collection)  # (`ProductFilter` needs an existing collection id)
+
+    call_command("check_query_plans", stdout=StringIO())  # raises if any seq scan
+
+
+@pytest.mark.django_db
+class TestConditionalGet:
+
+    def test_product_unchanged_returns_304_with_one_query(
+        self, api_client, products, django_assert_num_queries
+    ):
+
+        url = f"{PRODUCTS_URL}{products[0].id}/"
+        first = api_client.get(path=url)
+
+        with django_assert_num_queries(1):
+            second = api_client.get(path=url, HTTP_IF_NONE_MATCH=first["ETag"])
+
+        assert first.status_code == status.HTTP_200_OK
+        assert second.status_code == status.HTTP_304_NOT_MODIFIED
+        assert second.content == b""
+        assert "Accept" in second["Vary"]
+
+    def test_product_if_modified_since(self, api_client, products):
+
+        url = f"{PRODUCTS_URL}{products[0].id}/"
+        first = api_client.get(path=url)
+
+        second = api_client.get(
+            path=url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"]
+        )
+
+        assert second.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_product_change_or_new_image_changes_etag(self, api_client, products):
+
+        product = products[0]
+        url = f"{PRODUCTS_URL}{product.id}/"
+        etags = [api_client.get(path=url)["ETag"]]
+
+        product.title = "Changed"
+        product.save()
+        etags.append(api_client.get(path=url)["ETag"])
+        baker.make(ProductImage, product=product)
+        etags.append(api_client.get(path=url)["ETag"])
+
+        assert len(set(etags)) == 3
+
+    def test_admin_clear_inventory_changes_etag(self, api_client, client, products):
+
+        product = products[0]
+        url = f"{PRODUCTS_URL}{product.id}/"
+        first = api_client.get(path=url)
+
+        client.force_login(baker.make(User, is_staff=True, is_superuser=True))
+        client.post(
+            "/admin/store/product/",
+            {"action": "clear_inventory", "_selected_action": [product.id]},
+        )
+        second = api_client.get(path=url, HTTP_IF_NONE_MATCH=first["ETag"])
+
+        assert second.status_code == status.HTTP_200_OK
+        assert second.data["inventory"] == 0
+
+    def test_missing_product_returns_404(self, api_client):
+
+        response = api_client.get(path=f"{PRODUCTS_URL}0/", HTTP_IF_NONE_MATCH="*")
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_collections_etag_changes_with_product_count(self, api_client):
+
+        collection = baker.make(Collection)
+        first = api_client.get(path="/store/collections/")
+        not_modified = api_client.get(
+            path="/store/collections/", HTTP_IF_NONE_MATCH=first["ETag"]
+        )
+
+        baker.make(Product, collection=collection)
+        changed = api_client.get(
+            path="/store/collections/", HTTP_IF_NONE_MATCH=first["ETag"]
+        )
+
+        assert not_modified.status_code == status.HTTP_304_NOT_MODIFIED
+        assert changed.status_code == status.HTTP_200_OK
+        assert changed.data["results"][0]["product_count"] == 1
@@ -0,0 +1,130 @@
+import logging
+import pytest
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory
+from model_bakery import baker
+from store import urls, views
+from store.models import Collection, Order, OrderItem
+from store.querybudget import (
+    QueryBudgetExceeded,
+    authentication_queries,
+    record_queries,
+    sql_shape,
+)
+
+
+User = get_user_model()
+
+COLLECTIONS_URL = "/store/collections/"
+
+
+def test_sql_shape_ignores_the_number_of_placeholders():
+
+    assert sql_shape('SELECT 1 FROM "a" WHERE "id" IN (%s, %s, %s)') == (
+        sql_shape('SELECT 1 FROM "a" WHERE "id" IN (%s)')
+    )
+    assert sql_shape('INSERT INTO "a" VALUES (%s, %s), (%s, %s)') == (
+        'INSERT INTO "a" VALUES (...)'
+    )
+
+
+def test_every_viewset_action_has_a_budget():
+
+    missing = set()
+    for pattern in urls.urlpatterns:
+        view = pattern.callback
+        actions = getattr(view, "actions", None)
+        if not actions:
+            continue
+        for method, action in actions.items():
+            if method in view.cls.http_method_names and action not in getattr(
+                view.cls, "query_budget", {}
+            ):
+                missing.add(f"{view.cls.__name__}.{action}")
+
+    assert missing == set()
+
+
+@pytest.mark.parametrize(
+    "headers, expected",
+    [
+        ({}, 0),
+        ({"HTTP_AUTHORIZATION": "JWT x"}, 1),
+        ({"HTTP_COOKIE": "sessionid=x"}, 2),
+    ],
+)
+def test_authentication_queries_are_allowed_on_top(headers, expected):
+
+    assert authentication_queries(RequestFactory().get("/", **headers)) == expected
+
+
+@pytest.mark.django_db
+class TestMiddleware:
+
+    @pytest.fixture
+    def no_budget(self, monkeypatch):
+        monkeypatch.setattr(
+            views.CollectionViewSet,
+            "query_budget",
+            views.CollectionViewSet.query_budget | {"list": 0},
+        )
+
+    def test_within_budget(self, api_client):
+
+        baker.make(Collection, _quantity=3)
+
+        response = api_client.get(path=COLLECTIONS_URL)
+
+        assert response.status_code == 200
+
+    @pytest.mark.usefixtures("no_budget")
+    def test_over_budget_fails_the_test(self, api_client):
+
+        with pytest.raises(QueryBudgetExceeded, match=r"CollectionViewSet\.list"):
+            api_client.get(path=COLLECTIONS_URL)
+
+    @pytest.mark.usefixtures("no_budget")
+    def test_over_budget_is_logged_in_warn_mode(self, api_client, settings, caplog):
+
+        settings.QUERY_BUDGET_MODE = "warn"
+
+        with caplog.at_level(logging.WARNING, logger="store.querybudget"):
+            response = api_client.get(path=COLLECTIONS_URL)
+
+        assert response.status_code == 200
+        assert "budget 0" in caplog.text
+
+    def test_n_plus_one_is_reported(self, api_client, authenticate, monkeypatch):
+
+        orders = baker.make(Order, customer=baker.make(User).customer, _quantity=3)
+        for order in orders:
+            baker.make(OrderItem, order=order)
+        # (`OrderSerializer` reads each order's items, and each item's product.)
+        monkeypatch.setattr(
+            views.OrderViewSet, "get_queryset", lambda self: Order.objects.all()
+        )
+        authenticate(is_staff=True)
+
+        with pytest.raises(QueryBudgetExceeded) as error:
+            api_client.get(path="/store/orders/")
+
+        assert 'run more than once:\n  3x SELECT "store_orderitem"' in str(error.value)
+
+
+@pytest.mark.django_db
+def test_customer_autocomplete_has_no_n_plus_one(client):
+
+    # (Picking an order's customer in the admin: `Customer.__str__` reads the user.)
+    client.force_login(baker.make(User, is_staff=True, is_superuser=True))
+    query_counts = []
+    for count in (1, 5):
+        baker.make(User, _quantity=count)
+        with record_queries() as queries:
+            response = client.get(
+                "/admin/autocomplete/",
+                {"app_label": "store", "model_name": "order", "field_name": "customer"},
+            )
+        assert response.status_code == 200
+        query_counts.append(queries.count)
+
+    assert query_counts[0] == query_counts[1]
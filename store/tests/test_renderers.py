@@ -0,0 +1,57 @@
+import json
+import msgpack
+import pytest
+from decimal import Decimal
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from model_bakery import baker
+from store.models import Product
+from store.renderers import ORJSONRenderer
+
+
+@pytest.fixture
+def data():
+    return {
+        "price": Decimal("12.50"),
+        "title": "Café ☕",
+        "items": [{"id": 1, "tax": Decimal("1.1")}],
+        1: None,
+    }
+
+
+def test_orjson_output_matches_drf_json_renderer(data):
+
+    assert ORJSONRenderer().render(data) == JSONRenderer().render(data)
+
+
+def test_orjson_indent_when_asked(data):
+
+    rendered = ORJSONRenderer().render(data, "application/json; indent=4")
+
+    assert b"\n" in rendered
+    assert json.loads(rendered) == json.loads(JSONRenderer().render(data))
+
+
+@pytest.mark.django_db
+class TestContentNegotiation:
+
+    def test_default_is_json(self, api_client):
+
+        product = baker.make(Product, unit_price=Decimal("10.00"))
+
+        response = api_client.get(f"/store/products/{product.id}/")
+
+        assert response["Content-Type"] == "application/json"
+        assert response.json()["price_plus_tax"] == 11.0
+
+    def test_msgpack_on_accept(self, api_client):
+
+        product = baker.make(Product)
+
+        response = api_client.get(
+            f"/store/products/{product.id}/", HTTP_ACCEPT="application/msgpack"
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response["Content-Type"] == "application/msgpack"
+        assert msgpack.unpackb(response.content)["id"] == product.id
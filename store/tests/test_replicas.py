@@ -0,0 +1,172 @@
+import pytest
+from time import time
+from rest_framework import status
+from model_bakery import baker
+from store import replicas
+from store.cache import bump_product_cache_generation
+from store.models import Cart, Product
+
+
+# FIXTURES:
+
+
+@pytest.fixture
+def replica(settings, monkeypatch):
+    """A (fake) replica alias `replica`, with its lag under the test's control."""
+    settings.DATABASE_REPLICAS = ["replica"]
+    lags = {"replica": 0}
+    monkeypatch.setattr(replicas, "replica_lag", lambda alias: lags[alias])
+    monkeypatch.setattr(replicas, "replica_replayed", lambda alias, since: True)
+    return lags
+
+
+@pytest.fixture
+def replayed_at(replica, monkeypatch):
+    """The (fake) replica's last replayed commit time, under the test's control."""
+    replayed_at = {"replica": float("inf")}
+    monkeypatch.setattr(
+        replicas, "replica_replayed", lambda alias, since: replayed_at[alias] >= since
+    )
+    return replayed_at
+
+
+@pytest.fixture
+def routed_reads(monkeypatch):
+    """The replicas picked for the reads (the reads still go to `default`, the test
+    DB — there's no real replica here)."""
+    picked = []
+
+    def get_replica(get_replica=replicas.get_replica):
+        picked.append(get_replica())
+        return None
+
+    monkeypatch.setattr(replicas, "get_replica", get_replica)
+    return picked
+
+
+# ----------------------------------------------------------------------
+
+
+# TESTS:
+
+
+class TestReplicaRouter:
+
+    router = replicas.ReplicaRouter()
+
+    def read_in_request(self):
+        token = replicas._read_from_replica.set(True)
+        try:
+            return self.router.db_for_read(Product)
+        finally:
+            replicas._read_from_replica.reset(token)
+
+    def test_reads_go_to_primary_outside_replica_views(self, replica):
+
+        assert self.router.db_for_read(Product) is None
+
+    def test_reads_go_to_replica_in_replica_views(self, replica):
+
+        assert self.read_in_request() == "replica"
+
+    def test_lagging_replica_falls_back_to_primary(self, replica, settings):
+
+        replica["replica"] = settings.REPLICA_MAX_LAG + 1
+
+        assert self.read_in_request() is None
+
+    def test_write_pins_rest_of_request_to_primary(self, replica):
+
+        token = replicas._read_from_replica.set(True)
+        try:
+            self.router.db_for_write(Product)
+            assert self.router.db_for_read(Product) is None
+        finally:
+            replicas._read_from_replica.reset(token)
+
+    def test_replica_replayed_is_measured_again_until_it_has(self, monkeypatch):
+
+        measured = [10.0, 20.0]
+        monkeypatch.setattr(replicas, "_replica_checks", {"replica": (0, 0, 0)})
+
+        def check_replica(alias):
+            replicas._replica_checks[alias] = (0, 0, measured.pop(0))
+            return 0, replicas._replica_checks[alias][2]
+
+        monkeypatch.setattr(replicas, "check_replica", check_replica)
+
+        assert not replicas.replica_replayed("replica", 15 - replicas.CLOCK_SKEW)
+        assert replicas.replica_replayed("replica", 15 - replicas.CLOCK_SKEW)
+        assert replicas.replica_replayed("replica", 20 - replicas.CLOCK_SKEW)
+        assert measured == []  # (not a third time: it had replayed that already)
+
+    def test_replicas_are_not_migrated(self, replica):
+
+        assert not self.router.allow_migrate("replica", "store")
+        assert self.router.allow_migrate("default", "store")
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("replica")
+class TestReplicaViews:
+
+    def test_catalog_reads_use_replica(self, api_client, routed_reads):
+
+        product = baker.make(Product)
+
+        response = api_client.get(f"/store/products/{product.id}/reviews/")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert routed_reads and set(routed_reads) == {"replica"}
+
+    def test_cart_reads_stay_on_primary(self, api_client, routed_reads):
+
+        cart = baker.make(Cart)
+
+        response = api_client.get(f"/store/carts/{cart.id}/")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert routed_reads == []
+
+    def test_write_pins_client_to_primary(self, api_client, routed_reads):
+
+        cart_response = api_client.post("/store/carts/")
+        product = baker.make(Product)
+        response = api_client.get(f"/store/products/{product.id}/reviews/")
+
+        assert replicas.PIN_COOKIE in cart_response.cookies
+        assert response.status_code == status.HTTP_200_OK
+        assert routed_reads == []  # (the test client sends the cookie back)
+
+    @pytest.mark.usefixtures("locmem_cache")
+    def test_product_cache_is_filled_from_primary_until_replica_replays_the_bump(
+        self, api_client, replica, replayed_at, routed_reads, settings
+    ):
+
+        # A replica lagging behind, but not enough not to be used: what it'd return
+        # would be cached for `PRODUCT_CACHE_TIMEOUT`, not `REPLICA_MAX_LAG`.
+        replica["replica"] = settings.REPLICA_MAX_LAG - 1
+        product = baker.make(Product, title="Old")
+        api_client.get("/store/products/")  # (cached)
+        Product.objects.filter(pk=product.pk).update(title="New")
+        replayed_at["replica"] = time()  # (the write, not yet the bump)
+        bump_product_cache_generation()  # (as on commit of a write)
+        routed_reads.clear()
+
+        response = api_client.get("/store/products/")
+
+        assert response.data["results"][0]["title"] == "New"
+        assert routed_reads and set(routed_reads) == {None}  # (the primary)
+
+    @pytest.mark.usefixtures("locmem_cache")
+    def test_product_cache_is_filled_from_replica_that_replayed_the_bump(
+        self, api_client, replayed_at, routed_reads
+    ):
+
+        bump_product_cache_generation()
+        replayed_at["replica"] = time() + 60  # (writes committed since)
+
+        response = api_client.get("/store/products/")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert routed_reads and set(routed_reads) == {"replica"}
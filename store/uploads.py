@@ -0,0 +1,142 @@
+"""Streaming validation of product image uploads (`/products/<pk>/images/`).
+
+Django's default upload handlers buffer each file (in memory up to 2.5 MB, else in
+a temporary file), and only then does anything look at it: the size validator
+(`validate_product_image_size`), and `ImageField`, which opens it with Pillow
+again. `ProductImageUploadHandler` checks while the body streams in instead:
+- the request's `Content-Length`, before reading any of the body, and the bytes
+  actually received, chunk by chunk: too large → 413 right away,
+- the format and dimensions from the file's first bytes (the header, from
+  `HEADER_SIZE` on, more if it's longer): an invalid file's rest isn't stored at
+  all (its errors are raised by `ProductImageField`, per file),
+- the chunks go straight to a temporary file (never memory), which
+  `FileSystemStorage` then moves into `MEDIA_ROOT` (a rename on the same
+  filesystem, not a copy), and are hashed on the way for its name
+  (`store.images.product_image_path`).
+So a worker holds one chunk per upload, whatever the uploads' sizes."""
+
+import hashlib
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from .validators import (
+    MAX_PRODUCT_IMAGE_SIZE_KB,
+    has_product_image_signature,
+    validate_product_image_header,
+)
+
+
+MAX_PRODUCT_IMAGE_SIZE = MAX_PRODUCT_IMAGE_SIZE_KB * 1024
+
+# Enough for most headers of the formats accepted. (A JPEG's dimensions come after
+# its APP segments — EXIF, ICC profile, XMP — which can take more: then the header
+# is buffered on, twice as much each time, up to the whole file, see
+# `ProductImageUploadHandler.validate` — only if it starts like an image, though:
+# anything else is rejected from this much.)
+HEADER_SIZE = 64 * 1024
+
+# Room in the body for the multipart boundaries and the other fields:
+MULTIPART_OVERHEAD = 16 * 1024
+
+# Per request of `/products/<pk>/images/bulk/`:
+MAX_IMAGES_PER_REQUEST = 50
+
+
+class ImageTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = (
+        f"ERROR: Image too big, max allowed: {MAX_PRODUCT_IMAGE_SIZE_KB} KB"
+    )
+    default_code = "image_too_large"
+
+
+class StreamedImageUpload(TemporaryUploadedFile):
+    """An upload `ProductImageUploadHandler` validated from its header: its
+    `image_format` and `image_size` (px) are known already — or its `errors` (see
+    `ProductImageField`)."""
+
+    image_format: str | None = None
+    image_size: tuple[int, int] | None = None
+    errors: list[str] | None = None
+    content_hash: str | None = None  # (SHA-256, hex)
+
+
+class ProductImageUploadHandler(FileUploadHandler):
+    """Upload handler (`request.upload_handlers`) for product images, see the
+    module docstring. `max_files`: how many images a request may carry."""
+
+    chunk_size = 64 * 1024  # (`FileUploadHandler`'s default)
+
+    def __init__(self, request=None, max_files=1):
+        super().__init__(request)
+        self.max_request_size = max_files * (
+            MAX_PRODUCT_IMAGE_SIZE + MULTIPART_OVERHEAD
+        )
+
+    def handle_raw_input(
+        self, input_data, META, content_length, boundary, encoding=None
+    ):
+        # (A client may lie, or stream without a `Content-Length`: the chunks are
+        # counted too, below.)
+        if content_length > self.max_request_size:
+            raise ImageTooLarge()
+        return None  # (parse as usual)
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.file = StreamedImageUpload(
+            self.file_name, self.content_type, 0, self.charset, self.content_type_extra
+        )
+        self.header = b""
+        self.header_size = HEADER_SIZE  # (parsed once that much is there)
+        self.digest = hashlib.sha256()
+        raise StopFutureHandlers()  # (this one stores the file)
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > MAX_PRODUCT_IMAGE_SIZE:
+            self.reject(ImageTooLarge())
+        if self.file.image_format is None and self.file.errors is None:
+            self.header += raw_data  # (not validated yet)
+            if len(self.header) >= self.header_size:
+                self.validate()
+        if self.file.errors is None:
+            self.file.write(raw_data)
+            self.digest.update(raw_data)
+        return None  # (consumed)
+
+    def file_complete(self, file_size):
+        if self.file.image_format is None and self.file.errors is None:
+            self.validate(complete=True)  # (the whole file: the header, if any)
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.content_hash = self.digest.hexdigest()
+        return self.file
+
+    def upload_interrupted(self):
+        if hasattr(self, "file"):
+            self.file.close()  # (deletes the temporary file)
+
+    def validate(self, complete=False):
+        try:
+            format, size = validate_product_image_header(self.header)
+        except DjangoValidationError as e:
+            if (
+                e.code == "invalid_image"
+                and not complete
+                and has_product_image_signature(self.header)
+            ):
+                # (Maybe only not all there yet: retried with twice as much.)
+                self.header_size *= 2
+                return
+            self.file.errors = e.messages
+            self.file.truncate(0)  # (nothing more is written, see above)
+            return
+        self.file.image_format, self.file.image_size = format, size
+        self.header = b""
+
+    def reject(self, error):
+        # (Not reading the rest of the body: the error's response is sent right away.)
+        self.file.close()
+        raise error
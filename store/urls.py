@@ -1,7 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework_nested.routers import NestedDefaultRouter
-from . import views
+from . import views, async_views
 
 
 router = DefaultRouter()
@@ -28,4 +28,9 @@ urlpatterns = [
     # path("products/<int:pk>/", views.ProductDetail.as_view()),
     # path("collections/", views.CollectionList.as_view()),
     # path("collections/<int:pk>/", views.CollectionDetail.as_view(), name="collection-detail"),
+    # Async (ASGI) variants of the catalog reads:
+    path("async/products/", async_views.product_list),
+    path("async/products/<int:pk>/", async_views.product_detail),
+    path("async/products/<int:product_pk>/reviews/", async_views.review_list),
+    path("async/collections/", async_views.collection_list),
 ] + (router.urls + product_router.urls + cart_router.urls)
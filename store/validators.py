@@ -1,11 +1,55 @@
+from io import BytesIO
 from django.core.exceptions import ValidationError
+from PIL import Image
 
 
 MAX_PRODUCT_IMAGE_SIZE_KB = 1024  # 1 MB
 
+# Longest side, in px (a larger one is a decompression bomb more than a photo):
+MAX_PRODUCT_IMAGE_DIMENSION = 6000
+
+PRODUCT_IMAGE_FORMATS = {"JPEG", "PNG", "WEBP", "GIF"}  # (Pillow's names)
+
 
 def validate_product_image_size(image):
     if image.size > MAX_PRODUCT_IMAGE_SIZE_KB * 1024:
         raise ValidationError(
             f"ERROR: Image too big, max allowed: {MAX_PRODUCT_IMAGE_SIZE_KB} KB"
         )
+
+
+def has_product_image_signature(header: bytes) -> bool:
+    """Whether `header` starts like an image of one of `PRODUCT_IMAGE_FORMATS` (its
+    magic bytes), however few of the rest of it are there yet."""
+    return header.startswith((b"\xff\xd8", b"\x89PNG\r\n\x1a\n", b"GIF8")) or (
+        header[:4] == b"RIFF" and header[8:12] == b"WEBP"
+    )
+
+
+def validate_product_image_header(header: bytes) -> tuple[str, tuple[int, int]]:
+    """Validate an image from its first bytes only (`Image.open` is lazy: it parses
+    the header, it doesn't decode the pixels). Return its format and size.
+
+    (Not enough of them for the header raises the same as garbage: "invalid_image".)"""
+    try:
+        with Image.open(BytesIO(header)) as image:
+            format, size = image.format, image.size
+    except Exception:  # (anything, on garbage: not only `UnidentifiedImageError`)
+        raise ValidationError(
+            "Upload a valid image. The file you uploaded was either not an image or "
+            "a corrupted image.",
+            code="invalid_image",
+        )
+    if format not in PRODUCT_IMAGE_FORMATS:
+        raise ValidationError(
+            f"ERROR: Unsupported image format {format}, allowed: "
+            f"{', '.join(sorted(PRODUCT_IMAGE_FORMATS))}",
+            code="unsupported_format",
+        )
+    if max(size) > MAX_PRODUCT_IMAGE_DIMENSION:
+        raise ValidationError(
+            f"ERROR: Image too large, max allowed: {MAX_PRODUCT_IMAGE_DIMENSION} px "
+            "per side",
+            code="too_large",
+        )
+    return format, size
@@ -1,6 +1,7 @@
 from django.http import HttpRequest, HttpResponse
 from django.shortcuts import get_object_or_404
-from django.db.models import Count
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce
 from rest_framework.decorators import api_view, action
 from rest_framework.request import Request
 from rest_framework.response import Response
@@ -14,7 +15,9 @@ from rest_framework.mixins import (
     UpdateModelMixin,
     DestroyModelMixin,
 )
-from rest_framework import permissions
+from rest_framework import permissions, generics
+from rest_framework.filters import OrderingFilter
+from django_filters.rest_framework import DjangoFilterBackend
 from .models import (
     Product,
     Collection,
@@ -28,19 +31,35 @@ from .models import (
 )
 from .serializers import (
     ProductSerializer,
+    ProductListSerializer,
     CollectionSerializer,
     ReviewSerializer,
     CartSerializer,
     CartItemSerializer,
     UpdateCartItemSerializer,
+    BulkCartItemsSerializer,
+    CartSummarySerializer,
     CustomerSerializer,
     CurrentCustomerSerializer,
     OrderSerializer,
     CreateOrderSerializer,
+    OutOfStockError,
     UpdateOrderSerializer,
     ProductImageSerializer,
+    BulkProductImagesSerializer,
+)
+from .filters import ProductFilter, ProductSearchFilter
+from .pagination import PageNumberOrKeysetPagination
+from .cache import cached_product_response
+from .replicas import ReplicaReadMixin
+from .uploads import MAX_IMAGES_PER_REQUEST, ProductImageUploadHandler
+from .conditional import conditional, product_version, collections_version
+from .exports import (
+    EXPORT_URL_PATH,
+    ExportContentNegotiation,
+    export_orders,
+    export_products,
 )
-from .filters import ProductFilter
 from . import permissions as custom_permissions
 
 
@@ -232,7 +251,19 @@ class ProductDetail(RetrieveUpdateDestroyAPIView):
 
 
 # ViewSet:
-class ProductViewSet(ModelViewSet):
+# (`ReplicaReadMixin`: GETs may read from a read replica, see `store.replicas`.)
+class ProductViewSet(ReplicaReadMixin, ModelViewSet):
+
+    # Most SQL queries per request, per action (see `store.querybudget`):
+    query_budget = {
+        "list": 4,
+        "retrieve": 3,
+        "create": 4,
+        "update": 5,
+        "partial_update": 5,
+        "destroy": 11,  # (the cascade, the images' `post_delete` signals)
+        "export": 1,  # (+ the streamed one)
+    }
 
     queryset = Product.objects.prefetch_related("productimage_set")
     serializer_class = ProductSerializer
@@ -249,12 +280,54 @@ class ProductViewSet(ModelViewSet):
     # Advanced filtering (check `ProductFilter`):
     filterset_class = ProductFilter
 
-    search_fields = ["title"]
+    # search_fields = ["title"]
+    # `SearchFilter` compiles that to `title ILIKE '%term%'`, which can't use an index.
+    # Replacing it with full-text search (title + description, ranked, see
+    # `ProductSearchFilter`), same `?search=` param:
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter, OrderingFilter]
 
     ordering_fields = ["unit_price", "last_update"]
 
+    # Deep `?page=` pages get slower (`COUNT(*)` + `OFFSET`) as the catalog grows,
+    # so clients can opt in to keyset pagination with `?pagination=keyset`:
+    pagination_class = PageNumberOrKeysetPagination
+
     permission_classes = [custom_permissions.IsAdminOrReadOnly]
 
+    # Reads are served from the cache (invalidated on every product/image/collection
+    # change, see `store.signals.handlers`), instead of hitting the DB every time:
+    def list(self, request, *args, **kwargs):
+        return cached_product_response(request, self.list_from_values)
+
+    def list_from_values(self, request):
+        """`list`, serialized from `.values()` rows by `ProductListSerializer`
+        instead of `ProductSerializer` (same output, a fraction of the CPU)."""
+        queryset = self.filter_queryset(Product.objects.with_price_plus_tax()).values(
+            *ProductListSerializer.values_fields,
+            "collection_id",
+            "last_update",  # (only for `?pagination=keyset&ordering=last_update`)
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = ProductListSerializer(page, self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
+
+    # (Before the cache: a client that has the current version gets a 304.)
+    @conditional(product_version)
+    def retrieve(self, request, *args, **kwargs):
+        return cached_product_response(request, super().retrieve, *args, **kwargs)
+
+    # `/products/export/csv/` & `/products/export/ndjson/`: all the (filtered)
+    # products, streamed (see `store.exports`):
+    @action(
+        detail=False,
+        url_path=EXPORT_URL_PATH,
+        permission_classes=[permissions.IsAdminUser],
+        content_negotiation_class=ExportContentNegotiation,
+    )
+    def export(self, request: Request, export_format):
+        queryset = self.filter_queryset(Product.objects.all())
+        return export_products(queryset, export_format)
+
     def destroy(self, request, pk):
         if OrderItem.objects.filter(product_id=pk).exists():
             return Response(
@@ -272,9 +345,10 @@ def collection_list(request: Request) -> Response:
 
     if request.method == "GET":
 
-        collections = Collection.objects.annotate(product_count=Count("product"))
-        # Why `product` and not `product_set`?
+        collections = Collection.objects.all()
+        # (Was `annotate(product_count=Count("product"))` — why `product` and not `product_set`?
         # https://github.com/samyak1409/ultimate-django/blob/main/Notes/Part%201/4.%20Django%20ORM.md#grouping-data
+        # — but `product_count` is a stored field now, see `Collection.product_count`.)
         serializer = CollectionSerializer(collections, many=True)
         return Response(serializer.data)
 
@@ -289,7 +363,7 @@ def collection_list(request: Request) -> Response:
 # Generic View:
 class CollectionList(ListCreateAPIView):
 
-    queryset = Collection.objects.annotate(product_count=Count("product"))
+    queryset = Collection.objects.all()
     serializer_class = CollectionSerializer
 
 
@@ -297,9 +371,7 @@ class CollectionList(ListCreateAPIView):
 @api_view(["GET", "PUT", "DELETE"])
 def collection_detail(request, pk: int):
 
-    collection = get_object_or_404(
-        Collection.objects.annotate(product_count=Count("product")), pk=pk
-    )
+    collection = get_object_or_404(Collection, pk=pk)
 
     if request.method == "GET":
 
@@ -329,7 +401,7 @@ def collection_detail(request, pk: int):
 # Generic View:
 class CollectionDetail(RetrieveUpdateDestroyAPIView):
 
-    queryset = Collection.objects.annotate(product_count=Count("product"))
+    queryset = Collection.objects.all()
     serializer_class = CollectionSerializer
 
     def delete(self, request, pk):
@@ -344,13 +416,27 @@ class CollectionDetail(RetrieveUpdateDestroyAPIView):
 
 
 # ViewSet:
-class CollectionViewSet(ModelViewSet):
-
-    queryset = Collection.objects.annotate(product_count=Count("product"))
+class CollectionViewSet(ReplicaReadMixin, ModelViewSet):
+
+    query_budget = {
+        "list": 3,
+        "retrieve": 1,
+        "create": 1,
+        "update": 2,
+        "partial_update": 2,
+        "destroy": 4,
+    }
+
+    queryset = Collection.objects.all()
     serializer_class = CollectionSerializer
 
     permission_classes = [custom_permissions.IsAdminOrReadOnly]
 
+    # Polled by clients: `ETag`/`Last-Modified`, a 304 when nothing changed.
+    @conditional(collections_version)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
     def destroy(self, request, pk):
         if Product.objects.filter(collection_id=pk).exists():
             return Response(
@@ -362,7 +448,16 @@ class CollectionViewSet(ModelViewSet):
         return super().destroy(request, pk)
 
 
-class ReviewViewSet(ModelViewSet):
+class ReviewViewSet(ReplicaReadMixin, ModelViewSet):
+
+    query_budget = {
+        "list": 2,
+        "retrieve": 1,
+        "create": 2,
+        "update": 2,
+        "partial_update": 2,
+        "destroy": 2,
+    }
 
     # queryset = Review.objects.all()
     serializer_class = ReviewSerializer
@@ -374,7 +469,11 @@ class ReviewViewSet(ModelViewSet):
     # Since we've the endpoint `/products/<pk>/reviews`, we want reviews to be dynamically fetched on the basis of product's pk,
     # hence we need to use method instead of attribute:
     def get_queryset(self):
-        return Review.objects.filter(product_id=self.kwargs["product_pk"])
+        queryset = Review.objects.filter(product_id=self.kwargs["product_pk"])
+        if self.request.method not in permissions.SAFE_METHODS:
+            # (`IsReviewAuthorOrReadOnly` reads the review's `customer.user_id`.)
+            queryset = queryset.select_related("customer")
+        return queryset
 
     # Overriding to pass the product id from url to `ReviewSerializer.create`:
     def get_serializer_context(self):
@@ -389,12 +488,42 @@ class CartViewSet(
     CreateModelMixin, RetrieveModelMixin, DestroyModelMixin, GenericViewSet
 ):
 
+    query_budget = {"create": 3, "retrieve": 2, "destroy": 4, "summary": 1}
+
     serializer_class = CartSerializer
-    queryset = Cart.objects.prefetch_related("cartitem_set__product")
+    # queryset = Cart.objects.prefetch_related("cartitem_set__product")
+    # Instead of loading every product to multiply & sum prices in Python
+    # (`CartSerializer`), the line totals and cart total are computed in SQL:
+    queryset = Cart.objects.with_totals()
+
+    # `/carts/<pk>/summary/`: just the item count & total (e.g. for a cart badge), in
+    # a single aggregate query, without fetching the items at all:
+    @action(detail=True)
+    def summary(self, request: Request, pk):
+        summary = generics.get_object_or_404(
+            Cart.objects.annotate(
+                item_count=Count("cartitem"),
+                total_quantity=Coalesce(Sum("cartitem__quantity"), 0),
+            )
+            .with_total_value()
+            .values("id", "item_count", "total_quantity", "total_value"),
+            pk=pk,
+        )
+        # (DRF's `get_object_or_404`: also 404s for a malformed uuid, instead of 500)
+        return Response(CartSummarySerializer(summary).data)
 
 
 class CartItemViewSet(ModelViewSet):
 
+    query_budget = {
+        "list": 2,
+        "retrieve": 1,
+        "create": 2,
+        "partial_update": 2,
+        "destroy": 2,
+        "bulk": 8,  # (whatever the number of items)
+    }
+
     http_method_names = ["get", "post", "patch", "delete"]
     # disallow `put` method to make `UpdateCartItemSerializer.Meta.fields` work, else it keeps showing `product` even when it's not in the `fields`
 
@@ -412,19 +541,42 @@ class CartItemViewSet(ModelViewSet):
     # But what we instead want is, items from a single cart. Just like we did in `ReviewViewSet`.
     # So, we need `get_queryset`:
     def get_queryset(self):
-        return CartItem.objects.filter(cart_id=self.kwargs["cart_pk"]).select_related(
-            "product"
-        )
+        return CartItem.objects.filter(
+            cart_id=self.kwargs["cart_pk"]
+        ).with_total_price()
         # Note: Even if we don't use `product = SimpleProductSerializer()` in `CartItemSerializer`,
-        # `.select_related("product")` is still needed since we've `product.unit_price` in `CartItemSerializer.get_total_price`.
+        # `.select_related("product")` used to be needed since we've `product.unit_price` in `CartItemSerializer.get_total_price`.
+        # Now `total_price` is computed in SQL (`with_total_price`) instead, so no product objects are loaded.
 
     # Overriding to pass the cart id from url to `CartItemSerializer.save`:
     def get_serializer_context(self):
         return super().get_serializer_context() | {"cart_id": self.kwargs["cart_pk"]}
 
+    # `/carts/<pk>/items/bulk/`: many items in one request (`BulkCartItemsSerializer`):
+    @action(detail=False, methods=["POST"])
+    def bulk(self, request: Request, cart_pk):
+        serializer = BulkCartItemsSerializer(
+            data=request.data, context=self.get_serializer_context()
+        )
+        serializer.is_valid(raise_exception=True)
+        cart = serializer.save()
+        return Response(CartSerializer(cart).data)
+
 
 class CustomerViewSet(ModelViewSet):
 
+    # (With the user's and groups' permissions, 2, for `FullDjangoModelPermissions`.)
+    query_budget = {
+        "list": 4,
+        "retrieve": 3,
+        "create": 5,
+        "update": 4,
+        "partial_update": 4,
+        "destroy": 7,
+        "me": 2,
+        "history": 2,
+    }
+
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
 
@@ -460,6 +612,18 @@ class CustomerViewSet(ModelViewSet):
 
 class OrderViewSet(ModelViewSet):
 
+    query_budget = {
+        "list": 4,
+        "retrieve": 3,
+        "create": 11,  # (whatever the number of items)
+        "partial_update": 4,
+        "destroy": 5,
+        "export": 0,  # (+ the streamed one)
+    }
+
+    # (Same as `ProductViewSet`, staff paging through the whole order history.)
+    pagination_class = PageNumberOrKeysetPagination
+
     def get_serializer_class(self):
         if self.request.method == "POST":
             return CreateOrderSerializer
@@ -486,23 +650,88 @@ class OrderViewSet(ModelViewSet):
             data=request.data, context={"user_id": self.request.user.id}
         )
         input_sr.is_valid(raise_exception=True)
-        order = input_sr.save()
+        try:
+            order = input_sr.save()
+        except OutOfStockError as e:
+            return Response(
+                {
+                    "error": "Order cannot be placed as some products are out of stock.",
+                    "products": e.products,
+                },
+                status=status.HTTP_409_CONFLICT,
+            )
 
+        # Re-fetched with the items & their products prefetched (`get_queryset`), else
+        # `OrderSerializer` queries each item's product (N+1):
+        order = self.get_queryset().get(pk=order.pk)
         output_sr = OrderSerializer(order)
         return Response(output_sr.data, status=status.HTTP_201_CREATED)
 
+    # `/orders/export/csv/` & `/orders/export/ndjson/`: the whole order history with
+    # the items, streamed (see `store.exports`):
+    @action(
+        detail=False,
+        url_path=EXPORT_URL_PATH,
+        content_negotiation_class=ExportContentNegotiation,
+    )
+    def export(self, request: Request, export_format):
+        return export_orders(export_format)
+
     def get_permissions(self):
-        if self.request.method in ["PATCH", "DELETE"]:
+        if self.request.method in ["PATCH", "DELETE"] or self.action == "export":
             return [permissions.IsAdminUser()]
         return [permissions.IsAuthenticated()]
 
     http_method_names = ["post", "get", "patch", "delete", "head", "options"]
 
 
-class ProductImageViewSet(ModelViewSet):
+class ProductImageViewSet(ReplicaReadMixin, ModelViewSet):
+
+    query_budget = {
+        "list": 2,
+        "retrieve": 1,
+        "create": 2,
+        "update": 3,
+        "partial_update": 3,
+        "destroy": 3,
+        "bulk": 5,  # (whatever the number of images)
+    }
 
     serializer_class = ProductImageSerializer
 
+    # Uploads validated and stored while they stream in (`store.uploads`), not
+    # buffered first. (Set before anything reads the body — even authentication can,
+    # for the CSRF token of a session.)
+    def initialize_request(self, request, *args, **kwargs):
+        if request.method in ("POST", "PUT", "PATCH"):
+            max_files = (
+                MAX_IMAGES_PER_REQUEST
+                if self.action_map.get(request.method.lower()) == "bulk"
+                else 1
+            )
+            request.upload_handlers = [
+                ProductImageUploadHandler(request, max_files=max_files)
+            ]
+        return super().initialize_request(request, *args, **kwargs)
+
+    # `/products/<pk>/images/bulk/`: many images in one request (multipart, all as
+    # `images`), e.g. for onboarding a catalog (`BulkProductImagesSerializer`):
+    @action(
+        detail=False, methods=["POST"], permission_classes=[permissions.IsAdminUser]
+    )
+    def bulk(self, request: Request, product_pk):
+        serializer = BulkProductImagesSerializer(
+            data=request.data, context=self.get_serializer_context()
+        )
+        serializer.is_valid(raise_exception=True)
+        images = serializer.save()
+        return Response(
+            ProductImageSerializer(
+                images, many=True, context=self.get_serializer_context()
+            ).data,
+            status=status.HTTP_201_CREATED,
+        )
+
     # Since we've the endpoint `/products/<pk>/images`, we want images to be dynamically fetched on the basis of product's pk,
     # hence we need to use method instead of attribute:
     def get_queryset(self):
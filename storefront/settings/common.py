@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 from datetime import timedelta
 import os
+from importlib.util import find_spec
 from celery.schedules import crontab
 
 
@@ -33,6 +34,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",  # temp memory on server to store user data
     "django.contrib.messages",  # one time notifications
     "django.contrib.staticfiles",  # like css, images, etc.
+    "django.contrib.postgres",  # full-text search, trigram lookups, GIN indexes
     "rest_framework",  # toolkit for building Web APIs
     "django_filters",  # easily construct complex searches and filters
     "djoser",  # REST implementation of Django authentication system
@@ -49,15 +51,24 @@ MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",  # https://github.com/adamchainz/django-cors-headers?tab=readme-ov-file#setup
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",  # https://whitenoise.readthedocs.io/en/stable/#quickstart-for-django-apps
+    "store.compression.CompressionMiddleware",  # before (= outside) everything that reads or writes response bodies
+    "store.querybudget.QueryBudgetMiddleware",  # before (= outside) everything that queries
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "store.replicas.PinToPrimaryMiddleware",
 ]
 
 
+# Over a viewset's query budget (`store.querybudget`): "warn" (logged), "raise"
+# (while testing, see `store/tests/conftest.py`), or `None` (not counted, e.g. with
+# `QUERY_BUDGET_MODE=`):
+QUERY_BUDGET_MODE = os.environ.get("QUERY_BUDGET_MODE", "warn") or None
+
+
 CORS_ALLOWED_ORIGINS = ["null"]  # allow requests from local files (file://...)
 
 
@@ -81,6 +92,71 @@ TEMPLATES = [
 WSGI_APPLICATION = "storefront.wsgi.application"
 
 
+# Database connections:
+# https://docs.djangoproject.com/en/5.2/ref/databases/#connection-pool
+# (`DATABASES` itself is in `dev.py`/`prod.py`, which add `DATABASE_CONNECTION`.)
+
+# Every gunicorn worker process has its own connections, and serves at most
+# `GUNICORN_THREADS` requests at a time (one connection each) — so that's the pool
+# size per worker, and `WEB_CONCURRENCY` (gunicorn's own env var for `--workers`)
+# × that is the most connections the app opens (keep it under Postgres'
+# `max_connections`, minus what Celery workers use). See `gunicorn.conf.py`.
+GUNICORN_WORKERS = int(os.environ.get("WEB_CONCURRENCY", 2))
+GUNICORN_THREADS = int(os.environ.get("GUNICORN_THREADS", 4))
+
+if find_spec("psycopg_pool") is not None:  # (`psycopg[pool]` installed)
+    # psycopg 3's pool: connections are opened once and handed to requests. (Pool
+    # stats: `/db-pool-stats/`.)
+    DATABASE_CONNECTION = {
+        "CONN_MAX_AGE": 0,  # (must be 0 with a pool — the pool keeps them open)
+        # Health check when handing out a connection (else a connection dropped by
+        # Postgres / a proxy surfaces as an error in a request): with a pool, Django
+        # passes it `check=ConnectionPool.check_connection` for this — not a `check`
+        # in `OPTIONS["pool"]`, which would be passed twice.
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            "pool": {
+                "min_size": 1,
+                "max_size": GUNICORN_THREADS,
+                # Seconds a request waits for a free connection before erroring
+                # (instead of queueing forever when the pool is too small):
+                "timeout": 10,
+                "max_idle": 5 * 60,  # close connections idle for long
+                "max_lifetime": 60 * 60,  # recycle connections every hour
+            },
+        },
+    }
+else:
+    # Persistent connections instead: each thread keeps its connection open for
+    # `CONN_MAX_AGE` seconds, checked before reuse (`CONN_HEALTH_CHECKS`).
+    DATABASE_CONNECTION = {
+        "CONN_MAX_AGE": 10 * 60,
+        "CONN_HEALTH_CHECKS": True,
+    }
+
+
+def with_database_connection(database: dict) -> dict:
+    """`database` (a `DATABASES` entry) with `DATABASE_CONNECTION`, its `OPTIONS`
+    merged into the entry's (e.g. `sslmode` from a `DATABASE_URL`), not replacing
+    them."""
+    return {
+        **database,
+        **DATABASE_CONNECTION,
+        "OPTIONS": {
+            **database.get("OPTIONS", {}),
+            **DATABASE_CONNECTION.get("OPTIONS", {}),
+        },
+    }
+
+# Read replicas (aliases in `DATABASES`) for the catalog API's reads, see
+# `store.replicas`:
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ["store.replicas.ReplicaRouter"]
+REPLICA_MAX_LAG = 5  # seconds behind the primary a replica may be to still be used
+# How long a client is pinned to the primary after a write (read-your-writes):
+REPLICA_PIN_SECONDS = REPLICA_MAX_LAG
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -123,6 +199,14 @@ STATIC_ROOT = os.path.join(BASE_DIR, "static")
 MEDIA_URL = "media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# How `core.views.serve_media` sends a media file's bytes:
+# - "django": itself, with a `FileResponse` (gunicorn `sendfile()`s those),
+# - "x-accel-redirect": nginx does, from its internal `MEDIA_ACCEL_REDIRECT_PREFIX`
+#   location (see the view's docstring),
+# - "x-sendfile": Apache (mod_xsendfile) / lighttpd do, from the file's path.
+MEDIA_SERVE_MODE = "django"
+MEDIA_ACCEL_REDIRECT_PREFIX = "/protected-media/"
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -147,6 +231,21 @@ REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework_simplejwt.authentication.JWTAuthentication",
     ),
+    # Faster JSON (and MessagePack on `Accept: application/msgpack`) when installed,
+    # see `store.renderers`:
+    "DEFAULT_RENDERER_CLASSES": [
+        (
+            "store.renderers.ORJSONRenderer"
+            if find_spec("orjson") is not None
+            else "rest_framework.renderers.JSONRenderer"
+        ),
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ]
+    + (
+        ["store.renderers.MessagePackRenderer"]
+        if find_spec("msgpack") is not None
+        else []
+    ),
 }
 
 
@@ -181,6 +280,16 @@ CELERY_BEAT_SCHEDULE = {
         "args": ["Triggered from celery beat"],
         # "kwargs": {...},
     },
+    # Catches the order events not dispatched right after their checkout committed:
+    "dispatch-order-events-every-minute": {
+        "task": "store.tasks.dispatch_order_events",
+        "schedule": 60,  # seconds
+    },
+    # Catches the product images whose variants weren't generated after their upload:
+    "process-pending-product-images-every-5-minutes": {
+        "task": "store.tasks.process_pending_product_images",
+        "schedule": 5 * 60,  # seconds
+    },
 }
 
 
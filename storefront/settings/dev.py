@@ -21,9 +21,13 @@ INSTALLED_APPS += [
 MIDDLEWARE.insert(0, "debug_toolbar.middleware.DebugToolbarMiddleware")
 # https://github.com/barseghyanartur/django-debug-toolbar-force/?tab=readme-ov-file#installation
 MIDDLEWARE.insert(1, "debug_toolbar_force.middleware.ForceDebugToolbarMiddleware")
+# Compression before (= outside) the toolbars: they turn JSON responses into HTML
+# pages, which they can't do once compressed.
+MIDDLEWARE.remove("store.compression.CompressionMiddleware")
+MIDDLEWARE.insert(0, "store.compression.CompressionMiddleware")
 # https://github.com/jazzband/django-silk?tab=readme-ov-file#installation
 # MIDDLEWARE.append("silk.middleware.SilkyMiddleware")  # only enable silk while actually profiling, as it fills up the SQL panel on debug toolbar
-# Intended order: DebugToolbar+ForceDebugTool, Security, Cors, WhiteNoise, 6, Silky
+# Intended order: Compression, DebugToolbar+ForceDebugTool, Security, Cors, WhiteNoise, 6, Silky
 # See Notes > Part 3 > Preparing for Production > Order of Middlewares.
 
 
@@ -50,9 +54,19 @@ DATABASES = {
         "PASSWORD": "temporary",
         "HOST": "127.0.0.1",
         "PORT": "5432",
+        **DATABASE_CONNECTION,
     }
 }
 
+# A read replica (see `store.replicas`), e.g.:
+# DATABASES["replica"] = {
+#     **DATABASES["default"],
+#     "HOST": "127.0.0.1",
+#     "PORT": "5433",
+#     "TEST": {"MIRROR": "default"},  # (tests use `default` for it)
+# }
+# DATABASE_REPLICAS = ["replica"]
+
 
 # Email:
 
@@ -70,6 +84,8 @@ ADMINS = [
 
 # Celery:
 CELERY_BROKER_URL = "redis://127.0.0.1:6379/0"
+# (Needed by chords — `playground.tasks.notify_customers` — to collect the results.)
+CELERY_RESULT_BACKEND = "redis://127.0.0.1:6379/0"
 
 
 # Caching:
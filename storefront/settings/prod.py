@@ -14,7 +14,32 @@ DEBUG = False
 ALLOWED_HOSTS = []  # TODO
 
 
-DATABASES = {"default": dj_database_url.config()}  # TODO
+DATABASES = {"default": with_database_connection(dj_database_url.config())}  # TODO
+
+# Replicas: comma-separated urls, added as `replica_1`, `replica_2`, ...
+for i, url in enumerate(os.environ.get("DATABASE_REPLICA_URLS", "").split(","), 1):
+    if url.strip():
+        DATABASES[f"replica_{i}"] = with_database_connection(
+            dj_database_url.parse(url.strip())
+        )
+        DATABASE_REPLICAS.append(f"replica_{i}")
+
+
+# Static and media files:
+
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    # `collectstatic` stores each file under a name with its content's hash too
+    # (`styles.3f2a9c.css`, which WhiteNoise serves with a far-future
+    # `Cache-Control`), and gzip/brotli versions of it, served precompressed:
+    # https://whitenoise.readthedocs.io/en/stable/django.html#add-compression-and-caching-support
+    "staticfiles": {
+        "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage"
+    },
+}
+WHITENOISE_KEEP_ONLY_HASHED_FILES = True  # (the unhashed copies aren't referenced)
+
+MEDIA_SERVE_MODE = os.environ.get("MEDIA_SERVE_MODE", "x-accel-redirect")
 
 
 # Email:
@@ -36,6 +61,7 @@ REDIS_URL = os.environ.get("REDIS_URL")  # TODO
 
 # Celery:
 CELERY_BROKER_URL = REDIS_URL
+CELERY_RESULT_BACKEND = REDIS_URL  # (for chords)
 
 
 # Caching:
@@ -18,7 +18,7 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
+from core.views import serve_media
 
 # Change admin's headings if required:
 # admin.site.site_header = "Storefront Admin"
@@ -35,11 +35,11 @@ urlpatterns = [
     path("auth/", include("djoser.urls.jwt")),
 ]
 
-urlpatterns += static(prefix=settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-# Adds in DEBUG only. (See code of `static`.)
-# On prod:
-# - Either use a media hosting service.
-# - Or do this same without `if DEBUG`. (Works for personal project.)
+# Media files, on prod too: with cache headers, the bytes sent by nginx (or by the
+# app server's `sendfile()`), see `serve_media`. (`static()` adds in DEBUG only.)
+urlpatterns.append(
+    path(f"{settings.MEDIA_URL.lstrip('/')}<path:path>", serve_media, name="media")
+)
 
 if settings.DEBUG:
     # Importing the dev-only tools inside the `if` so prod doesn't need